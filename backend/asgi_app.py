@@ -0,0 +1,210 @@
+"""
+Chế độ chạy ASGI của API server, cùng các route Flask của otruyen_api_server:
+
+    pip install -r requirements.txt
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+Kết nối được giữ bởi event loop thay vì mỗi kết nối một thread. Response được dựng ngay trên
+event loop (phần lớn route chỉ đọc catalog và các cache trong bộ nhớ); mỗi lời gọi chặn của route
+(đọc kho dữ liệu khi catalog chưa sẵn sàng, thử các key ứng viên, dựng chỉ mục chương, đọc
+chương EPUB; xem blocking_calls.py) được chờ bằng await trong pool thread có giới hạn của loại đó,
+và các lời gọi độc lập (các key ứng viên của một slug, các id của /batch) chạy song song.
+Trong lúc chờ, request không giữ thread nào: số request chậm đồng thời trên mỗi tiến trình chỉ
+bị giới hạn bởi kết nối, còn số lời gọi chạy cùng lúc là ASGI_STORAGE_WORKERS và ASGI_EPUB_WORKERS.
+Body dạng stream (NDJSON nhiều chương, file media) được đọc từng phần trong pool EPUB.
+
+Chạy bằng python otruyen_api_server.py (server phát triển của Flask) vẫn như trước.
+"""
+
+import asyncio
+import io
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from blocking_calls import PendingCalls, rendering
+from otruyen_api_server import CATALOG, EPUB_WORKERS, HOME_FEED, app as flask_app
+
+
+def build_environ(scope, body):
+    """WSGI environ của một request HTTP ASGI (body: bytes của request)."""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    client = scope.get("client")
+    if client:
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = client[0], str(client[1])
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    # Body đã được đọc hết (kể cả khi client gửi chunked, không có Content-Length)
+    environ["CONTENT_LENGTH"] = str(len(body))
+    environ.pop("HTTP_TRANSFER_ENCODING", None)
+    return environ
+
+
+async def read_body(receive):
+    """Body của request, hoặc None nếu client ngắt kết nối trước khi gửi xong."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+class AsgiApp:
+    """
+    Ứng dụng ASGI phục vụ flask_app (xem docstring module).
+    pools: {kind: executor} cho các lời gọi chặn; body dạng stream được đọc trong pools[stream_kind].
+    """
+
+    def __init__(self, flask_app, pools, stream_kind="epub", on_shutdown=None):
+        self.flask_app = flask_app
+        self.pools = pools
+        self.stream_kind = stream_kind
+        self.on_shutdown = on_shutdown
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            await send({"type": "websocket.close", "code": 1000})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.on_shutdown is not None:
+                    self.on_shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = await read_body(receive)
+        if body is None:
+            return
+        try:
+            environ, response = await self.render(scope, body)
+        except Exception:
+            traceback.print_exc()
+            await send({"type": "http.response.start", "status": 500,
+                        "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+            await send({"type": "http.response.body", "body": "Lỗi server nội bộ".encode("utf-8")})
+            return
+        await self._send_response(environ, response, send)
+
+    async def render(self, scope, body):
+        """
+        Dựng response của request trên event loop. Mỗi lần việc dựng dừng lại vì các lời gọi chặn
+        chưa có kết quả, chạy chúng song song trong pool tương ứng rồi dựng lại.
+        Trả về (environ, response).
+        """
+        loop = asyncio.get_running_loop()
+        results = {}
+        while True:
+            environ = build_environ(scope, body)
+            try:
+                with rendering(results):
+                    return environ, self._dispatch(environ)
+            except PendingCalls as pending:
+                calls = {call.key: call for call in pending.calls}
+                outcomes = await asyncio.gather(*(
+                    loop.run_in_executor(self.pools[call.kind], call.run) for call in calls.values()
+                ))
+                results.update(zip(calls, outcomes))
+
+    def _dispatch(self, environ):
+        # Như Flask.wsgi_app, nhưng trả về response thay vì gửi nó qua start_response
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                return app.full_dispatch_request()
+            except Exception as e:
+                error = e
+                return app.handle_exception(e)
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def _send_response(self, environ, response, send):
+        app_iter, status, headers = response.get_wsgi_response(environ)
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        })
+        if response.is_sequence and not response.direct_passthrough:
+            # Body đã nằm sẵn trong bộ nhớ
+            try:
+                body = b"".join(app_iter)
+            finally:
+                app_iter.close()
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        # Body dạng stream: mỗi phần có thể phải đọc EPUB hoặc đĩa
+        loop = asyncio.get_running_loop()
+        pool = self.pools[self.stream_kind]
+        chunks = iter(app_iter)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(pool, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            close = getattr(app_iter, "close", None)
+            if close is not None:
+                await loop.run_in_executor(pool, close)
+
+
+POOLS = {
+    "storage": ThreadPoolExecutor(max_workers=config.ASGI_STORAGE_WORKERS, thread_name_prefix="asgi-storage"),
+    "epub": ThreadPoolExecutor(max_workers=config.ASGI_EPUB_WORKERS, thread_name_prefix="asgi-epub"),
+}
+
+
+def shutdown():
+    HOME_FEED.stop()
+    CATALOG.stop()
+    EPUB_WORKERS.shutdown()
+    for pool in POOLS.values():
+        pool.shutdown(wait=False)
+
+
+app = AsgiApp(flask_app, POOLS, stream_kind="epub", on_shutdown=shutdown)
@@ -0,0 +1,105 @@
+"""
+So sánh html_to_clean_text (một lượt, html.parser) với bản BeautifulSoup cũ
+(html_to_clean_text_bs4) trên các chương thật: kiểm tra kết quả giống nhau và đo thời gian.
+
+Cách dùng:
+    python bench_html_to_text.py [đường dẫn ...] [--repeat N]
+
+Mỗi đường dẫn có thể là file .epub, file .html/.xhtml hoặc thư mục (tìm đệ quy).
+Mặc định dùng media/ebooks.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import config
+from epub_reader import EpubZipReader, extract_body_html
+from html_text import (
+    convert_chapter_html,
+    extract_chapter_title_bs4,
+    html_to_clean_text_bs4,
+)
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "media" / config.EBOOKS_URL_SUBPATH
+HTML_SUFFIXES = ('.html', '.xhtml', '.htm')
+
+
+def _epub_chapters(epub_path):
+    reader = EpubZipReader(epub_path)
+    try:
+        for chapter in reader.toc:
+            content_html = reader.read_chapter_html(chapter['href'])
+            if content_html:
+                yield f"{epub_path.name}:{chapter['href']}", extract_body_html(content_html)
+    finally:
+        reader.close()
+
+
+def collect_chapters(paths):
+    """Danh sách (tên, html) của các chương trong corpus."""
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.suffix.lower() in ('.epub',) + HTML_SUFFIXES))
+        else:
+            files.append(path)
+
+    chapters = []
+    for path in files:
+        if path.suffix.lower() == '.epub':
+            try:
+                chapters.extend(_epub_chapters(path))
+            except Exception as e:
+                print(f"Bỏ qua {path}: {e}")
+        else:
+            chapters.append((str(path), path.read_text(encoding='utf-8', errors='ignore')))
+    return chapters
+
+
+def _time(convert, chapters, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, html_content in chapters:
+            convert(html_content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _convert_bs4(html_content):
+    return extract_chapter_title_bs4(html_content), html_to_clean_text_bs4(html_content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=[DEFAULT_CORPUS])
+    parser.add_argument('--repeat', type=int, default=3, help="Số lần lặp, lấy thời gian tốt nhất")
+    args = parser.parse_args()
+
+    chapters = collect_chapters(args.paths)
+    if not chapters:
+        print("Không tìm thấy chương nào để đo.")
+        return 1
+
+    total_bytes = sum(len(html_content.encode('utf-8')) for _, html_content in chapters)
+    print(f"Corpus: {len(chapters)} chương, {total_bytes / 1024:.1f} KB HTML")
+
+    mismatches = [name for name, html_content in chapters
+                  if convert_chapter_html(html_content) != _convert_bs4(html_content)]
+    for name in mismatches[:10]:
+        print(f"  Khác kết quả: {name}")
+    print(f"Kết quả giống nhau: {len(chapters) - len(mismatches)}/{len(chapters)} chương")
+
+    bs4_seconds = _time(_convert_bs4, chapters, args.repeat)
+    streaming_seconds = _time(convert_chapter_html, chapters, args.repeat)
+    for label, seconds in (("BeautifulSoup (cũ)", bs4_seconds), ("Một lượt (mới)", streaming_seconds)):
+        print(f"{label:20} {seconds * 1000:9.1f} ms  ({seconds * 1000 / len(chapters):.2f} ms/chương)")
+    print(f"Nhanh hơn: {bs4_seconds / streaming_seconds:.1f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
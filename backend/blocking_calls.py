@@ -0,0 +1,101 @@
+"""
+Các lời gọi chặn của route (đọc kho dữ liệu, mở/đọc EPUB), để chế độ ASGI (asgi_app.py)
+chờ chúng ngoài event loop thay vì giữ một thread trong suốt request.
+
+Route gọi call_blocking(kind, func, *args) thay cho func(*args), và map_blocking(...) thay cho
+executor.map(...) khi có nhiều lời gọi độc lập. Khi chạy bằng Flask/WSGI, lời gọi chạy ngay
+trong thread của request như trước.
+
+Khi asgi_app dựng response trên event loop (bên trong rendering(results)), lời gọi chưa có kết
+quả trong results dừng việc dựng response bằng PendingCalls. asgi_app chạy các lời gọi đó song
+song trong pool thread của loại kind ("storage", "epub"), lưu kết quả (hoặc exception) vào results
+rồi dựng lại response từ đầu; lần này các lời gọi đó trả về ngay. Vì vậy trước lời gọi chặn cuối
+cùng, handler không được thay đổi trạng thái dùng chung (chỉ đọc catalog, cache, ...).
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Kết quả các lời gọi chặn của request đang được dựng trên event loop (None: chạy trực tiếp)
+_RESULTS = ContextVar("blocking_call_results", default=None)
+
+
+class BlockingCall(namedtuple("BlockingCall", ["kind", "func", "args", "kwargs"])):
+    """Một lời gọi func(*args, **kwargs) chạy trong pool kind; kwargs là tuple các cặp (tên, giá trị)."""
+
+    @property
+    def key(self):
+        return self.func, self.args, self.kwargs
+
+    def run(self):
+        """Chạy lời gọi, trả về (kết quả, None) hoặc (None, exception)."""
+        try:
+            return self.func(*self.args, **dict(self.kwargs)), None
+        except Exception as e:
+            return None, e
+
+
+class PendingCalls(BaseException):
+    """
+    Các lời gọi chặn (BlockingCall) mà request đang dựng cần kết quả.
+    Kế thừa BaseException để các khối except Exception của handler không bắt nhầm.
+    """
+
+    def __init__(self, calls):
+        super().__init__(calls)
+        self.calls = calls
+
+
+@contextmanager
+def rendering(results):
+    """Dựng response với kết quả các lời gọi chặn đã có: dict {BlockingCall.key: (kết quả, exception)}."""
+    token = _RESULTS.set(results)
+    try:
+        yield
+    finally:
+        _RESULTS.reset(token)
+
+
+def _outcome(result):
+    value, error = result
+    if error is not None:
+        raise error
+    return value
+
+
+def call_blocking(kind, func, *args, **kwargs):
+    """func(*args, **kwargs); trong rendering(), lấy kết quả đã có hoặc raise PendingCalls."""
+    results = _RESULTS.get()
+    if results is None:
+        return func(*args, **kwargs)
+    call = BlockingCall(kind, func, args, tuple(sorted(kwargs.items())))
+    if call.key not in results:
+        raise PendingCalls([call])
+    return _outcome(results[call.key])
+
+
+def map_blocking(kind, func, *iterables, executor=None):
+    """
+    Như executor.map(func, *iterables) (map nếu executor là None). Trong rendering(), mọi lời
+    gọi chưa có kết quả được báo cùng lúc để chúng chạy song song.
+    """
+    results = _RESULTS.get()
+    if results is None:
+        return map(func, *iterables) if executor is None else executor.map(func, *iterables)
+    calls = [BlockingCall(kind, func, args, ()) for args in zip(*iterables)]
+    pending = [call for call in calls if call.key not in results]
+    if pending:
+        raise PendingCalls(pending)
+    return (_outcome(results[call.key]) for call in calls)
+
+
+class BlockingExecutor:
+    """Đối tượng có map() như executor (ví dụ cho KeyResolver), chạy qua map_blocking."""
+
+    def __init__(self, kind, executor=None):
+        self.kind = kind
+        self.executor = executor
+
+    def map(self, func, *iterables):
+        return map_blocking(self.kind, func, *iterables, executor=self.executor)
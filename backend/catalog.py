@@ -0,0 +1,644 @@
+"""
+Snapshot trong bộ nhớ của node library_items.
+Tải toàn bộ catalog một lần khi khởi động, sau đó giữ cho nó luôn mới
+bằng cách áp dụng các sự kiện put/patch từ stream listen() của Firebase RTDB.
+"""
+
+import bisect
+import threading
+import time
+import uuid
+
+
+def _split_path(path):
+    """Tách một đường dẫn RTDB ('/a/b/c') thành danh sách các segment."""
+    if not path:
+        return []
+    return [segment for segment in str(path).split('/') if segment]
+
+
+def _set_in(container, segments, value):
+    """
+    Trả về bản sao của container với giá trị tại segments được thay bằng value.
+    value là None nghĩa là xóa node đó (giống ngữ nghĩa của RTDB).
+    Chỉ sao chép các node nằm trên đường dẫn, phần còn lại được dùng chung.
+    """
+    if not segments:
+        return value
+
+    head, rest = segments[0], segments[1:]
+
+    # Firebase trả về list cho các node có key là số liên tiếp
+    if isinstance(container, list) and head.isdigit():
+        new_container = list(container)
+        index = int(head)
+        child = new_container[index] if index < len(new_container) else None
+        new_child = _set_in(child, rest, value)
+        if index < len(new_container):
+            new_container[index] = new_child
+        elif new_child is not None:
+            new_container.extend([None] * (index - len(new_container)))
+            new_container.append(new_child)
+        return new_container
+
+    if isinstance(container, list):
+        container = {str(i): v for i, v in enumerate(container) if v is not None}
+    new_container = dict(container) if isinstance(container, dict) else {}
+    new_child = _set_in(new_container.get(head), rest, value)
+    if new_child is None:
+        new_container.pop(head, None)
+    else:
+        new_container[head] = new_child
+    return new_container or None
+
+
+def is_root_put(event_type, path):
+    """Sự kiện put tại gốc: thay toàn bộ dữ liệu (sự kiện đầu tiên của listen())."""
+    return event_type == 'put' and not _split_path(path)
+
+
+def items_from_root(data):
+    """Dict {key: data} các item hợp lệ từ dữ liệu của một sự kiện put tại gốc."""
+    if isinstance(data, list):
+        data = {str(i): v for i, v in enumerate(data) if v is not None}
+    return {key: value for key, value in (data or {}).items() if isinstance(value, dict)}
+
+
+def event_changes(event_type, path, data, current):
+    """
+    Các item bị thay đổi bởi một sự kiện put/patch của RTDB (không phải put tại gốc):
+    {key cấp cao nhất: giá trị mới, None nếu item bị xóa}.
+    current(key) trả về giá trị hiện tại của item (không bị sửa).
+    """
+    segments = _split_path(path)
+
+    # Gom các thay đổi theo key cấp cao nhất: [(sub_path, value), ...]
+    updates = {}
+    if event_type == 'put' and segments:
+        updates.setdefault(segments[0], []).append((segments[1:], data))
+    elif event_type == 'patch':
+        for child_path, value in (data or {}).items():
+            child_segments = segments + _split_path(child_path)
+            if child_segments:
+                updates.setdefault(child_segments[0], []).append((child_segments[1:], value))
+
+    changes = {}
+    for key, sub_updates in updates.items():
+        new_value = current(key)
+        for sub_path, value in sub_updates:
+            new_value = _set_in(new_value, sub_path, value)
+        changes[key] = new_value if isinstance(new_value, dict) else None
+    return changes
+
+
+def item_updated_at(data):
+    """Giá trị updatedAt dùng để sắp xếp (chuỗi rỗng nếu thiếu)."""
+    value = data.get("updatedAt") if isinstance(data, dict) else None
+    return "" if value is None else str(value)
+
+
+def item_type(data):
+    """itemType của item (None nếu thiếu)."""
+    return data.get("itemType") if isinstance(data, dict) else None
+
+
+def item_categories(data):
+    """
+    Các thể loại của một item dưới dạng {slug: (_id, name)}.
+    name là None nếu entry thể loại không có tên; entry không có slug bị bỏ qua.
+    """
+    categories = data.get("category") if isinstance(data, dict) else None
+    if not isinstance(categories, list):
+        return {}
+    result = {}
+    for cat_info in categories:
+        if isinstance(cat_info, dict) and cat_info.get("slug"):
+            slug = cat_info["slug"]
+            name = cat_info.get("name")
+            if name is not None or slug not in result:
+                result[slug] = (cat_info.get("id", slug), name)
+    return result
+
+
+class SortedKeyList:
+    """
+    Danh sách key được giữ sắp xếp theo (sort_value, key).
+    Thêm/xóa bằng bisect; đọc một trang theo thứ tự giảm dần chỉ tốn O(kích thước trang).
+    """
+
+    def __init__(self, entries=None):
+        self._entries = sorted(entries) if entries else []
+
+    def add(self, sort_value, key):
+        bisect.insort(self._entries, (sort_value, key))
+
+    def remove(self, sort_value, key):
+        entry = (sort_value, key)
+        index = bisect.bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    def page_desc(self, start, count):
+        """Lấy count key bắt đầu từ vị trí start, tính theo thứ tự giảm dần."""
+        end = len(self._entries) - max(start, 0)
+        if end <= 0 or count <= 0:
+            return []
+        begin = max(end - count, 0)
+        return [key for _, key in reversed(self._entries[begin:end])]
+
+    def before_desc(self, sort_value, key, count):
+        """
+        Lấy tối đa count key đứng sau (sort_value, key) theo thứ tự giảm dần (phân trang keyset).
+        Trả về (các key, còn key phía sau hay không).
+        """
+        end = bisect.bisect_left(self._entries, (sort_value, key))
+        begin = max(end - max(count, 0), 0)
+        return [entry_key for _, entry_key in reversed(self._entries[begin:end])], begin > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FieldEquals:
+    """
+    Điều kiện của một feed: item có child bằng value. Dùng được như predicate(data) -> bool;
+    child/value cho phép kho dữ liệu lọc bằng chỉ mục thay vì đọc rồi lọc từng item.
+    """
+
+    __slots__ = ("child", "value")
+
+    def __init__(self, child, value):
+        self.child = child
+        self.value = value
+
+    def __call__(self, data):
+        return isinstance(data, dict) and data.get(self.child) == self.value
+
+    def __repr__(self):
+        return f"FieldEquals({self.child!r}, {self.value!r})"
+
+
+class FeedIndex:
+    """
+    Các feed (danh sách /v1/api/danh-sach/<type>) dựng sẵn trong bộ nhớ.
+    Mỗi feed được khai báo bằng một predicate(data) -> bool và được giữ như một
+    SortedKeyList theo updatedAt, cập nhật tăng dần khi item thay đổi,
+    nên tổng số item luôn chính xác và mỗi trang chỉ tốn O(kích thước trang).
+    """
+
+    def __init__(self, feeds):
+        self._predicates = dict(feeds)
+        self._feeds = {name: SortedKeyList() for name in self._predicates}
+
+    def rebuild(self, items):
+        grouped = {name: [] for name in self._predicates}
+        for key, data in items.items():
+            sort_value = item_updated_at(data)
+            for name, predicate in self._predicates.items():
+                if self._matches(predicate, data):
+                    grouped[name].append((sort_value, key))
+        self._feeds = {name: SortedKeyList(entries) for name, entries in grouped.items()}
+
+    def update(self, key, old, new):
+        old_sort, new_sort = item_updated_at(old), item_updated_at(new)
+        for name, predicate in self._predicates.items():
+            was_member = old is not None and self._matches(predicate, old)
+            is_member = new is not None and self._matches(predicate, new)
+            if was_member == is_member and (not is_member or old_sort == new_sort):
+                continue
+            feed = self._feeds[name]
+            if was_member:
+                feed.remove(old_sort, key)
+            if is_member:
+                feed.add(new_sort, key)
+
+    @staticmethod
+    def _matches(predicate, data):
+        return isinstance(data, dict) and bool(predicate(data))
+
+    def __contains__(self, name):
+        return name in self._feeds
+
+    def count(self, name):
+        return len(self._feeds[name])
+
+    def page(self, name, start, count):
+        return self._feeds[name].page_desc(start, count)
+
+    def page_after(self, name, cursor_sort_value, cursor_key, count):
+        return self._feeds[name].before_desc(cursor_sort_value, cursor_key, count)
+
+
+# Các trường của thẻ item trong các route danh sách (trang chủ, danh sách, thể loại, tìm kiếm).
+# author và views được màn hình chi tiết của app đọc ngay từ thẻ (Story.fromJson)
+CARD_FIELDS = (
+    "_id", "slug", "name", "itemType", "thumb_url", "thumb_url_full",
+    "status", "category", "author", "views", "chaptersLatest", "totalChapters", "updatedAt"
+)
+
+_MISSING = object()
+
+
+class ItemCard:
+    """
+    Thẻ danh sách đã định dạng của một item, chỉ giữ các trường trong CARD_FIELDS.
+    Trường thiếu trong item thì không được gán (và không xuất hiện trong to_dict).
+    """
+
+    __slots__ = CARD_FIELDS
+
+    def __init__(self, formatted):
+        for field in CARD_FIELDS:
+            if field in formatted:
+                setattr(self, field, formatted[field])
+
+    @staticmethod
+    def covers(fields):
+        """True nếu mọi trường trong fields đều là trường của thẻ."""
+        return all(field in CARD_FIELDS for field in fields)
+
+    def to_dict(self, fields=CARD_FIELDS):
+        result = {}
+        for field in fields:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                result[field] = value
+        return result
+
+
+class CardIndex:
+    """
+    Thẻ danh sách (ItemCard) của từng item, tính một lần khi item vào hoặc đổi trong catalog
+    bằng make_card(key, data) -> dict đã định dạng (hoặc None để bỏ qua item).
+    Handler chỉ cần ghép các thẻ có sẵn, không định dạng lại từng item mỗi request.
+    """
+
+    def __init__(self, make_card):
+        self._make_card = make_card
+        self._cards = {}
+
+    def _build(self, key, data):
+        formatted = self._make_card(key, data)
+        return ItemCard(formatted) if formatted else None
+
+    def rebuild(self, items):
+        cards = {}
+        for key, data in items.items():
+            card = self._build(key, data)
+            if card is not None:
+                cards[key] = card
+        self._cards = cards
+
+    def update(self, key, old, new):
+        card = self._build(key, new) if new is not None else None
+        if card is None:
+            self._cards.pop(key, None)
+        else:
+            self._cards[key] = card
+
+    def get(self, key):
+        return self._cards.get(key)
+
+    def __len__(self):
+        return len(self._cards)
+
+
+class CategoryIndex:
+    """
+    Chỉ mục ngược: slug thể loại -> các key item, sắp xếp theo updatedAt (mới nhất trước).
+    Đồng thời duy trì bảng thể loại (slug, name, _id, số item theo itemType)
+    cho /v1/api/the-loai, kèm version tăng mỗi khi bảng thay đổi.
+    Được CatalogSnapshot cập nhật tăng dần khi item được thêm, xóa hoặc gắn lại thể loại.
+    """
+
+    def __init__(self):
+        self._by_slug = {}
+        self._info = {}
+        self._type_counts = {}
+        self._table = None
+        self.version = 0
+
+    def rebuild(self, items):
+        self._by_slug = {}
+        self._info = {}
+        self._type_counts = {}
+        grouped = {}
+        for key, data in items.items():
+            sort_value = item_updated_at(data)
+            for slug in item_categories(data):
+                grouped.setdefault(slug, []).append((sort_value, key))
+            self._count(data, 1)
+        self._by_slug = {slug: SortedKeyList(entries) for slug, entries in grouped.items()}
+        self._changed()
+
+    def update(self, key, old, new):
+        old_categories, new_categories = item_categories(old), item_categories(new)
+        old_sort, new_sort = item_updated_at(old), item_updated_at(new)
+        if (old_categories == new_categories and old_sort == new_sort
+                and item_type(old) == item_type(new)):
+            return
+
+        for slug in old_categories:
+            keys = self._by_slug.get(slug)
+            if keys is not None:
+                keys.remove(old_sort, key)
+                if not keys:
+                    del self._by_slug[slug]
+        for slug in new_categories:
+            self._by_slug.setdefault(slug, SortedKeyList()).add(new_sort, key)
+
+        self._count(old, -1)
+        self._count(new, 1)
+        self._changed()
+
+    def _count(self, data, delta):
+        """Cộng/trừ số item theo itemType cho các thể loại của data."""
+        type_name = item_type(data) or "unknown"
+        for slug, (cat_id, name) in item_categories(data).items():
+            counts = self._type_counts.setdefault(slug, {})
+            counts[type_name] = counts.get(type_name, 0) + delta
+            if counts[type_name] <= 0:
+                del counts[type_name]
+            if not counts:
+                del self._type_counts[slug]
+                self._info.pop(slug, None)
+            elif delta > 0 and name is not None:
+                self._info[slug] = (cat_id, name)
+
+    def _changed(self):
+        self.version += 1
+        self._table = None
+
+    def count(self, slug):
+        keys = self._by_slug.get(slug)
+        return len(keys) if keys else 0
+
+    def page(self, slug, start, count):
+        keys = self._by_slug.get(slug)
+        return keys.page_desc(start, count) if keys else []
+
+    def table(self):
+        """
+        Danh sách thể loại đã tính sẵn cho /v1/api/the-loai.
+        Chỉ được dựng lại sau khi bảng thay đổi; không được sửa list trả về.
+        """
+        if self._table is None:
+            self._table = [
+                {
+                    "_id": cat_id,
+                    "slug": slug,
+                    "name": name,
+                    "totalItems": self.count(slug),
+                    "itemCounts": dict(self._type_counts.get(slug, {}))
+                }
+                for slug, (cat_id, name) in self._info.items()
+            ]
+        return self._table
+
+
+class CatalogSnapshot:
+    """
+    Bản sao trong bộ nhớ của library_items, dùng chung cho toàn bộ tiến trình.
+
+    Các item không bao giờ bị sửa tại chỗ: mỗi thay đổi tạo ra dict mới
+    (copy-on-write), nên handler có thể đọc một item mà không cần giữ lock.
+    Các chỉ mục phụ (thể loại, tìm kiếm, ...) đăng ký qua register_index()
+    và được cập nhật tăng dần mỗi khi một item thay đổi.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._indexes = []
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._listener = None
+        self.version = 0
+        self.last_modified = None
+        # Định danh của snapshot trong tiến trình này; version bắt đầu lại từ 0 sau mỗi lần khởi động,
+        # nên các giá trị (epoch, version) không bao giờ trùng giữa hai tiến trình khác nhau
+        self.epoch = uuid.uuid4().hex[:12]
+        self._item_stamps = {}
+        self._base_stamp = (0, None)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def register_index(self, index):
+        """
+        Đăng ký một chỉ mục phụ. index cần có:
+          - rebuild(items): dựng lại từ dict {key: data}
+          - update(key, old, new): cập nhật khi một item đổi (old/new có thể là None)
+        """
+        with self._lock:
+            self._indexes.append(index)
+            if self.ready:
+                index.rebuild(self._items)
+        return index
+
+    def start(self, ref, timeout=None):
+        """
+        Bắt đầu lắng nghe ref (db.Reference) và chờ sự kiện put đầu tiên
+        (chứa toàn bộ dữ liệu) trong tối đa timeout giây.
+        Trả về True nếu snapshot đã sẵn sàng.
+        """
+        self._listener = ref.listen(self._on_event)
+        return self._ready.wait(timeout)
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def _on_event(self, event):
+        try:
+            self.apply_event(event.event_type, event.path, event.data)
+        except Exception as e:
+            print(f"Lỗi áp dụng sự kiện catalog ({event.event_type} {event.path}): {e}")
+
+    def apply_event(self, event_type, path, data):
+        """Áp dụng một sự kiện put/patch của RTDB vào snapshot."""
+        if is_root_put(event_type, path):
+            self.replace_all(data)
+            return
+
+        with self._lock:
+            self._commit(event_changes(event_type, path, data, self._items.get))
+
+    def replace_all(self, data):
+        """Thay toàn bộ snapshot (sự kiện put tại gốc hoặc tải lần đầu)."""
+        items = items_from_root(data)
+
+        with self._lock:
+            self._items = items
+            for index in self._indexes:
+                index.rebuild(self._items)
+            self._touch()
+            self._item_stamps = {}
+            self._base_stamp = (self.version, self.last_modified)
+        self._ready.set()
+        print(f"Catalog snapshot đã tải {len(items)} items (phiên bản {self.version}).")
+
+    def _commit(self, changes):
+        changed_keys = []
+        for key, new in changes.items():
+            old = self._items.get(key)
+            if old is new:
+                continue
+            if new is None:
+                self._items.pop(key, None)
+            else:
+                self._items[key] = new
+            for index in self._indexes:
+                index.update(key, old, new)
+            changed_keys.append(key)
+        self._touch()
+        for key in changed_keys:
+            self._item_stamps[key] = (self.version, self.last_modified)
+
+    def _touch(self):
+        self.version += 1
+        self.last_modified = time.time()
+
+    def item_stamp(self, key):
+        """(version, thời điểm) của lần thay đổi gần nhất của item key."""
+        with self._lock:
+            return self._item_stamps.get(key, self._base_stamp)
+
+    def get(self, key):
+        """Lấy item theo key, hoặc None. Không được sửa dict trả về."""
+        return self._items.get(key)
+
+    def items(self):
+        """Danh sách (key, data) tại thời điểm gọi. Không được sửa các dict bên trong."""
+        with self._lock:
+            return list(self._items.items())
+
+    def as_dict(self):
+        """Bản sao nông của snapshot dưới dạng {key: data}."""
+        with self._lock:
+            return dict(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class KeyResolver:
+    """
+    Phân giải slug hoặc _id thành key thật trong library_items.
+
+    Khi catalog đã sẵn sàng, key được tra ngay trong snapshot, không cần gọi mạng.
+    Trước đó, mỗi lần thử một key là một lần đọc Firebase (fetch(key)); key tìm thấy được
+    nhớ lại để lần sau đọc đúng key ngay, key không tồn tại được nhớ trong negative_ttl giây.
+    Nếu có executor (đối tượng có map(), ví dụ blocking_calls.BlockingExecutor), các key ứng viên
+    được đọc song song (một vòng chờ mạng thay vì vài vòng).
+    Đăng ký như một chỉ mục của catalog để mọi thay đổi item xóa cache tương ứng.
+    """
+
+    def __init__(self, catalog, fetch, negative_ttl=30, max_entries=10000, executor=None):
+        self._catalog = catalog
+        self._fetch = fetch
+        self._executor = executor
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._resolved = {}   # (slug_or_id, prefixes) -> key
+        self._missing = {}    # key -> thời điểm hết hạn (time.monotonic())
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.negative_hits = 0
+
+    def rebuild(self, items):
+        with self._lock:
+            self._resolved.clear()
+            self._missing.clear()
+
+    def update(self, key, old, new):
+        with self._lock:
+            self._missing.pop(key, None)
+            if new is None:
+                for query in [q for q, k in self._resolved.items() if k == key]:
+                    del self._resolved[query]
+
+    def resolve(self, slug_or_id, prefixes=()):
+        """
+        Thử lần lượt slug_or_id rồi f"{prefix}{slug_or_id}" với từng prefix.
+        Trả về (key, data) của item đầu tiên tìm thấy, hoặc (None, None).
+        """
+        prefixes = tuple(prefixes)
+        candidates = [slug_or_id] + [f"{prefix}{slug_or_id}" for prefix in prefixes]
+
+        if self._catalog.ready:
+            for key in candidates:
+                data = self._catalog.get(key)
+                if isinstance(data, dict) and data:
+                    return key, data
+            return None, None
+
+        query = (slug_or_id, prefixes)
+        with self._lock:
+            known_key = self._resolved.get(query)
+        if known_key is not None:
+            candidates.remove(known_key)
+            candidates.insert(0, known_key)
+        candidates = [key for key in candidates if not self._is_missing(key)]
+
+        # Key đã biết gần như chắc chắn đúng: đọc riêng nó trước, chỉ đọc các key còn lại nếu cần
+        batches = [candidates[:1], candidates[1:]] if known_key is not None else [candidates]
+        for batch in batches:
+            for key, data in zip(batch, self._fetch_all(batch)):
+                if isinstance(data, dict) and data:
+                    with self._lock:
+                        self._prune(self._resolved)
+                        self._resolved[query] = key
+                    return key, data
+                with self._lock:
+                    self._prune(self._missing)
+                    self._missing[key] = time.monotonic() + self.negative_ttl
+        return None, None
+
+    def _fetch_all(self, keys):
+        """Dữ liệu của các key theo đúng thứ tự: song song qua executor, hoặc lần lượt (dừng sớm khi đã tìm thấy)."""
+        if self._executor is None or len(keys) < 2:
+            return map(self._counted_fetch, keys)
+        return self._executor.map(self._counted_fetch, keys)
+
+    def _counted_fetch(self, key):
+        # Chỉ đếm lần đọc đã xong: ở chế độ ASGI, fetch có thể dừng (PendingCalls) rồi được gọi lại
+        data = self._fetch(key)
+        with self._lock:
+            self.fetches += 1
+        return data
+
+    def _is_missing(self, key):
+        with self._lock:
+            expires_at = self._missing.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._missing[key]
+                return False
+            self.negative_hits += 1
+            return True
+
+    def _prune(self, entries):
+        if len(entries) < self.max_entries:
+            return
+        if entries is self._missing:
+            now = time.monotonic()
+            for key in [k for k, expires_at in entries.items() if expires_at <= now]:
+                del entries[key]
+        if len(entries) >= self.max_entries:
+            entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resolvedKeys": len(self._resolved),
+                "missingKeys": len(self._missing),
+                "fetches": self.fetches,
+                "negativeHits": self.negative_hits
+            }
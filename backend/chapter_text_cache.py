@@ -0,0 +1,152 @@
+"""
+Cache hai tầng cho text đã làm sạch của các chương EPUB.
+
+Tầng 1: LRU trong bộ nhớ, giới hạn theo tổng số bytes.
+Tầng 2: kho nén gzip trên đĩa, đặt cạnh file EPUB:
+    media/ebooks/<slug>/<file>.epub.textcache/<phiên bản file>/<sha1(href)>.json.gz
+
+Mỗi entry được định danh bởi fingerprint của sách (đường dẫn, mtime, kích thước) và href,
+nên khi file EPUB thay đổi, các entry cũ không còn được dùng và thư mục cũ bị xóa.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DISK_SUFFIX = ".textcache"
+
+
+def fingerprint_token(fingerprint):
+    """Tên thư mục cho một phiên bản của file EPUB."""
+    _, mtime_ns, size = fingerprint
+    return f"{size:x}-{mtime_ns:x}"
+
+
+def _entry_size(value):
+    return sum(len(str(v).encode('utf-8')) for v in value.values())
+
+
+class ChapterTextCache:
+    """
+    Cache {'title': str, 'content': str} của từng chương.
+    on_disk=False chỉ dùng tầng bộ nhớ.
+    """
+
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, on_disk=True, compress_level=6):
+        self.max_memory_bytes = max_memory_bytes
+        self.on_disk = on_disk
+        self.compress_level = compress_level
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._cleaned_books = set()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def book_cache_dir(book_path):
+        """Thư mục cache trên đĩa của một file EPUB."""
+        return Path(f"{book_path}{DISK_SUFFIX}")
+
+    def _disk_path(self, fingerprint, href):
+        digest = hashlib.sha1(href.encode('utf-8')).hexdigest()
+        return self.book_cache_dir(fingerprint[0]) / fingerprint_token(fingerprint) / f"{digest}.json.gz"
+
+    def get(self, fingerprint, href):
+        """Lấy text đã cache của chương, hoặc None."""
+        key = (fingerprint, href)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+        if self.on_disk:
+            value = self._read_disk(fingerprint, href)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def is_on_disk(self, fingerprint, href):
+        """Text của chương đã có trong kho trên đĩa chưa (không đọc nội dung)."""
+        return self.on_disk and self._disk_path(fingerprint, href).is_file()
+
+    def put(self, fingerprint, href, value):
+        """Lưu text của chương vào cả hai tầng."""
+        with self._lock:
+            self._remember((fingerprint, href), value)
+        if self.on_disk:
+            self._write_disk(fingerprint, href, value)
+
+    def _remember(self, key, value):
+        if key in self._entries:
+            return
+        size = _entry_size(value)
+        if size > self.max_memory_bytes:
+            return
+        self._entries[key] = value
+        self._current_bytes += size
+        while self._current_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._current_bytes -= _entry_size(evicted)
+
+    def _read_disk(self, fingerprint, href):
+        try:
+            with gzip.open(self._disk_path(fingerprint, href), 'rb') as f:
+                value = json.loads(f.read().decode('utf-8'))
+        except (OSError, ValueError, EOFError):
+            return None
+        # Phòng trường hợp trùng hash: href lưu trong file phải khớp
+        if not isinstance(value, dict) or value.pop('href', None) != href:
+            return None
+        return value
+
+    def _write_disk(self, fingerprint, href, value):
+        path = self._disk_path(fingerprint, href)
+        try:
+            self._drop_stale_versions(fingerprint)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            payload = json.dumps(dict(value, href=href), ensure_ascii=False).encode('utf-8')
+            tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}-{threading.get_ident()}")
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(payload, compresslevel=self.compress_level))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Không thể ghi cache text chương {href}: {e}")
+
+    def _drop_stale_versions(self, fingerprint):
+        """Xóa thư mục cache của các phiên bản cũ của cùng file EPUB (một lần mỗi phiên bản)."""
+        if fingerprint in self._cleaned_books:
+            return
+        book_dir = self.book_cache_dir(fingerprint[0])
+        current = fingerprint_token(fingerprint)
+        if book_dir.is_dir():
+            for version_dir in book_dir.iterdir():
+                if version_dir.name != current:
+                    shutil.rmtree(version_dir, ignore_errors=True)
+        self._cleaned_books.add(fingerprint)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memoryBytes": self._current_bytes,
+                "maxMemoryBytes": self.max_memory_bytes,
+                "memoryHits": self.memory_hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "onDisk": self.on_disk
+            }
@@ -0,0 +1,161 @@
+"""
+Nén response (gzip, hoặc brotli nếu đã cài gói Brotli) theo Accept-Encoding của client.
+
+Chỉ nén các response 200 dạng JSON/NDJSON/text lớn hơn ngưỡng. Response có ETag
+(chương, danh sách, ...) được lưu lại ở dạng đã nén, theo (ETag, encoding), nên các lần
+gửi lại cùng nội dung không phải nén lại. Response dạng stream (NDJSON tải nhiều chương)
+được nén theo từng đoạn, mỗi dòng vẫn được gửi đi ngay.
+"""
+
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Brotli là tùy chọn, không có thì chỉ dùng gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/html', 'text/plain', 'text/css', 'text/xml', 'application/xml'
+])
+
+
+def available_encodings():
+    """Các encoding server hỗ trợ, theo thứ tự ưu tiên khi client chấp nhận như nhau."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Chọn encoding có quality cao nhất mà client chấp nhận (None nếu không có)."""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _StreamCompressor:
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31: định dạng gzip
+        self._encoding = encoding
+
+    def chunk(self, data):
+        """Nén một đoạn và flush để client nhận được ngay."""
+        if self._encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self._encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class ResponseCompressor:
+    """
+    Hook after_request của Flask nén response theo Accept-Encoding.
+    Các bản nén được lưu trong LRU giới hạn cache_max_bytes, theo (ETag, encoding).
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, cache_max_bytes=32 * 1024 * 1024):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_max_bytes = cache_max_bytes
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.compressed = 0
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def compress_response(self, response):
+        if (request.method == 'HEAD' or response.status_code != 200
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        # Nội dung trả về phụ thuộc Accept-Encoding, kể cả khi lần này không nén
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        elif response.direct_passthrough:
+            return response
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            etag, _ = response.get_etag()
+            body = self._cached(etag, encoding) if etag else None
+            if body is None:
+                body = self.compress(data, encoding)
+                with self._lock:
+                    self.compressed += 1
+                if etag:
+                    self._store(etag, encoding, body)
+            response.set_data(body)
+
+        # ETag của http_cache.conditional đã là weak, dùng chung cho bản nén và bản gốc
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress_stream(self, chunks, encoding):
+        compressor = _StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.chunk(chunk)
+        yield compressor.finish()
+
+    def _cached(self, etag, encoding):
+        with self._lock:
+            body = self._cache.get((etag, encoding))
+            if body is not None:
+                self._cache.move_to_end((etag, encoding))
+                self.cache_hits += 1
+            return body
+
+    def _store(self, etag, encoding, body):
+        if len(body) > self.cache_max_bytes:
+            return
+        with self._lock:
+            if (etag, encoding) in self._cache:
+                return
+            self._cache[(etag, encoding)] = body
+            self._cache_bytes += len(body)
+            while self._cache_bytes > self.cache_max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "encodings": list(available_encodings()),
+                "minSize": self.min_size,
+                "cachedPayloads": len(self._cache),
+                "cachedBytes": self._cache_bytes,
+                "cacheHits": self.cache_hits,
+                "compressed": self.compressed
+            }
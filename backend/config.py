@@ -14,6 +14,23 @@ FIREBASE_REALTIME_DATABASE_URL = "https://truyen-flutter-default-rtdb.firebaseio
 # Điều này tương ứng với FIRESTORE_COLLECTION trong cấu hình các script
 FIREBASE_DB_ROOT_NODE = "library_items"
 
+# --- Cấu hình kho dữ liệu ---
+# "firebase": đọc library_items từ Firebase Realtime Database (cần service account key ở trên)
+# "sqlite": đọc từ file SQLite cục bộ có chỉ mục, không cần mạng; nạp file bằng
+#           python storage.py import <export.json>   hoặc   python storage.py import --from-firebase
+STORAGE_BACKEND = "firebase"
+# Đường dẫn file SQLite (tương đối so với thư mục backend) khi STORAGE_BACKEND = "sqlite"
+SQLITE_DB_PATH = "data/library_items.sqlite3"
+# Số giây giữa hai lần server kiểm tra thay đổi mới trong file SQLite (do replica_sync.py ghi)
+# để cập nhật catalog trong bộ nhớ; 0 hoặc None = chỉ đọc file một lần khi khởi động
+SQLITE_POLL_INTERVAL = 1.0
+
+# --- Cấu hình đồng bộ bản sao SQLite (replica_sync.py) ---
+# Giữ nhật ký thay đổi trong bao lâu (giây); server ngừng lâu hơn thời gian này sẽ tải lại toàn bộ file
+REPLICA_CHANGES_RETENTION = 24 * 3600
+# Số giây giữa hai lần dọn nhật ký thay đổi
+REPLICA_PRUNE_INTERVAL = 3600
+
 # --- Cấu hình Media ---
 # URL cơ sở để truy cập media ebook (ảnh bìa, file epub) được lưu trữ cục bộ hoặc trên server riêng.
 # Điều này được sử dụng để xây dựng URL đầy đủ cho các tài nguyên ebook trong phản hồi API.
@@ -31,4 +48,83 @@ EBOOKS_URL_SUBPATH = "ebooks"
 OTRUYEN_CDN_IMAGE_DOMAIN = "https://img.otruyenapi.com"
 
 # Số mục mặc định trên mỗi trang cho phân trang
-DEFAULT_ITEMS_PER_PAGE = 24 
\ No newline at end of file
+DEFAULT_ITEMS_PER_PAGE = 24 
+# Số item đọc mỗi lô từ Firebase khi phân trang theo cursor mà catalog snapshot chưa sẵn sàng
+# (các item không thuộc danh sách được lọc bỏ, nên lô cần lớn hơn một trang)
+LIST_CURSOR_BATCH_SIZE = 100
+# Số lô tối đa quét theo updatedAt cho một trang; feed thưa hơn thế được đọc bằng truy vấn
+# equal_to trên itemType/status (cần .indexOn, xem README) thay vì quét tiếp các item không liên quan
+LIST_CURSOR_MAX_BATCHES = 3
+# --- Cấu hình Catalog trong bộ nhớ ---
+# Số giây tối đa chờ snapshot library_items được tải lần đầu khi khởi động.
+# Hết thời gian chờ, các route sẽ tạm đọc trực tiếp từ Firebase cho đến khi snapshot sẵn sàng.
+CATALOG_READY_TIMEOUT = 60
+# Số giây ghi nhớ một key không tồn tại trong library_items (khi phải đọc trực tiếp từ Firebase),
+# để các request lặp lại với slug sai không gọi Firebase liên tục
+KEY_RESOLVER_NEGATIVE_TTL = 30
+# Số luồng đọc Firebase song song các key ứng viên của một slug (1 = đọc lần lượt)
+KEY_RESOLVER_PROBE_WORKERS = 8
+
+# --- Cấu hình trang chủ (/v1/api/home) ---
+# Số item mới nhất (theo createdAt) được đưa lên trang chủ
+HOME_FEED_WINDOW = 100
+# Chu kỳ (giây) thread nền làm mới trang chủ, kể cả khi không nhận được thay đổi nào
+HOME_FEED_REFRESH_INTERVAL = 60
+# Khoảng chờ (giây) sau một thay đổi của catalog trước khi dựng lại, để gom các thay đổi liên tiếp
+HOME_FEED_MIN_REFRESH_GAP = 1
+
+# --- Cấu hình lấy chi tiết nhiều truyện (/v1/api/truyen-tranh/batch) ---
+# Số id tối đa trong một request
+BATCH_MAX_IDS = 100
+# Số luồng đọc Firebase song song khi catalog snapshot chưa sẵn sàng
+BATCH_FETCH_WORKERS = 8
+
+# --- Cấu hình HTTP cache (ETag / Last-Modified / 304) ---
+# max-age (giây) cho response danh sách/chi tiết; 0 = client lưu nhưng luôn hỏi lại (thường nhận 304)
+HTTP_CACHE_MAX_AGE_CATALOG = 0
+# max-age (giây) cho mục lục và nội dung chương EPUB, vốn chỉ đổi khi file EPUB đổi
+HTTP_CACHE_MAX_AGE_EPUB = 3600
+# Bộ nhớ tối đa (bytes) cho body response đã mã hóa được giữ lại theo ETag (danh sách, mục lục, ...)
+RESPONSE_BODY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# --- Cấu hình chế độ ASGI (uvicorn asgi_app:app, xem asgi_app.py) ---
+# Số lời gọi kho dữ liệu (đọc Firebase/SQLite, thử các key ứng viên) chạy cùng lúc; request chờ lượt
+# không giữ thread nào. Phần lớn thời gian là chờ mạng nên có thể đặt lớn
+ASGI_STORAGE_WORKERS = 64
+# Số lời gọi EPUB (mở sách, dựng chỉ mục, đọc chương, gửi từng phần body dạng stream) chạy cùng lúc
+ASGI_EPUB_WORKERS = 8
+
+# --- Cấu hình JSON ---
+# Mã hóa JSON bằng orjson (có trong requirements.txt, kể cả khi chạy debug); False để luôn dùng json chuẩn
+JSON_USE_ORJSON = True
+
+# --- Cấu hình nén response ---
+# Chỉ nén response lớn hơn ngưỡng này (bytes). Brotli được dùng nếu đã cài gói Brotli (pip install Brotli)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+# Bộ nhớ tối đa (bytes) cho các payload đã nén được giữ lại theo ETag (chương, danh sách, ...)
+COMPRESSED_PAYLOAD_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# --- Cấu hình EPUB ---
+# Số EPUB đã phân tích tối đa được giữ trong cache bộ nhớ
+EPUB_CACHE_MAX_ENTRIES = 32
+# Bộ nhớ ước tính tối đa (bytes) cho cache EPUB: metadata đã phân tích (OPF, mục lục)
+# và central directory của zip; nội dung chương không được giữ trong bộ nhớ
+EPUB_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Bộ nhớ tối đa (bytes) cho cache text chương đã làm sạch
+CHAPTER_TEXT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Lưu thêm text chương đã làm sạch (nén gzip) trên đĩa, cạnh file EPUB
+CHAPTER_TEXT_CACHE_ON_DISK = True
+
+# --- Cấu hình pool tiến trình EPUB (epub_workers.py) ---
+# Số tiến trình con chuyển HTML chương thành text và dựng chỉ mục chương; 0 = xử lý ngay trong server
+EPUB_WORKER_PROCESSES = 2
+# Thời gian chạy tối đa (giây) của một việc, không tính lúc chờ tiến trình rảnh; quá hạn thì tiến trình con đó bị dừng và request nhận lỗi
+EPUB_TASK_TIMEOUT = 30
+# HTML chương dài hơn (ký tự) bị từ chối thay vì chuyển đổi
+EPUB_MAX_CHAPTER_CHARS = 8 * 1024 * 1024
+# HTML chương ngắn hơn (ký tự) được chuyển ngay trong server, rẻ hơn gửi sang tiến trình con
+EPUB_INLINE_MAX_CHARS = 16 * 1024
+# Thay mỗi tiến trình con bằng tiến trình mới sau số việc này, để giải phóng bộ nhớ
+EPUB_WORKER_MAX_TASKS = 500
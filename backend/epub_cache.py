@@ -0,0 +1,197 @@
+"""
+Cache LRU cho các EPUB đã được phân tích.
+Mỗi entry được định danh bởi (đường dẫn, mtime, kích thước), nên file EPUB bị thay thế
+sẽ tự động được phân tích lại. Cache giới hạn theo số entry và theo bộ nhớ ước tính
+(book.memory_estimate() nếu sách có, nếu không thì chỉ giới hạn theo số entry).
+Sách bị đẩy khỏi cache được đóng (close()) ngay khi không còn request nào đang đọc nó.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def file_fingerprint(path):
+    """Trả về (đường dẫn tuyệt đối, mtime_ns, kích thước) của file."""
+    path = os.path.abspath(str(path))
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def estimate_book_memory(book):
+    """Bộ nhớ ước tính của sách đã mở theo book.memory_estimate(), 0 nếu sách không hỗ trợ."""
+    memory_estimate = getattr(book, "memory_estimate", None)
+    return memory_estimate() if memory_estimate is not None else 0
+
+
+class CachedEpub:
+    """
+    Một EPUB đã phân tích cùng các dữ liệu dẫn xuất (TOC, ...) được tính một lần.
+    Đếm số người đang dùng (ParsedEpubCache.acquire/borrow): sách bị đẩy khỏi cache chỉ được
+    đóng khi người dùng cuối cùng gọi release().
+    """
+
+    def __init__(self, fingerprint, book, size_estimate):
+        self.fingerprint = fingerprint
+        self.book = book
+        self.size_estimate = size_estimate
+        self._derived = {}
+        self._lock = threading.Lock()
+        self._users = 0
+        self._evicted = False
+        self._users_lock = threading.Lock()
+
+    def memo(self, name, compute):
+        """Tính compute() một lần cho entry này và lưu lại dưới tên name."""
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = compute()
+            return self._derived[name]
+
+    def _acquire(self):
+        with self._users_lock:
+            self._users += 1
+
+    def release(self):
+        """Kết thúc một lần dùng bắt đầu bởi ParsedEpubCache.acquire()."""
+        with self._users_lock:
+            self._users -= 1
+            close = self._evicted and self._users == 0
+        if close:
+            self._close_book()
+
+    def _evict(self):
+        """Entry đã rời cache: đóng sách ngay nếu không ai đang dùng, nếu không thì khi release() cuối cùng."""
+        with self._users_lock:
+            self._evicted = True
+            close = self._users == 0
+        if close:
+            self._close_book()
+
+    def _close_book(self):
+        close = getattr(self.book, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"Lỗi đóng EPUB {self.fingerprint[0]}: {e}")
+
+
+class ParsedEpubCache:
+    """
+    Cache LRU giới hạn số entry và bộ nhớ ước tính, kèm bộ đếm hit/miss.
+    loader(path) nhận đường dẫn file và trả về đối tượng sách đã phân tích (có close() nếu cần đóng).
+
+    Đọc nội dung sách (book.read_...) phải nằm trong borrow(path), hoặc giữa acquire(path)
+    và entry.release(), để sách không bị đóng giữa chừng khi bị đẩy khỏi cache.
+    get(path) chỉ dùng cho dữ liệu đã có trong bộ nhớ (TOC, memo).
+    """
+
+    def __init__(self, loader, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self._loader = loader
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """Lấy CachedEpub cho path, phân tích file nếu chưa có hoặc file đã thay đổi."""
+        return self._get(path, acquire=False)
+
+    def acquire(self, path):
+        """Như get(), nhưng sách không bị đóng cho đến khi gọi entry.release()."""
+        return self._get(path, acquire=True)
+
+    @contextmanager
+    def borrow(self, path):
+        """Khối with dùng CachedEpub của path: acquire() khi vào, release() khi ra."""
+        entry = self.acquire(path)
+        try:
+            yield entry
+        finally:
+            entry.release()
+
+    def _get(self, path, acquire):
+        fingerprint = file_fingerprint(path)
+
+        with self._lock:
+            entry = self._lookup(fingerprint)
+            if entry is not None:
+                if acquire:
+                    entry._acquire()
+                return entry
+            loading_lock = self._loading_locks.setdefault(fingerprint, threading.Lock())
+
+        # Chỉ một thread phân tích mỗi file; các thread khác chờ và dùng lại kết quả
+        with loading_lock:
+            try:
+                with self._lock:
+                    entry = self._lookup(fingerprint, count=False)
+                    if entry is not None:
+                        if acquire:
+                            entry._acquire()
+                        return entry
+                    self.misses += 1
+
+                book = self._loader(fingerprint[0])
+                entry = CachedEpub(fingerprint, book, estimate_book_memory(book))
+                if acquire:
+                    entry._acquire()
+
+                with self._lock:
+                    self._insert(entry)
+                return entry
+            finally:
+                with self._lock:
+                    self._loading_locks.pop(fingerprint, None)
+
+    def _lookup(self, fingerprint, count=True):
+        entry = self._entries.get(fingerprint)
+        if entry is not None:
+            self._entries.move_to_end(fingerprint)
+            if count:
+                self.hits += 1
+        return entry
+
+    def _insert(self, entry):
+        # Bỏ các phiên bản cũ của cùng file (mtime/kích thước khác)
+        for stale in [fp for fp in self._entries if fp[0] == entry.fingerprint[0]]:
+            self._drop(stale)
+
+        self._entries[entry.fingerprint] = entry
+        self._current_bytes += entry.size_estimate
+
+        while self._entries and (len(self._entries) > self.max_entries or self._current_bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            if oldest == entry.fingerprint:
+                break  # Luôn giữ entry vừa thêm, kể cả khi nó lớn hơn giới hạn
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, fingerprint):
+        entry = self._entries.pop(fingerprint)
+        self._current_bytes -= entry.size_estimate
+        entry._evict()
+
+    def clear(self):
+        with self._lock:
+            for fingerprint in list(self._entries):
+                self._drop(fingerprint)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "estimatedBytes": self._current_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,195 @@
+"""
+Chỉ mục chương (sidecar) cho từng file EPUB.
+
+Chỉ mục được lưu cạnh file EPUB, ví dụ media/ebooks/<slug>/book.epub.index.json, gồm:
+các chương nội dung theo thứ tự, href, tiêu đề, vị trí member trong zip, và (khi dựng với
+text_stats, xem preprocess_epubs.py) độ dài text và số từ.
+Nó được dựng khi import EPUB (chạy file này như script, hoặc preprocess_epubs.py cho cả thư mục
+media) hoặc tự động khi file EPUB thay đổi, để các route mục lục/chương không phải lọc lại TOC
+ở mỗi request.
+
+Cách dùng:
+    python epub_index.py media/ebooks/<slug>/<file>.epub [...]
+"""
+
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from epub_cache import file_fingerprint
+from epub_reader import EpubZipReader, extract_body_html
+from html_text import convert_chapter_html
+
+INDEX_FORMAT_VERSION = 1
+INDEX_SUFFIX = ".index.json"
+
+# Các chương không phải nội dung chính (mục lục, lời chào, giới thiệu) bị loại khỏi danh sách chương
+SKIP_TITLE_WORDS = ['mục lục', 'toc', 'chào mừng', 'welcome', 'giới thiệu', 'introduction']
+SKIP_HREF_WORDS = ['toc.html', 'welcome.html', 'intro.html']
+
+
+def is_content_chapter(chapter):
+    """Chương trong TOC có phải nội dung chính không (dựa trên title và href)."""
+    title_lower = (chapter.get('title') or '').lower()
+    href_lower = (chapter.get('href') or '').lower()
+    if any(skip_word in title_lower for skip_word in SKIP_TITLE_WORDS):
+        return False
+    if any(skip_word in href_lower for skip_word in SKIP_HREF_WORDS):
+        return False
+    return True
+
+
+def index_path_for(epub_file_path):
+    """Đường dẫn file sidecar của một EPUB."""
+    return Path(f"{epub_file_path}{INDEX_SUFFIX}")
+
+
+def build_chapter_index(reader, fingerprint, text_stats=False, on_text=None):
+    """
+    Dựng chỉ mục chương từ một EpubZipReader.
+    text_stats=True sẽ chuyển đổi từng chương để tính độ dài text và số từ (chậm, dành cho lúc import);
+    khi đó on_text(href, {'title': str, 'content': str}), nếu có, nhận text đã chuyển của từng chương.
+    Các chương chỉ có khóa textLength/wordCount khi text_stats=True (index["textStats"]).
+    """
+    _, mtime_ns, size = fingerprint
+    chapters = []
+    for chapter in reader.toc:
+        if not is_content_chapter(chapter):
+            continue
+
+        info = reader.member_info(chapter['href'])
+        entry = {
+            "number": len(chapters) + 1,
+            "title": chapter['title'],
+            "href": chapter['href'],
+            "order": chapter['order'],
+            "member": info.filename if info else None,
+            "offset": info.header_offset if info else None,
+            "compressSize": info.compress_size if info else None,
+            "fileSize": info.file_size if info else None
+        }
+        if text_stats:
+            content_html = reader.read_chapter_html(chapter['href'])
+            title, text = convert_chapter_html(extract_body_html(content_html)) if content_html else ("", "")
+            entry["textLength"] = len(text)
+            entry["wordCount"] = len(text.split())
+            if on_text is not None and content_html is not None:
+                on_text(chapter['href'], {'title': title, 'content': text})
+        chapters.append(entry)
+
+    return {
+        "formatVersion": INDEX_FORMAT_VERSION,
+        "epub": os.path.basename(reader.path),
+        "size": size,
+        "mtimeNs": mtime_ns,
+        "tocLength": len(reader.toc),
+        "textStats": text_stats,
+        "chapters": chapters
+    }
+
+
+def is_index_current(index, fingerprint):
+    """Chỉ mục có khớp với phiên bản hiện tại của file EPUB không."""
+    _, mtime_ns, size = fingerprint
+    return (
+        isinstance(index, dict)
+        and index.get("formatVersion") == INDEX_FORMAT_VERSION
+        and index.get("size") == size
+        and index.get("mtimeNs") == mtime_ns
+    )
+
+
+def load_chapter_index(epub_file_path, fingerprint):
+    """Đọc sidecar của EPUB; None nếu không có, bị lỗi hoặc đã cũ."""
+    try:
+        with open(index_path_for(epub_file_path), encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if is_index_current(index, fingerprint) else None
+
+
+def save_chapter_index(epub_file_path, index):
+    """Ghi sidecar một cách nguyên tử (ghi file tạm rồi đổi tên)."""
+    index_path = index_path_for(epub_file_path)
+    tmp_path = index_path.with_name(f"{index_path.name}.tmp{os.getpid()}")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+
+class ChapterIndexStore:
+    """
+    Cung cấp chỉ mục chương cho các route, theo thứ tự: bộ nhớ -> sidecar -> dựng lại.
+    open_reader(path) trả về EpubZipReader (thường lấy từ EPUB_CACHE).
+    build(path, fingerprint), nếu có, được dùng để dựng lại thay cho open_reader
+    (ví dụ: dựng trong pool tiến trình của epub_workers).
+    """
+
+    def __init__(self, open_reader=EpubZipReader, max_entries=256, build=None):
+        self._open_reader = open_reader
+        self._build = build
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, fingerprint):
+        with self._lock:
+            index = self._entries.get(fingerprint)
+            if index is not None:
+                self._entries.move_to_end(fingerprint)
+            return index
+
+    def cached(self, epub_file_path):
+        """Chỉ mục trong bộ nhớ của phiên bản hiện tại của file, hoặc None (không đọc sidecar hay EPUB)."""
+        return self._lookup(file_fingerprint(epub_file_path))
+
+    def get(self, epub_file_path):
+        fingerprint = file_fingerprint(epub_file_path)
+        index = self._lookup(fingerprint)
+        if index is not None:
+            return index
+
+        index = load_chapter_index(epub_file_path, fingerprint)
+        if index is None:
+            print(f"Dựng lại chỉ mục chương cho {epub_file_path}")
+            if self._build is not None:
+                index = self._build(epub_file_path, fingerprint)
+            else:
+                index = build_chapter_index(self._open_reader(str(epub_file_path)), fingerprint)
+            try:
+                save_chapter_index(epub_file_path, index)
+            except OSError as e:
+                print(f"Không thể ghi chỉ mục chương cho {epub_file_path}: {e}")
+
+        with self._lock:
+            for stale in [fp for fp in self._entries if fp[0] == fingerprint[0]]:
+                del self._entries[stale]
+            self._entries[fingerprint] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+def build_and_save(epub_file_path, text_stats=True):
+    """Dựng và ghi sidecar cho một EPUB (dùng trong script import)."""
+    fingerprint = file_fingerprint(epub_file_path)
+    reader = EpubZipReader(epub_file_path)
+    try:
+        index = build_chapter_index(reader, fingerprint, text_stats=text_stats)
+    finally:
+        reader.close()
+    save_chapter_index(epub_file_path, index)
+    return index
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        built = build_and_save(path)
+        print(f"{path}: {len(built['chapters'])} chương nội dung -> {index_path_for(path)}")
@@ -0,0 +1,233 @@
+"""
+Trình đọc EPUB truy cập ngẫu nhiên, dựa trên zipfile.
+Chỉ phân tích container.xml, file OPF và nav/NCX một lần khi mở sách;
+mỗi lần đọc chương chỉ giải nén đúng member cần thiết, nên chi phí đọc một chương
+không phụ thuộc vào kích thước cuốn sách.
+
+Mục lục được dựng giống hệt book.toc của ebooklib (ưu tiên nav của EPUB3, sau đó NCX),
+để số thứ tự chương ('order') không thay đổi đối với client.
+"""
+
+import os
+import posixpath
+import re
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+from urllib.parse import unquote
+
+from bs4 import BeautifulSoup
+
+CONTAINER_PATH = "META-INF/container.xml"
+
+NAMESPACES = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "ncx": "http://www.daisy.org/z3986/2005/ncx/",
+}
+
+# Bộ nhớ ước tính cho mỗi member trong zip (ZipInfo của central directory, bảng manifest)
+MEMBER_OVERHEAD_BYTES = 512
+
+_BODY_RE = re.compile(r'<body\b[^>]*>(.*)</body\s*>', re.IGNORECASE | re.DOTALL)
+
+
+class EpubFormatError(Exception):
+    """File EPUB không hợp lệ (thiếu container, OPF, ...)."""
+
+
+def extract_body_html(html_content):
+    """Lấy phần bên trong <body> của một tài liệu XHTML (hoặc cả tài liệu nếu không có body)."""
+    match = _BODY_RE.search(html_content)
+    return match.group(1) if match else html_content
+
+
+class EpubZipReader:
+    """
+    Một EPUB đã mở: giữ bảng href -> member trong zip và mục lục đã dựng sẵn.
+
+    Thuộc tính:
+        toc: list các chương {'title': str, 'href': str, 'order': int}
+    """
+
+    def __init__(self, epub_file_path):
+        self.path = str(epub_file_path)
+        self._archive = zipfile.ZipFile(self.path)
+        self._lock = threading.Lock()
+
+        # Tổng số byte metadata đã đọc khi mở sách (container, OPF, nav/NCX), xem memory_estimate()
+        self._metadata_bytes = 0
+
+        try:
+            container = ET.fromstring(self._read_metadata(CONTAINER_PATH))
+        except KeyError:
+            raise EpubFormatError("Không tìm thấy META-INF/container.xml")
+        rootfile = container.find(".//container:rootfile", NAMESPACES)
+        if rootfile is None or not rootfile.get("full-path"):
+            raise EpubFormatError("container.xml không khai báo file OPF")
+
+        self.opf_path = rootfile.get("full-path")
+        self.opf_dir = posixpath.dirname(self.opf_path)
+        try:
+            opf = ET.fromstring(self._read_metadata(self.opf_path))
+        except KeyError:
+            raise EpubFormatError(f"Không tìm thấy file OPF: {self.opf_path}")
+
+        # Manifest theo đúng thứ tự khai báo: id -> (file_name, media_type, properties)
+        self._manifest = {}
+        self._file_names = []
+        nav_file_name = None
+        for item in opf.iterfind("opf:manifest/opf:item", NAMESPACES):
+            href = item.get("href")
+            if not href:
+                continue
+            file_name = unquote(href)
+            properties = (item.get("properties") or "").split()
+            self._manifest[item.get("id")] = (file_name, item.get("media-type"), properties)
+            self._file_names.append(file_name)
+            if nav_file_name is None and item.get("media-type") == "application/xhtml+xml" and "nav" in properties:
+                nav_file_name = file_name
+
+        self._file_name_set = frozenset(self._file_names)
+        self._resolved_hrefs = {}
+
+        spine = opf.find("opf:spine", NAMESPACES)
+        self.spine = [itemref.get("idref") for itemref in spine.iterfind("opf:itemref", NAMESPACES)] if spine is not None else []
+        ncx_id = spine.get("toc", "") if spine is not None else ""
+
+        # Giống ebooklib: có nav thì dùng nav, nếu không thì dùng NCX được spine tham chiếu
+        toc_entries = []
+        if nav_file_name:
+            toc_entries = self._parse_nav(nav_file_name)
+        elif ncx_id and ncx_id in self._manifest:
+            toc_entries = self._parse_ncx(self._manifest[ncx_id][0])
+
+        self.toc = self._build_toc(toc_entries)
+
+    def member_name(self, file_name):
+        """Đường dẫn member trong zip của một file_name (tương đối với thư mục OPF)."""
+        return posixpath.join(self.opf_dir, file_name)
+
+    def _read_member(self, member):
+        with self._lock:
+            return self._archive.read(member)
+
+    def _read_metadata(self, member):
+        content = self._read_member(member)
+        self._metadata_bytes += len(content)
+        return content
+
+    def memory_estimate(self):
+        """
+        Bộ nhớ ước tính mà reader giữ: metadata đã phân tích (OPF, mục lục) và central directory
+        của zip. Nội dung chương không được giữ lại (chỉ giải nén khi đọc), nên không được tính.
+        """
+        return self._metadata_bytes + len(self._archive.infolist()) * MEMBER_OVERHEAD_BYTES
+
+    def _parse_ncx(self, file_name):
+        """Các mục cấp cao nhất của navMap: (title, href) hoặc None nếu là section có con."""
+        root = ET.fromstring(self._read_metadata(self.member_name(file_name)))
+        nav_map = root.find("ncx:navMap", NAMESPACES)
+        if nav_map is None:
+            return []
+
+        entries = []
+        for nav_point in nav_map.findall("ncx:navPoint", NAMESPACES):
+            if nav_point.find("ncx:navPoint", NAMESPACES) is not None:
+                entries.append(None)
+                continue
+            label = nav_point.find("ncx:navLabel/ncx:text", NAMESPACES)
+            content = nav_point.find("ncx:content", NAMESPACES)
+            entries.append((
+                (label.text if label is not None else "") or "",
+                content.get("src", "") if content is not None else ""
+            ))
+        return entries
+
+    def _parse_nav(self, file_name):
+        """Các mục cấp cao nhất của <nav epub:type="toc">, cùng quy ước với _parse_ncx."""
+        soup = BeautifulSoup(self._read_metadata(self.member_name(file_name)), 'html.parser')
+        nav = soup.find(lambda tag: tag.name == "nav" and "toc" in tag.attrs.values())
+        top_list = nav.find("ol") if nav else None
+        if top_list is None:
+            return []
+
+        base_path = posixpath.dirname(file_name)
+        entries = []
+        for li in top_list.find_all("li", recursive=False):
+            if li.find("ol", recursive=False) is not None:
+                entries.append(None)
+                continue
+            link = li.find("a", recursive=False)
+            if link is not None and link.get("href"):
+                href = posixpath.normpath(posixpath.join(base_path, link.get("href")))
+                entries.append((link.get_text(), href))
+        return entries
+
+    def _build_toc(self, toc_entries):
+        """
+        Dựng danh sách chương từ các mục TOC cấp cao nhất (hoặc từ spine nếu không có TOC).
+        Section có chương con bị bỏ qua nhưng vẫn chiếm một số thứ tự, như với ebooklib.
+        """
+        chapters = []
+        for i, entry in enumerate(toc_entries):
+            if entry is not None:
+                title, href = entry
+                chapters.append({'title': title, 'href': href, 'order': i + 1})
+
+        if not chapters:
+            for i, idref in enumerate(self.spine):
+                item = self._manifest.get(idref)
+                if item:
+                    item_name = item[0]
+                    # Tạo tiêu đề từ filename
+                    title = os.path.splitext(os.path.basename(item_name))[0].replace('_', ' ').title()
+                    chapters.append({'title': title, 'href': item_name, 'order': i + 1})
+        return chapters
+
+    def resolve_href(self, chapter_href):
+        """
+        Tìm file_name trong manifest ứng với href của TOC.
+        Thử khớp chính xác trước, sau đó khớp một phần (ví dụ href có #fragment).
+        """
+        resolved = self._resolved_hrefs.get(chapter_href)
+        if resolved is not None or chapter_href in self._resolved_hrefs:
+            return resolved
+
+        if chapter_href in self._file_name_set:
+            resolved = chapter_href
+        elif chapter_href.split('#', 1)[0] in self._file_name_set:
+            resolved = chapter_href.split('#', 1)[0]
+        else:
+            resolved = next(
+                (file_name for file_name in self._file_names
+                 if chapter_href in file_name or file_name in chapter_href),
+                None
+            )
+        self._resolved_hrefs[chapter_href] = resolved
+        return resolved
+
+    def member_info(self, chapter_href):
+        """ZipInfo của member ứng với href (offset, kích thước nén/giải nén), hoặc None."""
+        file_name = self.resolve_href(chapter_href)
+        if file_name is None:
+            return None
+        try:
+            return self._archive.getinfo(self.member_name(file_name))
+        except KeyError:
+            return None
+
+    def read_chapter_html(self, chapter_href):
+        """Đọc HTML của một chương theo href, chỉ giải nén member tương ứng. None nếu không tìm thấy."""
+        file_name = self.resolve_href(chapter_href)
+        if file_name is None:
+            return None
+        try:
+            content_bytes = self._read_member(self.member_name(file_name))
+        except KeyError:
+            return None
+        return content_bytes.decode('utf-8', errors='ignore')
+
+    def close(self):
+        with self._lock:
+            self._archive.close()
@@ -0,0 +1,70 @@
+"""
+Các việc EPUB chạy trong tiến trình con của epub_workers.EpubWorkerPool, và vòng lặp của tiến trình con.
+
+Module này chỉ import các module xử lý thuần (epub_reader, epub_index, html_text): không đọc
+config, không kết nối Firebase, không tạo thread. Tiến trình con được chạy bằng
+    python epub_tasks.py
+(một trình thông dịch mới, không fork từ server nhiều thread) và chỉ nạp module này.
+
+Giao thức qua stdin/stdout của tiến trình con, mỗi thông điệp là một đối tượng pickle:
+  - nhận (hàm, tham số): hàm cấp module, pickle theo tên module và tên hàm;
+  - trả về ("ok", kết quả) hoặc ("error", exception).
+stdin đóng (EOF) thì tiến trình con thoát.
+"""
+
+import os
+import pickle
+import sys
+
+from epub_index import build_chapter_index
+from epub_reader import EpubZipReader, extract_body_html
+from html_text import convert_chapter_html
+
+
+def convert_chapter(html_content):
+    """Tiêu đề và text của một chương từ tài liệu XHTML đầy đủ: {'title': str, 'content': str}."""
+    title, content = convert_chapter_html(extract_body_html(html_content))
+    return {'title': title, 'content': content}
+
+
+def build_index(epub_file_path, fingerprint, text_stats=False):
+    """Chỉ mục chương (dict, xem epub_index) của một file EPUB."""
+    reader = EpubZipReader(epub_file_path)
+    try:
+        return build_chapter_index(reader, tuple(fingerprint), text_stats=text_stats)
+    finally:
+        reader.close()
+
+
+def serve(requests, responses):
+    """Chạy từng việc đọc từ requests và ghi kết quả vào responses cho đến khi requests hết (EOF)."""
+    while True:
+        try:
+            fn, args = pickle.load(requests)
+        except EOFError:
+            return
+        try:
+            response = ("ok", fn(*args))
+        except Exception as e:
+            response = ("error", e)
+        try:
+            payload = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:  # Exception không pickle được
+            payload = pickle.dumps(("error", RuntimeError(repr(response[1]) if response[0] == "error" else str(e))))
+        responses.write(payload)
+        responses.flush()
+
+
+def main():
+    # stdout dành cho kết quả: print() trong các việc được chuyển sang stderr
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    try:
+        serve(sys.stdin.buffer, responses)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Pool tiến trình cho các việc EPUB tốn CPU: chuyển HTML chương thành text và dựng chỉ mục chương.
+
+Các việc này là Python thuần (HTMLParser, regex, ElementTree) và giữ GIL: chạy trong thread
+của server thì một chương dài làm chậm mọi request khác của tiến trình. EpubWorkerPool chạy
+chúng trong các tiến trình con:
+  - chỉ gửi dữ liệu thuần (chuỗi HTML, đường dẫn file) và nhận lại dict thuần;
+  - mỗi việc có timeout tính từ lúc một tiến trình con nhận việc (thời gian chờ tiến trình rảnh
+    không tính); quá hạn thì chỉ tiến trình con đó bị dừng và được thay khi cần;
+  - HTML dài hơn max_input_chars bị từ chối; ngắn hơn inline_max_chars thì được chuyển ngay
+    trong tiến trình gọi (rẻ hơn chi phí gửi sang tiến trình con);
+  - mỗi tiến trình con được thay bằng tiến trình mới sau max_tasks_per_worker việc, để bộ nhớ
+    phân mảnh của nó không tăng mãi.
+
+Tiến trình con là một trình thông dịch mới chạy epub_tasks.py (tương đương spawn): không fork
+từ server đang có nhiều thread, và không import lại module chính (server) như spawn/forkserver
+của multiprocessing. Các việc là hàm cấp module của một module không có side effect khi import
+(epub_tasks). Nền tảng không phải POSIX (Windows) thì mọi việc chạy ngay trong tiến trình gọi.
+"""
+
+import os
+import pickle
+import select
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+from epub_tasks import build_index, convert_chapter
+
+
+TASKS_SCRIPT = Path(__file__).resolve().with_name("epub_tasks.py")
+
+
+class EpubTaskError(Exception):
+    """Việc EPUB không hoàn thành: đầu vào quá lớn, quá thời gian hoặc tiến trình con bị lỗi."""
+
+
+class _WorkerTimeout(Exception):
+    pass
+
+
+class _Worker:
+    """Một tiến trình con chạy epub_tasks.py: nhận việc qua stdin, trả kết quả qua stdout."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, str(TASKS_SCRIPT)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True
+        )
+        self.tasks = 0
+
+    def call(self, fn, args, timeout):
+        """
+        Kết quả của fn(*args) chạy trong tiến trình con. Raise exception của việc,
+        _WorkerTimeout nếu quá timeout giây, OSError/EOFError nếu tiến trình con không phản hồi.
+        """
+        payload = pickle.dumps((fn, args), protocol=pickle.HIGHEST_PROTOCOL)
+        self.tasks += 1
+        self.process.stdin.write(payload)
+        self.process.stdin.flush()
+        # Tiến trình con chỉ ghi sau khi làm xong việc: chờ ở đây là thời gian chạy việc
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise _WorkerTimeout()
+        status, value = pickle.load(self.process.stdout)
+        if status == "error":
+            raise value
+        return value
+
+    def close(self):
+        """Cho tiến trình con (đang rảnh) thoát: nó dừng khi đọc hết stdin."""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.stdout.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def kill(self):
+        self.process.kill()
+        self.close()
+
+
+class EpubWorkerPool:
+    """Các tiến trình con được quản lý: tạo khi cần, timeout theo việc, giới hạn kích thước, thay mới định kỳ."""
+
+    def __init__(self, processes=2, task_timeout=30, max_input_chars=8 * 1024 * 1024,
+                 inline_max_chars=16 * 1024, max_tasks_per_worker=500):
+        if processes and os.name != "posix":
+            print("Nền tảng không hỗ trợ pool tiến trình EPUB: các việc EPUB chạy trong tiến trình server")
+            processes = 0
+        self.processes = processes
+        self.task_timeout = task_timeout
+        self.max_input_chars = max_input_chars
+        self.inline_max_chars = inline_max_chars
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._idle = []
+        self._started = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self.tasks = 0
+        self.inline_tasks = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.rejected = 0
+        self.recycles = 0
+
+    def convert_chapter(self, html_content):
+        """{'title', 'content'} của chương. Raise EpubTaskError nếu không chuyển được."""
+        if len(html_content) > self.max_input_chars:
+            with self._lock:
+                self.rejected += 1
+            raise EpubTaskError(
+                f"Chương quá lớn ({len(html_content)} ký tự, tối đa {self.max_input_chars})"
+            )
+        return self.run(convert_chapter, html_content, inline=len(html_content) <= self.inline_max_chars)
+
+    def build_index(self, epub_file_path, fingerprint):
+        """Chỉ mục chương của file EPUB (dùng làm build cho epub_index.ChapterIndexStore)."""
+        return self.run(build_index, str(epub_file_path), tuple(fingerprint))
+
+    def run(self, fn, *args, inline=False):
+        """
+        Chạy fn(*args) trong một tiến trình con và trả về kết quả; chạy ngay nếu inline hoặc pool bị tắt.
+        fn phải là hàm cấp module của một module import được mà không có side effect (như epub_tasks).
+        """
+        if inline or not self.processes:
+            with self._lock:
+                self.inline_tasks += 1
+            return fn(*args)
+
+        # Thử lại một lần nếu tiến trình con rảnh đã chết (bị hệ thống dừng) trước khi nhận việc
+        for attempt in range(2):
+            worker = self._acquire()
+            try:
+                result = worker.call(fn, args, self.task_timeout)
+            except _WorkerTimeout:
+                with self._lock:
+                    self.timeouts += 1
+                self._release(worker, broken=True)
+                raise EpubTaskError(f"Quá thời gian xử lý ({self.task_timeout} giây)")
+            except (OSError, EOFError, pickle.UnpicklingError):
+                with self._lock:
+                    self.failures += 1
+                self._release(worker, broken=True)
+                if worker.tasks == 1 or attempt:
+                    break
+                continue
+            except BaseException:
+                self._release(worker)
+                raise
+            self._release(worker)
+            return result
+        raise EpubTaskError("Tiến trình xử lý EPUB bị dừng đột ngột")
+
+    def _acquire(self):
+        """Một tiến trình con rảnh (tạo mới nếu chưa đủ processes); chờ nếu tất cả đang bận."""
+        with self._available:
+            while not self._idle and self._started >= self.processes:
+                self._available.wait()
+            self.tasks += 1
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            return _Worker()
+        except OSError as e:
+            with self._available:
+                self._started -= 1
+                self._available.notify()
+            raise EpubTaskError(f"Không tạo được tiến trình xử lý EPUB: {e}")
+
+    def _release(self, worker, broken=False):
+        """Trả tiến trình con về pool; dừng nó nếu bị lỗi/quá hạn, đã đủ số việc hoặc pool đã tắt."""
+        with self._available:
+            retire = broken or self._closed or worker.tasks >= self.max_tasks_per_worker
+            if retire:
+                self._started -= 1
+                if not broken and not self._closed:
+                    self.recycles += 1
+            else:
+                self._idle.append(worker)
+            self._available.notify()
+        if broken:
+            worker.kill()
+        elif retire:
+            worker.close()
+
+    def shutdown(self):
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+        for worker in idle:
+            worker.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "running": self._started,
+                "idle": len(self._idle),
+                "tasks": self.tasks,
+                "inlineTasks": self.inline_tasks,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "recycles": self.recycles
+            }
@@ -0,0 +1,153 @@
+"""
+Snapshot của trang chủ (/v1/api/home), được làm mới bởi một thread nền.
+
+Trang chủ là `window` item có createdAt lớn nhất (giống order_by_child("createdAt")
+.limit_to_last(window) của RTDB, mới nhất trước). Snapshot được dựng sẵn thành các trang
+đã định dạng; request chỉ đọc snapshot hiện tại (stale-while-revalidate) và không bao giờ
+chờ Firebase. Thread nền làm mới snapshot định kỳ, hoặc ngay khi catalog báo có thay đổi
+(gom các thay đổi liên tiếp trong min_refresh_gap giây).
+"""
+
+import heapq
+import threading
+import time
+
+
+def rtdb_sort_key(value):
+    """Khóa sắp xếp theo quy tắc order_by_child của RTDB: null < bool < số < chuỗi < object."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+def latest_by_child(items, child, count):
+    """count item (key, data) có giá trị child lớn nhất, giảm dần (hòa thì key lớn hơn trước)."""
+    return heapq.nlargest(
+        count,
+        ((key, data) for key, data in items if isinstance(data, dict)),
+        key=lambda entry: (rtdb_sort_key(entry[1].get(child)), entry[0])
+    )
+
+
+class HomeSnapshot:
+    """Một phiên bản của trang chủ: các trang item đã định dạng."""
+
+    __slots__ = ("generation", "built_at", "items", "per_page")
+
+    def __init__(self, generation, built_at, items, per_page):
+        self.generation = generation
+        self.built_at = built_at
+        self.items = items
+        self.per_page = per_page
+
+    @property
+    def total_items(self):
+        return len(self.items)
+
+    @property
+    def total_pages(self):
+        return (len(self.items) + self.per_page - 1) // self.per_page
+
+    def page(self, page):
+        start_index = (page - 1) * self.per_page
+        if start_index < 0:
+            return []
+        return self.items[start_index:start_index + self.per_page]
+
+
+class HomeFeed:
+    """
+    Giữ HomeSnapshot hiện tại và làm mới nó ở nền.
+    load_entries(window) -> list (key, data) mới nhất trước; format_item((key, data)) -> dict hoặc None.
+    Đăng ký như một chỉ mục của catalog để mỗi thay đổi item đánh dấu snapshot cần dựng lại.
+    """
+
+    def __init__(self, load_entries, format_item, window=100, per_page=24,
+                 refresh_interval=60, min_refresh_gap=1):
+        self._load_entries = load_entries
+        self._format_item = format_item
+        self.window = window
+        self.per_page = per_page
+        self.refresh_interval = refresh_interval
+        self.min_refresh_gap = min_refresh_gap
+        self._snapshot = HomeSnapshot(0, None, [], per_page)
+        self._dirty = threading.Event()
+        self._build_lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self.refreshes = 0
+        self.unchanged = 0
+        self.failures = 0
+
+    # --- Giao diện chỉ mục của CatalogSnapshot: chỉ đánh dấu, không dựng lại trong lock của catalog ---
+    def rebuild(self, items):
+        self._dirty.set()
+
+    def update(self, key, old, new):
+        self._dirty.set()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def refresh(self):
+        """
+        Dựng lại snapshot ngay (trong thread gọi). Snapshot mới (generation mới) chỉ thay snapshot cũ
+        khi các item đã định dạng khác đi. Lỗi thì giữ snapshot cũ. Trả về True nếu thành công.
+        """
+        with self._build_lock:
+            self._dirty.clear()
+            try:
+                entries = self._load_entries(self.window)
+                items = [item for item in map(self._format_item, entries) if item]
+            except Exception as e:
+                self.failures += 1
+                print(f"Lỗi làm mới trang chủ: {e}")
+                return False
+            self.refreshes += 1
+            current = self._snapshot
+            if current.built_at is not None and items == current.items:
+                # Không đổi gì (thay đổi catalog nằm ngoài trang chủ, hoặc làm mới định kỳ):
+                # giữ generation và built_at để ETag/Last-Modified của client vẫn còn hiệu lực (304)
+                self.unchanged += 1
+                return True
+            self._snapshot = HomeSnapshot(current.generation + 1, time.time(), items, self.per_page)
+            return True
+
+    def start(self):
+        """Dựng snapshot đầu tiên (đồng bộ, lúc khởi động) rồi chạy thread làm mới nền."""
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="home-feed-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._dirty.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._dirty.wait(self.refresh_interval)
+            if self._stopped.is_set():
+                break
+            # Gom các thay đổi đến liên tiếp thành một lần dựng lại
+            self._stopped.wait(self.min_refresh_gap)
+            self.refresh()
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "generation": snapshot.generation,
+            "builtAt": snapshot.built_at,
+            "items": snapshot.total_items,
+            "window": self.window,
+            "refreshes": self.refreshes,
+            "unchanged": self.unchanged,
+            "failures": self.failures,
+            "pendingRefresh": self._dirty.is_set()
+        }
@@ -0,0 +1,388 @@
+"""
+Chuyển đổi HTML của chương EPUB thành văn bản thuần túy để hiển thị trên client.
+
+html_to_clean_text / convert_chapter_html xử lý HTML trong một lượt duy nhất bằng
+html.parser (theo sự kiện, không dựng cây), cho kết quả giống hệt bản BeautifulSoup
+cũ (html_to_clean_text_bs4), vốn dựng cả cây rồi duyệt lại khoảng mười lần bằng find_all.
+Kiểm tra nhanh: python html_text.py; đo hiệu năng: python bench_html_to_text.py.
+"""
+
+import html
+import re
+from html.entities import html5 as HTML5_ENTITIES
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+# Thẻ rỗng (không có thẻ đóng), giống danh sách của BeautifulSoup
+VOID_TAGS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr',
+    'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid',
+    'param', 'source', 'spacer', 'track', 'wbr'
+])
+# Các thẻ bị bỏ cả nội dung
+REMOVED_TAGS = frozenset(['script', 'style', 'nav', 'header', 'footer', 'aside'])
+HEADING_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+# Div chứa một trong các thẻ này thì không thêm xuống dòng sau div
+DIV_BLOCK_TAGS = HEADING_TAGS | {'p'}
+# Chuỗi bên trong các thẻ này không được tính vào text (như get_text() của BeautifulSoup)
+HIDDEN_STRING_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+# Giữ nguyên khoảng trắng bên trong các thẻ này
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+TITLE_TAGS = ('h1', 'h2', 'h3', 'title')
+
+# Chuỗi trước / sau mỗi loại thẻ trong text đầu ra
+_BEFORE_TEXT = {'ul': '\n', 'ol': '\n', 'li': '• ', 'blockquote': '\n"', 'br': '\n'}
+_BEFORE_TEXT.update((tag, '\n\n') for tag in HEADING_TAGS)
+_AFTER_TEXT = {'p': '\n\n', 'ul': '\n', 'ol': '\n', 'li': '\n', 'blockquote': '"\n'}
+_AFTER_TEXT.update((tag, '\n') for tag in HEADING_TAGS)
+
+_ASCII_SPACES = ' \n\t\x0c\r'
+_SPACES_RE = re.compile(r'[ \t]+')
+_LINE_EDGE_SPACES_RE = re.compile(r'^ +| +$', re.MULTILINE)
+_MANY_NEWLINES_RE = re.compile(r'\n{4,}')
+
+
+def _tidy_text(text):
+    """Dọn dẹp text sau khi chuyển đổi."""
+    # Loại bỏ multiple spaces
+    text = _SPACES_RE.sub(' ', text)
+    # Loại bỏ spaces ở đầu/cuối dòng
+    text = _LINE_EDGE_SPACES_RE.sub('', text)
+    # Giới hạn line breaks liên tiếp
+    text = _MANY_NEWLINES_RE.sub('\n\n\n', text)
+    # Loại bỏ line breaks ở đầu và cuối
+    return text.strip()
+
+
+def _is_nav_link(attrs):
+    """Link điều hướng: href bắt đầu bằng '#' hoặc class có 'nav'."""
+    values = dict(attrs)
+    return (values.get('href') or '').startswith('#') or 'nav' in (values.get('class') or '').split()
+
+
+class _Element:
+    __slots__ = ('tag', 'removed', 'after', 'div_state', 'title_parts')
+
+    def __init__(self, tag, removed):
+        self.tag = tag
+        self.removed = removed
+        self.after = ''
+        self.div_state = None     # [có text, có p/h1-h6 bên trong] với div
+        self.title_parts = None   # các chuỗi của thẻ tiêu đề đang được thu thập
+
+
+class ChapterTextParser(HTMLParser):
+    """
+    Chuyển HTML thành text trong một lượt, đồng thời lấy tiêu đề chương.
+
+    Cây thẻ được dựng giống html.parser của BeautifulSoup (không tự đóng thẻ, thẻ đóng
+    lạc bị bỏ qua), nhưng chỉ giữ ngăn xếp các thẻ đang mở thay vì cả cây.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self._parts = []
+        self._pending = []
+        self._stack = []
+        self._open_divs = []
+        self._titles = {}
+        self._capturing = set()
+        self._closed_void_tags = []
+        self._hidden = 0
+        self._preserve = 0
+
+    # --- Text ---
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def handle_entityref(self, name):
+        character = HTML5_ENTITIES.get(name + ';')
+        self._pending.append(character if character is not None else f"&{name}")
+
+    def handle_charref(self, name):
+        self._pending.append(html.unescape(f"&#{name};"))
+
+    def _flush(self, cdata=False):
+        """Gộp các đoạn text liền nhau thành một chuỗi (như endData của BeautifulSoup)."""
+        if not self._pending:
+            return
+        data = ''.join(self._pending)
+        self._pending.clear()
+        if not data:
+            return
+        if not self._preserve and not data.strip(_ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        # CDATA luôn được tính vào text, kể cả bên trong rt/rp/template
+        if self._hidden and not cdata:
+            return
+
+        stripped = data.strip()
+        if stripped:
+            for element in self._stack:
+                if element.title_parts is not None:
+                    element.title_parts.append(stripped)
+        if self._stack and self._stack[-1].removed:
+            return
+        self._parts.append(data)
+        if stripped:
+            for element in self._open_divs:
+                element.div_state[0] = True
+
+    # --- Comment, doctype, CDATA: chỉ ngắt đoạn text, không xuất ra ---
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            self._pending.append(data[len('CDATA['):])
+            self._flush(cdata=True)
+
+    # --- Thẻ ---
+
+    def handle_starttag(self, tag, attrs):
+        self._open(tag, attrs)
+        if tag in VOID_TAGS:
+            self._close(self._stack.pop())
+            # Thẻ đóng tương ứng (nếu có, ví dụ </br>) sẽ bị bỏ qua hoàn toàn
+            self._closed_void_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._open(tag, attrs)
+        self._close(self._stack.pop())
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void_tags:
+            self._closed_void_tags.remove(tag)
+            return
+        self._flush()
+        if tag in VOID_TAGS:
+            return
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth].tag == tag:
+                break
+        else:
+            return  # Thẻ đóng không có thẻ mở tương ứng
+        while len(self._stack) > depth:
+            self._close(self._stack.pop())
+
+    def _open(self, tag, attrs):
+        self._flush()
+        parent = self._stack[-1] if self._stack else None
+        removed = (
+            (parent is not None and parent.removed)
+            or tag in REMOVED_TAGS
+            or (tag == 'a' and _is_nav_link(attrs))
+        )
+        element = _Element(tag, removed)
+        if not removed:
+            before = _BEFORE_TEXT.get(tag)
+            if before:
+                self._parts.append(before)
+            element.after = _AFTER_TEXT.get(tag, '')
+            if tag in DIV_BLOCK_TAGS:
+                for div in self._open_divs:
+                    div.div_state[1] = True
+            if tag == 'div':
+                element.div_state = [False, False]
+                self._open_divs.append(element)
+
+        if tag in TITLE_TAGS and tag not in self._titles and tag not in self._capturing:
+            element.title_parts = []
+            self._capturing.add(tag)
+        if tag in HIDDEN_STRING_TAGS:
+            self._hidden += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve += 1
+        self._stack.append(element)
+
+    def _close(self, element):
+        if element.div_state is not None:
+            self._open_divs.pop()
+            has_text, has_block = element.div_state
+            if has_text and not has_block:
+                self._parts.append('\n')
+        elif element.after:
+            self._parts.append(element.after)
+
+        if element.title_parts is not None:
+            self._capturing.discard(element.tag)
+            self._titles[element.tag] = ''.join(element.title_parts)
+        if element.tag in HIDDEN_STRING_TAGS:
+            self._hidden -= 1
+        if element.tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve -= 1
+
+    def close(self):
+        super().close()
+        self._flush()
+        while self._stack:
+            self._close(self._stack.pop())
+
+    # --- Kết quả ---
+
+    def title(self):
+        """Tiêu đề chương từ thẻ h1, h2, h3 hoặc title đầu tiên (chuỗi rỗng nếu không có)."""
+        for tag in TITLE_TAGS:
+            if tag in self._titles:
+                return self._titles[tag]
+        return ""
+
+    def text(self):
+        return _tidy_text(''.join(self._parts))
+
+
+def convert_chapter_html(html_content):
+    """Chuyển HTML của chương trong một lượt. Trả về (tiêu đề, text thuần túy)."""
+    parser = ChapterTextParser()
+    parser.feed(html_content)
+    parser.close()
+    return parser.title(), parser.text()
+
+
+def extract_chapter_title(html_content):
+    """Lấy tiêu đề chương từ thẻ h1, h2, h3 hoặc title đầu tiên (chuỗi rỗng nếu không có)."""
+    return convert_chapter_html(html_content)[0]
+
+
+def html_to_clean_text(html_content):
+    """
+    Chuyển đổi HTML thành text thuần túy với format đẹp.
+
+    Args:
+        html_content (str): Nội dung HTML
+
+    Returns:
+        str: Text thuần túy đã được format
+    """
+    return convert_chapter_html(html_content)[1]
+
+
+def extract_chapter_title_bs4(html_content):
+    """Bản tham chiếu (BeautifulSoup) của extract_chapter_title."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for tag in ['h1', 'h2', 'h3', 'title']:
+        title_elem = soup.find(tag)
+        if title_elem:
+            return title_elem.get_text(strip=True)
+    return ""
+
+
+def html_to_clean_text_bs4(html_content):
+    """
+    Bản tham chiếu (BeautifulSoup) của html_to_clean_text: dựng cây rồi duyệt nhiều lượt.
+    Giữ lại để kiểm tra tính tương đương và để so sánh hiệu năng (bench_html_to_text.py).
+
+    Args:
+        html_content (str): Nội dung HTML
+
+    Returns:
+        str: Text thuần túy đã được format
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # Loại bỏ các thẻ không cần thiết
+    for unwanted in soup(["script", "style", "nav", "header", "footer", "aside"]):
+        unwanted.decompose()
+
+    # Loại bỏ các link navigation
+    for link in soup.find_all("a"):
+        if link.get('href', '').startswith('#') or 'nav' in link.get('class', []):
+            link.decompose()
+
+    # Xử lý các thẻ heading - thêm line breaks và format
+    for heading in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        heading.insert_before('\n\n')
+        heading.insert_after('\n')
+
+    # Xử lý paragraphs
+    for p in soup.find_all('p'):
+        p.insert_after('\n\n')
+
+    # Xử lý divs (chỉ nếu chứa text trực tiếp)
+    for div in soup.find_all('div'):
+        if div.get_text(strip=True) and not div.find(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+            div.insert_after('\n')
+
+    # Xử lý line breaks
+    for br in soup.find_all('br'):
+        br.replace_with('\n')
+
+    # Xử lý lists
+    for ul in soup.find_all(['ul', 'ol']):
+        ul.insert_before('\n')
+        ul.insert_after('\n')
+
+    for li in soup.find_all('li'):
+        li.insert_before('• ')
+        li.insert_after('\n')
+
+    # Xử lý blockquotes
+    for blockquote in soup.find_all('blockquote'):
+        blockquote.insert_before('\n"')
+        blockquote.insert_after('"\n')
+
+    # Lấy text
+    return _tidy_text(soup.get_text())
+
+
+# Mẫu HTML chuẩn và kết quả mong đợi (golden) của html_to_clean_text
+GOLDEN_SAMPLE_HTML = """
+    <html>
+    <body>
+        <h1>Chương 1: Khởi đầu</h1>
+        <p>Đây là đoạn văn đầu tiên của chương. Nó chứa nhiều thông tin quan trọng.</p>
+        <p>Đây là đoạn văn thứ hai. <br>Có line break ở giữa.</p>
+
+        <h2>Phần 1.1</h2>
+        <div>Nội dung trong div không có thẻ p.</div>
+
+        <ul>
+            <li>Mục thứ nhất</li>
+            <li>Mục thứ hai</li>
+        </ul>
+
+        <blockquote>Đây là một trích dẫn quan trọng.</blockquote>
+
+        <script>alert('test');</script>
+        <style>.test { color: red; }</style>
+    </body>
+    </html>
+    """
+
+GOLDEN_SAMPLE_TEXT = (
+    'Chương 1: Khởi đầu\n\n'
+    'Đây là đoạn văn đầu tiên của chương. Nó chứa nhiều thông tin quan trọng.\n\n\n'
+    'Đây là đoạn văn thứ hai.\nCó line break ở giữa.\n\n\n'
+    'Phần 1.1\n\n'
+    'Nội dung trong div không có thẻ p.\n\n\n'
+    '• Mục thứ nhất\n\n'
+    '• Mục thứ hai\n\n\n'
+    '"Đây là một trích dẫn quan trọng."'
+)
+
+
+def test_html_to_text_conversion():
+    """Kiểm tra logic chuyển đổi HTML thành text với mẫu golden (cả bản mới và bản BeautifulSoup)."""
+    title, text = convert_chapter_html(GOLDEN_SAMPLE_HTML)
+    assert title == "Chương 1: Khởi đầu", repr(title)
+    assert text == GOLDEN_SAMPLE_TEXT, repr(text)
+    assert extract_chapter_title_bs4(GOLDEN_SAMPLE_HTML) == title
+    assert html_to_clean_text_bs4(GOLDEN_SAMPLE_HTML) == GOLDEN_SAMPLE_TEXT
+
+    print("=== KIỂM TRA CHUYỂN ĐỔI HTML THÀNH TEXT ===")
+    print(text)
+    print("=== KẾT THÚC KIỂM TRA: OK ===")
+
+
+if __name__ == '__main__':
+    test_html_to_text_conversion()
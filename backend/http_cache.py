@@ -0,0 +1,147 @@
+"""
+GET có điều kiện (ETag / Last-Modified / 304 Not Modified) cho các route Flask.
+
+Mỗi route khai báo một hàm validators(*args, **kwargs) trả về (parts, last_modified):
+parts là các giá trị xác định nội dung response (phiên bản catalog, fingerprint EPUB, ...),
+last_modified là timestamp (giây) hoặc None. Hàm này phải rẻ (không đọc Firebase,
+không mở EPUB), vì nó chạy trước handler: nếu client gửi If-None-Match / If-Modified-Since
+khớp, server trả 304 ngay mà không chạy handler. Trả về None để bỏ qua cache cho request đó.
+
+Nếu truyền body_cache (ResponseBodyCache), body đã mã hóa của response 200 được giữ lại theo
+ETag: request sau có cùng ETag (cùng URL, cùng phiên bản dữ liệu) nhận lại đúng các bytes đó,
+không chạy handler và không mã hóa JSON lại.
+
+Handler trả 200 với nội dung tạm (ví dụ lỗi đọc EPUB được báo trong payload) thì gọi
+uncacheable(): response đó không được lưu vào body_cache và không có ETag/Last-Modified,
+để request sau chạy lại handler thay vì nhận lại lỗi cũ (hoặc 304).
+"""
+
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g, make_response, request
+
+
+def uncacheable():
+    """Gọi trong handler: response của request hiện tại không được cache (xem docstring module)."""
+    g.http_cache_uncacheable = True
+
+
+def make_etag(*parts):
+    """Giá trị ETag từ các thành phần (đã gồm URL của request)."""
+    payload = '\x1f'.join(str(part) for part in parts).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()[:32]
+
+
+def _is_not_modified(etag, last_modified):
+    # Theo RFC 9110: có If-None-Match thì bỏ qua If-Modified-Since; If-None-Match so sánh weak
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+
+def _set_cache_headers(response, etag, last_modified, max_age):
+    # ETag luôn là weak: bản nén (compression.py) khác bản gốc từng byte nhưng cùng nội dung,
+    # nên response 200 (nén hoặc không) và 304 gửi cùng một validator W/"..."
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = int(last_modified)
+    response.cache_control.public = True
+    if max_age > 0:
+        response.cache_control.max_age = max_age
+    else:
+        # Được lưu nhưng phải hỏi lại server mỗi lần (thường chỉ nhận về 304)
+        response.cache_control.no_cache = True
+
+
+class ResponseBodyCache:
+    """LRU các body response (bytes, mimetype) theo ETag, giới hạn theo tổng số bytes."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry
+
+    def put(self, etag, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if etag in self._entries:
+                return
+            self._entries[etag] = (body, mimetype)
+            self._current_bytes += len(body)
+            while self._current_bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._current_bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def _render(view, args, kwargs, etag, body_cache):
+    """Chạy handler, hoặc dựng lại response từ body đã lưu cho etag."""
+    if body_cache is not None:
+        cached = body_cache.get(etag)
+        if cached is not None:
+            body, mimetype = cached
+            return current_app.response_class(body, mimetype=mimetype)
+
+    response = make_response(view(*args, **kwargs))
+    if (body_cache is not None and request.method == 'GET' and response.status_code == 200
+            and not response.is_streamed and not response.direct_passthrough
+            and not g.get("http_cache_uncacheable")):
+        body_cache.put(etag, response.get_data(), response.mimetype)
+    return response
+
+
+def conditional(validators, max_age=0, body_cache=None):
+    """
+    Decorator thêm ETag, Last-Modified, Cache-Control cho response 200
+    và trả 304 khi nội dung client đang giữ vẫn còn mới.
+    body_cache: ResponseBodyCache dùng lại body đã mã hóa theo ETag (None: không dùng).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            result = validators(*args, **kwargs)
+            if result is None:
+                return view(*args, **kwargs)
+
+            parts, last_modified = result
+            etag = make_etag(request.full_path, *parts)
+            if _is_not_modified(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = _render(view, args, kwargs, etag, body_cache)
+                if response.status_code != 200 or g.get("http_cache_uncacheable"):
+                    return response
+            _set_cache_headers(response, etag, last_modified, max_age)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,57 @@
+"""
+JSON provider cho Flask dùng orjson (nếu đã cài gói orjson) thay cho encoder json chuẩn.
+
+jsonify() và request.get_json() đi qua provider này, nên các route không cần sửa.
+Giữ quy ước của provider mặc định: sắp xếp key, mỗi response kết thúc bằng '\\n', thụt lề
+2 dấu cách khi không ở dạng gọn (compact=False, hoặc chế độ debug);
+khác biệt duy nhất là ký tự không phải ASCII được ghi thẳng dạng UTF-8 thay vì \\uXXXX.
+Kiểu dữ liệu orjson không hỗ trợ (hoặc số nguyên quá lớn) thì quay về encoder chuẩn.
+"""
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn, không có thì dùng json chuẩn
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider mã hóa bằng orjson khi có thể."""
+
+    use_orjson = orjson is not None
+
+    def _dumps_bytes(self, obj, indent=False):
+        """
+        Mã hóa obj thành bytes UTF-8 gọn (không khoảng trắng), hoặc thụt lề 2 dấu cách nếu indent;
+        None nếu orjson không làm được.
+        """
+        if not self.use_orjson:
+            return None
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            return None
+
+    def dumps(self, obj, **kwargs):
+        # orjson chỉ hỗ trợ dạng gọn và thụt lề 2 dấu cách; các tùy chọn khác để encoder chuẩn xử lý
+        if not kwargs or kwargs in ({"separators": (",", ":")}, {"indent": 2}):
+            data = self._dumps_bytes(obj, indent="indent" in kwargs)
+            if data is not None:
+                return data.decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Chế độ debug (app.run(debug=True)) vẫn dùng orjson, chỉ thêm thụt lề như provider mặc định
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        data = self._dumps_bytes(obj, indent=pretty)
+        if data is None:
+            return super().response(obj)
+        # Tạo response từ bytes trực tiếp, không đi vòng qua str
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
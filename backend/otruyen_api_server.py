@@ -1,23 +1,30 @@
 """
 OTruyen API Server với tích hợp Firebase
-Triển khai các API endpoints của OTruyen, lấy dữ liệu từ Firebase Realtime Database.
+Triển khai các API endpoints của OTruyen, lấy dữ liệu từ Firebase Realtime Database
+(hoặc từ file SQLite cục bộ, xem STORAGE_BACKEND trong config.py và storage.py).
 Máy chủ API cho ứng dụng đọc truyện tranh và ebook trực tuyến.
 """
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, db
-import json
-import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-import re
 
-# Import thư viện để xử lý EPUB
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
-import zipfile
+from blocking_calls import BlockingExecutor, call_blocking, map_blocking
+from catalog import CARD_FIELDS, CardIndex, CatalogSnapshot, CategoryIndex, FeedIndex, FieldEquals, KeyResolver
+from chapter_text_cache import ChapterTextCache
+from compression import ResponseCompressor
+from epub_cache import ParsedEpubCache, file_fingerprint
+from epub_index import ChapterIndexStore
+from epub_reader import EpubZipReader
+from epub_workers import EpubWorkerPool
+from home_feed import HomeFeed, latest_by_child
+from http_cache import ResponseBodyCache, conditional, uncacheable
+from json_provider import FastJSONProvider
+from pagination import InvalidCursor, decode_cursor, encode_cursor, sort_position
+from search_index import SearchIndex
+from storage import StorageError, create_repository
 
 # Thử import file cấu hình từ thư mục gốc
 try:
@@ -30,36 +37,117 @@ except ImportError:
 app = Flask(__name__)
 CORS(app)  # Kích hoạt CORS cho tất cả các domain
 
+# Mã hóa JSON bằng orjson (nếu đã cài) cho mọi jsonify()
+if config.JSON_USE_ORJSON:
+    app.json = FastJSONProvider(app)
+
+# Body đã mã hóa của các response có ETag: request trùng ETag không chạy lại handler
+RESPONSE_CACHE = ResponseBodyCache(max_bytes=config.RESPONSE_BODY_CACHE_MAX_BYTES)
+
+# Nén gzip/brotli các response JSON lớn; bản nén của response có ETag được giữ lại để dùng lại
+COMPRESSOR = ResponseCompressor(
+    min_size=config.COMPRESSION_MIN_SIZE,
+    gzip_level=config.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+    cache_max_bytes=config.COMPRESSED_PAYLOAD_CACHE_MAX_BYTES
+)
+COMPRESSOR.init_app(app)
+
 # Định nghĩa thư mục gốc cho các file media (ví dụ: project_root/media)
 MEDIA_ROOT_DIR = Path(__file__).resolve().parent / "media"
 
-# --- Khởi tạo Firebase ---
+# --- Khởi tạo kho dữ liệu ---
+# Các route chỉ đọc library_items qua REPOSITORY (storage.ItemRepository): Firebase RTDB
+# hoặc file SQLite cục bộ, tùy STORAGE_BACKEND trong config.py
 try:
-    # Đảm bảo đường dẫn là tuyệt đối hoặc tương đối chính xác so với thư mục thực thi script.
-    # Nếu run_server.py ở thư mục gốc, và config.py cũng ở thư mục gốc,
-    # và FIREBASE_SERVICE_ACCOUNT_KEY_PATH là tương đối so với gốc (ví dụ: "scripts/key.json"),
-    # thì điều này sẽ hoạt động.
-    key_path = Path(config.FIREBASE_SERVICE_ACCOUNT_KEY_PATH)
-    if not key_path.is_absolute():
-        key_path = Path(__file__).resolve().parent / key_path # Làm cho nó tương đối với thư mục script này nếu không phải tuyệt đối
-        # Đối với run_server.py, nếu nó ở gốc, key_path có thể cần là Path.cwd() / config.FIREBASE_SERVICE_ACCOUNT_KEY_PATH
-
-    if not key_path.exists():
-        print(f"LỖI NGHIÊM TRỌNG: Không tìm thấy Firebase service account key tại đường dẫn đã phân giải: {key_path}")
-        print(f"Vui lòng kiểm tra FIREBASE_SERVICE_ACCOUNT_KEY_PATH trong config.py: {config.FIREBASE_SERVICE_ACCOUNT_KEY_PATH}")
-        exit(1)
-
-    cred = credentials.Certificate(str(key_path))
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': config.FIREBASE_REALTIME_DATABASE_URL
-    })
-    print("Firebase Admin SDK đã được khởi tạo thành công.")
-    FB_DB = db.reference(config.FIREBASE_DB_ROOT_NODE)
-except Exception as e:
-    print(f"LỖI NGHIÊM TRỌNG: Không thể khởi tạo Firebase Admin SDK: {e}")
-    print("Kiểm tra thông tin xác thực Firebase và URL cơ sở dữ liệu trong config.py.")
+    REPOSITORY = create_repository(config, base_dir=Path(__file__).resolve().parent)
+    print(f"Kho dữ liệu đã được khởi tạo thành công: {REPOSITORY.describe()}")
+except StorageError as e:
+    print(f"LỖI NGHIÊM TRỌNG: {e}")
+    print("Kiểm tra cấu hình kho dữ liệu (STORAGE_BACKEND, Firebase hoặc SQLite) trong config.py.")
     exit(1)
-# --- Kết thúc khởi tạo Firebase ---
+# Các lời gọi có thể chờ mạng hoặc đĩa (REPOSITORY, đọc EPUB) đi qua blocking_calls.call_blocking
+# với loại "storage" hoặc "epub": ở chế độ ASGI (asgi_app.py) chúng được chờ ngoài event loop
+# --- Kết thúc khởi tạo kho dữ liệu ---
+
+# --- Catalog snapshot trong bộ nhớ ---
+# Các feed của /v1/api/danh-sach/<type>: điều kiện child == value cho biết item có thuộc feed không.
+# Điều kiện được khai báo dạng dữ liệu (FieldEquals) để kho dữ liệu lọc bằng chỉ mục itemType/status.
+# Thêm một feed mới chỉ cần khai báo thêm một điều kiện ở đây.
+FEEDS = {
+    "truyen-moi": FieldEquals("itemType", "comic"),  # Giả định "truyen-moi" là truyện mới nhất
+    "ebook-moi": FieldEquals("itemType", "ebook"),
+    "hoan-thanh": FieldEquals("status", "completed"),
+    "dang-phat-hanh": FieldEquals("status", "ongoing"),
+    "sap-ra-mat": FieldEquals("status", "coming_soon"),
+}
+
+# Tải library_items một lần rồi giữ cho nó luôn mới qua stream listen() của RTDB,
+# để các route danh sách/tìm kiếm không phải tải lại toàn bộ node mỗi request.
+CATALOG = CatalogSnapshot()
+CATEGORY_INDEX = CATALOG.register_index(CategoryIndex())
+FEED_INDEX = CATALOG.register_index(FeedIndex(FEEDS))
+SEARCH_INDEX = CATALOG.register_index(SearchIndex())
+# Luồng đọc song song các key ứng viên (slug, comic_slug, ebook_slug) khi phải đọc Firebase;
+# kho SQLite đọc cục bộ nên không cần
+PROBE_EXECUTOR = (ThreadPoolExecutor(max_workers=config.KEY_RESOLVER_PROBE_WORKERS, thread_name_prefix="key-probe")
+                  if REPOSITORY.backend == "firebase" and config.KEY_RESOLVER_PROBE_WORKERS > 1 else None)
+# Phân giải slug -> key thật: tra snapshot khi sẵn sàng, nếu không thì đọc Firebase (có cache âm)
+KEY_RESOLVER = CATALOG.register_index(KeyResolver(
+    CATALOG,
+    partial(call_blocking, "storage", REPOSITORY.get),
+    negative_ttl=config.KEY_RESOLVER_NEGATIVE_TTL,
+    executor=BlockingExecutor("storage", PROBE_EXECUTOR)
+))
+# Thẻ danh sách của từng item, định dạng sẵn một lần khi item vào hoặc đổi trong catalog.
+# Snapshot chỉ bắt đầu tải (CATALOG.start) sau khi các hàm định dạng bên dưới đã được định nghĩa.
+CARD_INDEX = CATALOG.register_index(CardIndex(lambda key, data: format_item_card((key, data))))
+# Trang chủ dựng sẵn ở nền; mỗi thay đổi của catalog đánh dấu cần dựng lại
+HOME_FEED = CATALOG.register_index(HomeFeed(
+    lambda window: load_home_entries(window),
+    lambda entry: format_item_for_response(entry),
+    window=config.HOME_FEED_WINDOW,
+    per_page=config.DEFAULT_ITEMS_PER_PAGE,
+    refresh_interval=config.HOME_FEED_REFRESH_INTERVAL,
+    min_refresh_gap=config.HOME_FEED_MIN_REFRESH_GAP
+))
+
+# Tiền tố key Firebase được thử khi route chi tiết nhận slug thay vì key
+COMIC_KEY_PREFIXES = ("comic_", "ebook_")
+TEXT_STORY_KEY_PREFIXES = ("ebook_", "text_story_")
+
+# Các route danh sách trả về thẻ rút gọn (CARD_FIELDS); bản ghi đầy đủ (kèm cây
+# chapters/server_data) chỉ có ở các route chi tiết hoặc khi gửi một trong các giá trị fields sau
+FULL_RECORD_FIELDS = ("*", "all", "full")
+
+# Luồng đọc Firebase song song cho /v1/api/truyen-tranh/batch khi catalog chưa sẵn sàng
+BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=config.BATCH_FETCH_WORKERS, thread_name_prefix="batch-fetch")
+
+# Cache các EPUB đã mở (kèm TOC), để mỗi lần lật trang không phải đọc lại cả file zip
+EPUB_CACHE = ParsedEpubCache(
+    EpubZipReader,
+    max_entries=config.EPUB_CACHE_MAX_ENTRIES,
+    max_bytes=config.EPUB_CACHE_MAX_BYTES
+)
+
+# Text đã làm sạch của các chương: LRU trong bộ nhớ + kho nén trên đĩa cạnh file EPUB
+CHAPTER_TEXT_CACHE = ChapterTextCache(
+    max_memory_bytes=config.CHAPTER_TEXT_CACHE_MAX_BYTES,
+    on_disk=config.CHAPTER_TEXT_CACHE_ON_DISK
+)
+
+# Chuyển HTML chương thành text và dựng chỉ mục chương trong các tiến trình con,
+# để việc tốn CPU (giữ GIL) không làm chậm các request khác của server
+EPUB_WORKERS = EpubWorkerPool(
+    processes=config.EPUB_WORKER_PROCESSES,
+    task_timeout=config.EPUB_TASK_TIMEOUT,
+    max_input_chars=config.EPUB_MAX_CHAPTER_CHARS,
+    inline_max_chars=config.EPUB_INLINE_MAX_CHARS,
+    max_tasks_per_worker=config.EPUB_WORKER_MAX_TASKS
+)
+
+# Chỉ mục chương lưu cạnh mỗi file EPUB, tự dựng lại khi file EPUB thay đổi
+CHAPTER_INDEX = ChapterIndexStore(build=EPUB_WORKERS.build_index)
 
 def construct_thumb_url(item_data):
     """Xây dựng URL thumbnail đầy đủ dựa trên loại item."""
@@ -99,6 +187,9 @@ def format_item_for_response(item_data_tuple):
     if not isinstance(data, dict):
         return None
 
+    # Làm việc trên bản sao nông, vì data có thể là item dùng chung trong CATALOG
+    data = dict(data)
+
     # Đảm bảo các trường cơ bản được có mặt, thêm 'id' nếu sử dụng Firebase key làm ID
     if '_id' not in data:
         data['_id'] = key # Sử dụng Firebase key nếu _id bị thiếu
@@ -126,44 +217,141 @@ def format_item_for_response(item_data_tuple):
             data['chaptersLatest'] = []
     else:
         data['chaptersLatest'] = []
-        
+
     return data
 
-def get_all_items_from_firebase(limit=None, order_by_child=None, start_at_key=None, item_type_filter=None):
-    """Lấy tất cả items từ Firebase, với filtering tùy chọn và hỗ trợ phân trang cơ bản."""
-    try:
-        query = FB_DB
-        if order_by_child:
-            query = query.order_by_child(order_by_child)
-        else:
-            query = query.order_by_key() # Sắp xếp mặc định theo key
+def count_chapters(data):
+    """Tổng số chương trong tất cả server_data của item (giống cách client Flutter đếm)."""
+    chapters = data.get('chapters')
+    if not isinstance(chapters, list):
+        return 0
+    return sum(len(server.get('server_data') or []) for server in chapters if isinstance(server, dict))
 
-        if start_at_key:
-            query = query.start_at(start_at_key)
-        
-        if limit:
-            # Firebase limit_to_first/last lấy N items.
-            # Nếu start_at được sử dụng, chúng ta có thể cần lấy limit + 1 để biết có trang tiếp theo không,
-            # nhưng để đơn giản, chỉ lấy 'limit'.
-            query = query.limit_to_first(limit)
-            
-        results = query.get()
-
-        if not results:
-            return []
-
-        items = []
-        # Firebase trả về dict khi được sắp xếp theo key/child, hoặc list nếu không có order_by (ít phổ biến cho collections)
-        if isinstance(results, dict):
-            for key, value in results.items():
-                if isinstance(value, dict): # Đảm bảo value là một dict
-                    if item_type_filter and value.get("itemType") != item_type_filter:
-                        continue
-                    items.append(format_item_for_response((key, value)))
-        return [item for item in items if item is not None]
-    except Exception as e:
-        print(f"Lỗi khi lấy dữ liệu từ Firebase: {e}")
-        return []
+def parse_fields(raw, default=None):
+    """
+    Phân tích danh sách trường "a,b,c" (hoặc list các tên trường).
+    raw là None: trả về default; rỗng, "*", "all" hoặc "full": None (bản ghi đầy đủ).
+    """
+    if raw is None:
+        return default
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    fields = tuple(field.strip() for field in raw if isinstance(field, str) and field.strip())
+    if not fields or fields[0] in FULL_RECORD_FIELDS:
+        return None
+    return fields
+
+def requested_fields(default=None):
+    """Tham số fields=a,b,c của request (xem parse_fields)."""
+    return parse_fields(request.args.get('fields'), default)
+
+def project_item(formatted_item, fields):
+    """Chỉ giữ các trường trong fields của một item đã định dạng (fields=None: giữ nguyên)."""
+    if fields is None or formatted_item is None:
+        return formatted_item
+    projected = {field: formatted_item[field] for field in fields if field in formatted_item}
+    if 'totalChapters' in fields:
+        projected['totalChapters'] = count_chapters(formatted_item)
+    return projected
+
+def format_item_card(item_data_tuple, fields=CARD_FIELDS):
+    """Định dạng item cho các route danh sách: thẻ rút gọn theo fields (None: bản ghi đầy đủ)."""
+    return project_item(format_item_for_response(item_data_tuple), fields)
+
+def item_card(key, data, fields=CARD_FIELDS):
+    """
+    Thẻ của một item trong catalog: dùng thẻ dựng sẵn trong CARD_INDEX khi fields chỉ gồm
+    các trường của thẻ, nếu không thì định dạng lại từ data.
+    """
+    if fields is not None:
+        card = CARD_INDEX.get(key)
+        if card is not None and card.covers(fields):
+            return card.to_dict(fields)
+    return format_item_card((key, data), fields)
+
+def load_home_entries(window):
+    """
+    window item mới nhất theo createdAt (mới nhất trước), cùng thứ tự với
+    order_by_child("createdAt").limit_to_last(window) của RTDB.
+    Đọc từ snapshot khi sẵn sàng, nếu không thì đọc kho dữ liệu (chỉ trong thread nền của HOME_FEED).
+    """
+    if CATALOG.ready:
+        return latest_by_child(CATALOG.items(), "createdAt", window)
+    return REPOSITORY.latest("createdAt", window)
+
+# --- Bắt đầu nhận dữ liệu catalog ---
+try:
+    if CATALOG.start(REPOSITORY, timeout=config.CATALOG_READY_TIMEOUT):
+        print(f"Catalog snapshot sẵn sàng với {len(CATALOG)} items.")
+    else:
+        print("CẢNH BÁO: Catalog snapshot chưa sẵn sàng, tạm thời đọc trực tiếp từ kho dữ liệu.")
+except Exception as e:
+    print(f"CẢNH BÁO: Không thể lắng nghe thay đổi từ kho dữ liệu, đọc trực tiếp từ kho dữ liệu: {e}")
+HOME_FEED.start()
+# --- Kết thúc catalog snapshot ---
+
+def catalog_validators(*args, **kwargs):
+    """ETag/Last-Modified cho các route danh sách: đổi mỗi khi catalog thay đổi."""
+    if not CATALOG.ready:
+        return None
+    return (CATALOG.epoch, CATALOG.version), CATALOG.last_modified
+
+def home_validators(*args, **kwargs):
+    """ETag/Last-Modified cho trang chủ: đổi mỗi khi HOME_FEED dựng xong snapshot mới."""
+    snapshot = HOME_FEED.snapshot
+    if snapshot.built_at is None:
+        return None
+    return (CATALOG.epoch, "home", snapshot.generation), snapshot.built_at
+
+def epub_file_path_for(key, item_data):
+    """Đường dẫn file EPUB của một item ebook (None nếu item không có file EPUB)."""
+    epub_filename = item_data.get("localEpubFilename")
+    if item_data.get("itemType") != "ebook" or not epub_filename:
+        return None
+    book_slug = item_data.get("slug", key.replace("ebook_", ""))
+    return MEDIA_ROOT_DIR / config.EBOOKS_URL_SUBPATH / book_slug / epub_filename
+
+def item_validators(prefixes, with_epub=False):
+    """
+    ETag/Last-Modified cho các route chi tiết: theo phiên bản của riêng item
+    (và fingerprint của file EPUB nếu with_epub), tra trong bộ nhớ, không đọc Firebase hay EPUB.
+    """
+    def validators(slug_or_id, **kwargs):
+        if not CATALOG.ready:
+            return None
+        key, item_data = KEY_RESOLVER.resolve(slug_or_id, prefixes)
+        if item_data is None:
+            return None
+        version, last_modified = CATALOG.item_stamp(key)
+        parts = [CATALOG.epoch, key, version]
+        if with_epub:
+            epub_file_path = epub_file_path_for(key, item_data)
+            if epub_file_path is not None:
+                try:
+                    _, mtime_ns, size = file_fingerprint(epub_file_path)
+                except OSError:
+                    return None
+                parts += [mtime_ns, size]
+                last_modified = max(last_modified or 0, mtime_ns / 1e9)
+        return parts, last_modified
+    return validators
+
+def chapter_index_for(epub_file_path):
+    """Chỉ mục chương của file EPUB: bản trong bộ nhớ nếu có, nếu không thì đọc sidecar hoặc dựng lại."""
+    chapter_index = CHAPTER_INDEX.cached(epub_file_path)
+    if chapter_index is None:
+        chapter_index = call_blocking("epub", CHAPTER_INDEX.get, epub_file_path)
+    return chapter_index
+
+def get_catalog_items():
+    """
+    Trả về toàn bộ library_items dưới dạng dict {key: data}.
+    Ưu tiên snapshot trong bộ nhớ; chỉ tải từ kho dữ liệu khi snapshot chưa sẵn sàng.
+    Không được sửa các dict item trả về.
+    """
+    if CATALOG.ready:
+        return CATALOG.as_dict()
+    return call_blocking("storage", REPOSITORY.all_items)
 
 @app.route('/')
 def index():
@@ -178,9 +366,11 @@ def index():
             "/v1/api/the-loai": "Danh sách thể loại (được lấy từ items)",
             "/v1/api/the-loai/{slug}": "Items theo slug thể loại",
             "/v1/api/truyen-tranh/{slug_or_id}": "Chi tiết item theo slug hoặc ID",
+            "/v1/api/truyen-tranh/batch?ids=a,b,c": "Chi tiết nhiều item trong một request (GET hoặc POST {\"ids\": [...]})",
             "/v1/api/truyen-chu/{slug_or_id}": "Nội dung truyện chữ theo slug hoặc ID",
             "/v1/api/truyen-chu/{slug_or_id}/muc-luc": "Lấy mục lục EPUB",
             "/v1/api/truyen-chu/{slug_or_id}/chuong/{chapter_number}": "Đọc nội dung chương EPUB cụ thể",
+            "/v1/api/truyen-chu/{slug_or_id}/chuong?from=&to=&html=0": "Tải nhiều chương EPUB liên tiếp (NDJSON)",
             "/v1/api/tim-kiem": "Tìm kiếm items theo từ khóa",
             "/health": "Endpoint kiểm tra tình trạng",
             "/ebooks/{slug}/{filename}": "Phục vụ file media ebook"
@@ -198,33 +388,20 @@ def index():
     })
 
 @app.route('/v1/api/home')
+@conditional(home_validators, max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
 def get_home():
     """
-    Lấy items trang chủ.
-    Đối với Firebase RTDB, 'home' thường có nghĩa là các items mới nhất.
-    Chúng ta sẽ lấy comics và ebooks mới nhất theo 'updatedAt' hoặc 'createdAt' nếu có,
-    ngược lại theo key (thứ tự chèn).
+    Lấy items trang chủ: HOME_FEED.window item mới nhất theo 'createdAt', mới nhất trước.
+    Đọc snapshot dựng sẵn bởi thread nền (có thể cũ hơn vài giây so với Firebase),
+    nên request không bao giờ phải chờ Firebase.
     """
     page = request.args.get('page', 1, type=int)
     per_page = config.DEFAULT_ITEMS_PER_PAGE
+    fields = requested_fields(CARD_FIELDS)
 
-    # Lấy items mới nhất - RTDB sắp xếp theo 'updatedAt' cần indexing để có hiệu suất.
-    # Hiện tại, chúng ta sắp xếp theo 'createdAt' nếu nó tồn tại, giả định nó là timestamp hoặc ISO string.
-    # Ngược lại, theo key (thường theo thứ tự thời gian cho auto-IDs).
-    all_items_raw = FB_DB.order_by_child("createdAt").limit_to_last(100).get() # Lấy một tập lớn hơn và sắp xếp/phân trang trong app
-    
-    all_items = []
-    if isinstance(all_items_raw, dict):
-        # Items từ limit_to_last thường theo thứ tự tăng dần, nên đảo ngược để giảm dần (mới nhất trước)
-        for key, value in reversed(list(all_items_raw.items())):
-            if isinstance(value, dict):
-                 formatted = format_item_for_response((key,value))
-                 if formatted:
-                    all_items.append(formatted)
-
-    start_index = (page - 1) * per_page
-    end_index = start_index + per_page
-    paginated_items = all_items[start_index:end_index]
+    snapshot = HOME_FEED.snapshot
+    paginated_items = [project_item(item, fields) for item in snapshot.page(page)]
 
     return jsonify({
         "status": "success",
@@ -234,11 +411,11 @@ def get_home():
             "items": paginated_items,
             "params": {
                 "pagination": {
-                    "totalItems": len(all_items),
+                    "totalItems": snapshot.total_items,
                     "totalItemsPerPage": per_page,
                     "currentPage": page,
                     "pageRanges": 5, # Placeholder
-                    "totalPages": (len(all_items) + per_page - 1) // per_page
+                    "totalPages": snapshot.total_pages
                 }
             },
             "APP_DOMAIN_FRONTEND": "http://localhost:3000", # Ví dụ
@@ -247,6 +424,8 @@ def get_home():
     })
 
 @app.route('/v1/api/danh-sach/<string:type_slug>')
+@conditional(catalog_validators, max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
 def get_comic_list(type_slug):
     """
     Lấy danh sách mục theo loại/trạng thái.
@@ -254,48 +433,84 @@ def get_comic_list(type_slug):
     'hoan-thanh' -> truyện/ebook đã hoàn thành
     'ebook-moi' -> ebook mới nhất (itemType: ebook)
     'dang-phat-hanh' -> truyện/ebook đang phát hành
+
+    Query params:
+        cursor: con trỏ phân trang (nextCursor của trang trước; để trống cho trang đầu).
+                Khi có cursor, tham số page bị bỏ qua và trang sâu tốn chi phí như trang 1.
+        page: số trang (cách phân trang cũ, vẫn được hỗ trợ)
+        fields: danh sách trường cần trả về, cách nhau bởi dấu phẩy
+                (mặc định CARD_FIELDS; "*" để lấy bản ghi đầy đủ)
     """
     page = request.args.get('page', 1, type=int)
+    cursor_param = request.args.get('cursor')
     per_page = config.DEFAULT_ITEMS_PER_PAGE
+    fields = requested_fields(CARD_FIELDS)
+    feed = FEEDS.get(type_slug)
+
+    def matches(data):
+        return feed is not None and isinstance(data, dict) and bool(feed(data))
+
+    cursor = None
+    if cursor_param:
+        try:
+            cursor = decode_cursor(cursor_param)
+        except InvalidCursor as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+    paginated_items = None
+    if CATALOG.ready:
+        # Feed được duy trì sẵn trong bộ nhớ: chỉ đọc đúng các key của trang
+        with CATALOG.lock:
+            if feed is None:
+                page_keys, has_more, total_items = [], False, 0
+            else:
+                total_items = FEED_INDEX.count(type_slug)
+                if cursor is not None:
+                    page_keys, has_more = FEED_INDEX.page_after(type_slug, *sort_position(*cursor), per_page)
+                else:
+                    start_index = (page - 1) * per_page if cursor_param is None else 0
+                    page_keys = FEED_INDEX.page(type_slug, start_index, per_page)
+                    has_more = start_index + per_page < total_items
+            page_entries = [(key, CATALOG.get(key)) for key in page_keys]
+            paginated_items = [item_card(key, value, fields) for key, value in page_entries]
+    elif cursor_param is not None:
+        # Đọc đúng một trang từ kho dữ liệu, lọc theo điều kiện của feed bằng chỉ mục
+        if feed is None:
+            page_entries, has_more = [], False
+        else:
+            page_entries, has_more = call_blocking(
+                "storage", REPOSITORY.page_desc, "updatedAt", feed, per_page, cursor,
+                batch_size=config.LIST_CURSOR_BATCH_SIZE
+            )
+        total_items = None  # Không biết tổng số khi chỉ đọc một trang
+    else:
+        all_items_raw = get_catalog_items()
+        all_entries = []
+
+        if isinstance(all_items_raw, dict):
+            # Sắp xếp theo timestamp updatedAt theo thứ tự giảm dần (mới nhất trước)
+            # Firebase trả về dict, chuyển đổi thành danh sách các tuple và sắp xếp
+            sorted_items_tuples = sorted(all_items_raw.items(), key=lambda item: item[1].get("updatedAt", ""), reverse=True)
+            all_entries = [(key, value) for key, value in sorted_items_tuples if matches(value)]
+
+        start_index = (page - 1) * per_page
+        end_index = start_index + per_page
+        page_entries = all_entries[start_index:end_index]
+        has_more = end_index < len(all_entries)
+        total_items = len(all_entries)
+
+    if paginated_items is None:
+        paginated_items = []
+        for key, value in page_entries:
+            formatted_item = format_item_card((key, value), fields)
+            if formatted_item:
+                paginated_items.append(formatted_item)
+
+    next_cursor = None
+    if has_more and page_entries:
+        last_key, last_value = page_entries[-1]
+        next_cursor = encode_cursor(last_value.get("updatedAt") if isinstance(last_value, dict) else None, last_key)
 
-    query = FB_DB.order_by_child("updatedAt") # Cần .indexOn trong quy tắc Firebase cho "updatedAt"
-
-    all_items_raw = query.get()
-    all_items = []
-
-    if isinstance(all_items_raw, dict):
-        # Sắp xếp theo timestamp updatedAt theo thứ tự giảm dần (mới nhất trước)
-        # Firebase trả về dict, chuyển đổi thành danh sách các tuple và sắp xếp
-        sorted_items_tuples = sorted(all_items_raw.items(), key=lambda item: item[1].get("updatedAt", ""), reverse=True)
-
-        for key, value in sorted_items_tuples:
-            if not isinstance(value, dict):
-                continue
-
-            formatted_item = format_item_for_response((key, value))
-            if not formatted_item:
-                continue
-
-            match = False
-            if type_slug == "truyen-moi" and formatted_item.get("itemType") == "comic":
-                match = True # Giả định "truyen-moi" là truyện mới nhất
-            elif type_slug == "ebook-moi" and formatted_item.get("itemType") == "ebook":
-                match = True
-            elif type_slug == "hoan-thanh" and formatted_item.get("status") == "completed":
-                match = True
-            elif type_slug == "dang-phat-hanh" and formatted_item.get("status") == "ongoing":
-                match = True
-            elif type_slug == "sap-ra-mat": # trạng thái 'coming_soon'
-                 if formatted_item.get("status") == "coming_soon":
-                    match = True
-            
-            if match:
-                all_items.append(formatted_item)
-
-    start_index = (page - 1) * per_page
-    end_index = start_index + per_page
-    paginated_items = all_items[start_index:end_index]
-    
     title_page = type_slug.replace("-", " ").title()
 
     return jsonify({
@@ -306,11 +521,12 @@ def get_comic_list(type_slug):
             "params": {
                 "type_slug": type_slug,
                 "pagination": {
-                    "totalItems": len(all_items),
+                    "totalItems": total_items,
                     "totalItemsPerPage": per_page,
                     "currentPage": page,
                     "pageRanges": 5,
-                     "totalPages": (len(all_items) + per_page - 1) // per_page
+                    "totalPages": (total_items + per_page - 1) // per_page if total_items is not None else None,
+                    "nextCursor": next_cursor
                 }
             },
             "APP_DOMAIN_FRONTEND": "http://localhost:3000",
@@ -319,12 +535,25 @@ def get_comic_list(type_slug):
     })
 
 @app.route('/v1/api/the-loai')
+@conditional(catalog_validators, max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
 def get_categories():
     """
     # Lấy danh sách các thể loại truyện tranh độc nhất từ tất cả các mục trong Firebase.
-    # Điều này có thể chậm trên các tập dữ liệu lớn nếu không có sự tổng hợp trước.
+    # Khi catalog snapshot sẵn sàng, bảng thể loại (kèm số item theo itemType) đã được tính sẵn.
     """
-    all_items_raw = FB_DB.order_by_key().get() # Lấy tất cả các mục
+    if CATALOG.ready:
+        with CATALOG.lock:
+            return jsonify({
+                "status": "success",
+                "message": "",
+                "data": {
+                    "items": CATEGORY_INDEX.table(),
+                    "version": CATEGORY_INDEX.version
+                }
+            })
+
+    all_items_raw = get_catalog_items() # Lấy tất cả các mục
     
     categories = {} # Sử dụng một dict để lưu trữ các thể loại độc nhất theo slug
     if isinstance(all_items_raw, dict):
@@ -345,37 +574,27 @@ def get_categories():
     })
 
 @app.route('/v1/api/the-loai/<string:slug>')
+@conditional(catalog_validators, max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
 def get_category_comics(slug):
-    """Lấy các mục theo slug thể loại."""
+    """Lấy các mục theo slug thể loại (thẻ rút gọn, hoặc theo tham số fields)."""
     page = request.args.get('page', 1, type=int)
     per_page = config.DEFAULT_ITEMS_PER_PAGE
-
-    # Firebase RTDB không hỗ trợ trực tiếp việc truy vấn array_contains cho các thể loại.
-    # Chúng ta cần lấy tất cả các mục và lọc trong ứng dụng.
-    # Điều này không hiệu quả cho các tập dữ liệu lớn.
-    # Để có hiệu suất tốt hơn, bạn thường sẽ chuẩn hóa dữ liệu hoặc sử dụng dịch vụ tìm kiếm.
-    
-    all_items_raw = FB_DB.order_by_key().get() # Lấy tất cả các mục
-    filtered_items = []
+    fields = requested_fields(CARD_FIELDS)
 
     category_name = slug.replace("-", " ").title() # Để hiển thị
-
-    if isinstance(all_items_raw, dict):
-        for key, value in all_items_raw.items():
-            if isinstance(value, dict) and "category" in value and isinstance(value["category"], list):
-                for cat_info in value["category"]:
-                    if isinstance(cat_info, dict) and cat_info.get("slug") == slug:
-                        formatted = format_item_for_response((key, value))
-                        if formatted:
-                            filtered_items.append(formatted)
-                        break # Đã tìm thấy trong các thể loại của mục này
-    
-    # Sắp xếp kết quả (ví dụ: theo updatedAt, mặc định theo key ngầm định)
-    filtered_items.sort(key=lambda x: x.get("updatedAt", ""), reverse=True)
-
     start_index = (page - 1) * per_page
-    end_index = start_index + per_page
-    paginated_items = filtered_items[start_index:end_index]
+
+    if CATALOG.ready:
+        # Chỉ mục thể loại đã sắp xếp sẵn theo updatedAt: chỉ cần cắt đúng một trang
+        with CATALOG.lock:
+            total_items = CATEGORY_INDEX.count(slug)
+            paginated_items = [item_card(key, CATALOG.get(key), fields)
+                               for key in CATEGORY_INDEX.page(slug, start_index, per_page)]
+    else:
+        # Kho dữ liệu lọc theo thể loại (Firebase: tải tất cả rồi lọc; SQLite: dùng chỉ mục thể loại)
+        total_items, page_entries = call_blocking("storage", REPOSITORY.by_category, slug, start_index, per_page)
+        paginated_items = [item for item in (format_item_card(entry, fields) for entry in page_entries) if item]
 
     return jsonify({
         "status": "success",
@@ -386,11 +605,11 @@ def get_category_comics(slug):
                 "type_slug": "the-loai",
                 "slug": slug,
                 "pagination": {
-                    "totalItems": len(filtered_items),
+                    "totalItems": total_items,
                     "totalItemsPerPage": per_page,
                     "currentPage": page,
                     "pageRanges": 5,
-                    "totalPages": (len(filtered_items) + per_page - 1) // per_page
+                    "totalPages": (total_items + per_page - 1) // per_page
                 }
             },
             "APP_DOMAIN_FRONTEND": "http://localhost:3000",
@@ -398,49 +617,84 @@ def get_category_comics(slug):
         }
     })
 
+@app.route('/v1/api/truyen-tranh/batch', methods=['GET', 'POST'])
+@conditional(catalog_validators, max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
+def get_comic_details_batch():
+    """
+    Lấy chi tiết nhiều mục trong một request (màn hình thư viện, lịch sử, yêu thích).
+
+    GET:  ?ids=slug1,slug2,...[&fields=...]
+    POST: JSON {"ids": ["slug1", "slug2", ...], "fields": "a,b" hoặc ["a", "b"]}
+    Mỗi id là slug hoặc khóa Firebase, như /v1/api/truyen-tranh/<slug_or_id>.
+    Items trả về theo đúng thứ tự yêu cầu, mỗi mục một lần (kể cả khi nhiều id, ví dụ slug và khóa,
+    cùng trỏ tới một mục); các id không tìm thấy nằm trong notFound.
+    """
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict) or not isinstance(payload.get("ids"), list):
+            return jsonify({"status": "error", "message": "Body phải là JSON dạng {\"ids\": [...]}"}), 400
+        raw_ids = payload["ids"]
+        fields = parse_fields(payload.get("fields"), requested_fields())
+    else:
+        raw_ids = request.args.get('ids', '').split(',')
+        fields = requested_fields()
+
+    ids = list(dict.fromkeys(str(item_id).strip() for item_id in raw_ids
+                             if isinstance(item_id, (str, int)) and str(item_id).strip()))
+    if not ids:
+        return jsonify({"status": "error", "message": "Tham số ids là bắt buộc"}), 400
+    if len(ids) > config.BATCH_MAX_IDS:
+        return jsonify({
+            "status": "error",
+            "message": f"Tối đa {config.BATCH_MAX_IDS} id mỗi request"
+        }), 400
+
+    if CATALOG.ready:
+        # Tra trong bộ nhớ, không cần gọi mạng
+        resolved = [KEY_RESOLVER.resolve(item_id, COMIC_KEY_PREFIXES) for item_id in ids]
+    else:
+        # Mỗi id có thể cần vài lần đọc Firebase: chạy song song thay vì lần lượt
+        resolved = list(map_blocking("storage", KEY_RESOLVER.resolve, ids, [COMIC_KEY_PREFIXES] * len(ids),
+                                     executor=BATCH_EXECUTOR))
+
+    items, not_found, seen_keys = [], [], set()
+    for item_id, (key, item_data) in zip(ids, resolved):
+        if key is not None and key in seen_keys:
+            continue
+        seen_keys.add(key)
+        formatted_item = project_item(format_item_for_response((key, item_data)), fields) if item_data else None
+        if formatted_item:
+            items.append(formatted_item)
+        else:
+            not_found.append(item_id)
+
+    return jsonify({
+        "status": "success",
+        "message": "",
+        "data": {
+            "items": items,
+            "notFound": not_found,
+            "APP_DOMAIN_FRONTEND": "http://localhost:3000",
+            "APP_DOMAIN_CDN_IMAGE": config.OTRUYEN_CDN_IMAGE_DOMAIN
+        }
+    })
+
 @app.route('/v1/api/truyen-tranh/<string:slug_or_id>')
+@conditional(item_validators(COMIC_KEY_PREFIXES), max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
 def get_comic_details(slug_or_id):
     """
     Lấy chi tiết mục theo slug hoặc khóa Firebase (_id).
     Các khóa Firebase cho truyện tranh có dạng "comic_{slug}" và cho sách điện tử "ebook_{slug}".
     """
     # Thử lấy dữ liệu bằng khóa trực tiếp trước (nếu _id được truyền vào)
-    item_data = FB_DB.child(slug_or_id).get()
-
-    if not item_data or not isinstance(item_data, dict):
-        # Nếu không tìm thấy bằng khóa trực tiếp, thử tìm theo slug.
-        # Điều này yêu cầu phải lặp qua hoặc chỉ mục cụ thể nếu không sử dụng khóa tiền tố.
-        # Giả sử các khóa là "comic_SLUG" hoặc "ebook_SLUG"
-        possible_keys = [f"comic_{slug_or_id}", f"ebook_{slug_or_id}"]
-        for p_key in possible_keys:
-            item_data = FB_DB.child(p_key).get()
-            if item_data and isinstance(item_data, dict):
-                break # Đã tìm thấy
-    
-    if not item_data or not isinstance(item_data, dict):
-        return jsonify({"status": "error", "message": "Truyện không tìm thấy"}), 404
+    slug_or_id, item_data = KEY_RESOLVER.resolve(slug_or_id, COMIC_KEY_PREFIXES)
 
-    # Sử dụng khóa mà nó đã được tìm thấy nếu _id không có trong dữ liệu
-    # Phần này hơi phức tạp vì ta không biết khóa nào đã thành công nếu lặp qua
-    # Tốt nhất nếu slug_or_id là khóa Firebase thực tế.
-    # Để đơn giản, ta giả định item_data bây giờ chứa dữ liệu chính xác.
-    
-    # Nếu khóa của item_data không phải là slug_or_id, điều đó có nghĩa là ta đã tìm thấy nó qua khóa tiền tố.
-    # ta cần khóa gốc cho format_item_for_response nếu _id không có trong item_data.
-    
-    # Hiện tại, nếu _id bị thiếu trong item_data, ta không thể xác định
-    # trừ khi slug_or_id là khóa.
-    # Điều này giả định format_item_for_response có thể xử lý item_data mà không cần một bộ khóa.
-    # Hãy thử tái tạo một dạng khóa cho format_item_for_response
-    
-    effective_key = slug_or_id # Giả định slug_or_id có thể là khóa.
-    if '_id' not in item_data: # Nếu mục đó không có trường _id
-         # Thử xác định khóa nếu tìm thấy theo slug
-        prefix = "comic_" if item_data.get("itemType") == "comic" else "ebook_"
-        if slug_or_id == item_data.get("slug"): # nếu slug_or_id thực sự là một slug
-             effective_key = prefix + slug_or_id
+    if item_data is None:
+        return jsonify({"status": "error", "message": "Truyện không tìm thấy"}), 404
 
-    formatted_item = format_item_for_response((effective_key, item_data))
+    formatted_item = project_item(format_item_for_response((slug_or_id, item_data)), requested_fields())
 
     if not formatted_item:
          return jsonify({"status": "error", "message": "Lỗi xử lý dữ liệu truyện"}), 500
@@ -456,47 +710,34 @@ def get_comic_details(slug_or_id):
     })
 
 @app.route('/v1/api/tim-kiem')
+@conditional(catalog_validators, max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
 def search_comics():
     """
     Tìm kiếm các mục theo từ khóa trong tên hoặc origin_name.
-    Đây là một tìm kiếm cơ bản giống như phía khách hàng bằng cách lấy tất cả và lọc.
-    KHÔNG hiệu quả cho các tập dữ liệu lớn của Firebase RTDB.
-    Cần có chỉ mục trên Firebase hoặc một giải pháp tìm kiếm chuyên dụng để đạt hiệu suất.
+    Khi catalog snapshot sẵn sàng, dùng SearchIndex (bỏ dấu tiếng Việt, xếp hạng theo độ liên quan).
+    Nếu chưa, quay về lọc chuỗi con qua kho dữ liệu (với Firebase: KHÔNG hiệu quả cho tập dữ liệu lớn).
     """
     keyword = request.args.get('keyword', '').lower()
     page = request.args.get('page', 1, type=int)
     per_page = config.DEFAULT_ITEMS_PER_PAGE
+    fields = requested_fields(CARD_FIELDS)
 
     if not keyword:
         return jsonify({"status": "error", "message": "Tham số từ khóa là bắt buộc"}), 400
 
-    all_items_raw = FB_DB.order_by_key().get()
-    search_results = []
-
-    if isinstance(all_items_raw, dict):
-        for key, value in all_items_raw.items():
-            if isinstance(value, dict):
-                name = value.get("name", "").lower()
-                origin_name_list = value.get("origin_name", [])
-                if isinstance(origin_name_list, list):
-                    origin_names = " ".join(origin_name_list).lower()
-                else:
-                    origin_names = ""
-                
-                # Tìm kiếm đơn giản
-                if keyword in name or keyword in origin_names:
-                    formatted = format_item_for_response((key,value))
-                    if formatted:
-                        search_results.append(formatted)
-    
-    # Sắp xếp kết quả (ví dụ: theo độ liên quan nếu đã được triển khai, hoặc theo tên)
-    search_results.sort(key=lambda x: x.get("name", ""))
+    start_index = (page - 1) * per_page
 
+    if CATALOG.ready:
+        # Chỉ mục n-gram (bỏ dấu) trả về top-K đã xếp hạng, không cần quét toàn bộ catalog
+        with CATALOG.lock:
+            total_items, ranked_keys = SEARCH_INDEX.search(keyword, start_index + per_page)
+            paginated_items = [item_card(key, CATALOG.get(key), fields) for key in ranked_keys[start_index:]]
+    else:
+        # Lọc chuỗi con trong tên/origin_name, xếp theo tên (Firebase: quét toàn bộ items)
+        total_items, page_entries = call_blocking("storage", REPOSITORY.search, keyword, start_index, per_page)
+        paginated_items = [item for item in (format_item_card(entry, fields) for entry in page_entries) if item]
 
-    start_index = (page - 1) * per_page
-    end_index = start_index + per_page
-    paginated_items = search_results[start_index:end_index]
-    
     return jsonify({
         "status": "success",
         "data": {
@@ -505,11 +746,11 @@ def search_comics():
             "params": {
                 "keyword": keyword,
                 "pagination": {
-                    "totalItems": len(search_results),
+                    "totalItems": total_items,
                     "totalItemsPerPage": per_page,
                     "currentPage": page,
                     "pageRanges": 5,
-                    "totalPages": (len(search_results) + per_page - 1) // per_page
+                    "totalPages": (total_items + per_page - 1) // per_page
                 }
             },
             "APP_DOMAIN_FRONTEND": "http://localhost:3000",
@@ -518,24 +759,17 @@ def search_comics():
     })
 
 @app.route('/v1/api/truyen-chu/<string:slug_or_id>')
+@conditional(item_validators(TEXT_STORY_KEY_PREFIXES, with_epub=True), max_age=config.HTTP_CACHE_MAX_AGE_CATALOG,
+             body_cache=RESPONSE_CACHE)
 def get_text_story_content(slug_or_id):
     """
     Lấy nội dung truyện chữ theo slug hoặc khóa Firebase (_id).
     Trả về cả metadata và các chương nội dung.
     """
     # Thử lấy dữ liệu bằng khóa trực tiếp trước (nếu _id được truyền vào)
-    item_data = FB_DB.child(slug_or_id).get()
-
-    if not item_data or not isinstance(item_data, dict):
-        # Nếu không tìm thấy bằng khóa trực tiếp, thử tìm bằng slug.
-        possible_keys = [f"ebook_{slug_or_id}", f"text_story_{slug_or_id}"]
-        for p_key in possible_keys:
-            item_data = FB_DB.child(p_key).get()
-            if item_data and isinstance(item_data, dict):
-                slug_or_id = p_key  # Cập nhật để sử dụng khóa đã tìm thấy
-                break  # Đã tìm thấy
-    
-    if not item_data or not isinstance(item_data, dict):
+    slug_or_id, item_data = KEY_RESOLVER.resolve(slug_or_id, TEXT_STORY_KEY_PREFIXES)
+
+    if item_data is None:
         return jsonify({"status": "error", "message": "Truyện chữ không tìm thấy"}), 404
 
     # Kiểm tra xem đây có thực sự là một truyện chữ không
@@ -564,65 +798,37 @@ def get_text_story_content(slug_or_id):
         
         if epub_file_path.exists():
             try:
-                print(f"\n=== Xử lý EPUB cho {book_slug} ===")
-                # Đọc TOC từ EPUB
-                epub_chapters = get_epub_table_of_contents(str(epub_file_path))
-                print(f"Đã nhận {len(epub_chapters)} chương từ TOC")
+                # Chỉ mục chương (sidecar) đã lọc sẵn các chương nội dung
+                chapter_index = chapter_index_for(epub_file_path)
+                total_toc_entries = chapter_index["tocLength"]
                 
                 # Chuyển đổi sang định dạng tương thích với client
-                chapters_data = []
-                chapter_counter = 1  # Đếm số chương thực sự
-                
-                for i, chapter in enumerate(epub_chapters):
-                    print(f"  Chuyển đổi chương {i+1}: {chapter}")
-                    
-                    # Lọc bỏ các chương không phải nội dung chính
-                    title_lower = chapter['title'].lower()
-                    href_lower = chapter['href'].lower()
-                    
-                    # Bỏ qua các chương không phải nội dung chính
-                    if any(skip_word in title_lower for skip_word in ['mục lục', 'toc', 'chào mừng', 'welcome', 'giới thiệu', 'introduction']):
-                        print(f"    Bỏ qua chương không phải nội dung: {chapter['title']}")
-                        continue
-                    if any(skip_word in href_lower for skip_word in ['toc.html', 'welcome.html', 'intro.html']):
-                        print(f"    Bỏ qua href không phải nội dung: {chapter['href']}")
-                        continue
-                    
-                    # Tạo dữ liệu chương với số thứ tự thực tế
-                    chapter_data = {
-                        "filename": f"Chương {chapter_counter}",
-                        "chapter_name": str(chapter_counter),  # Sử dụng counter thay vì order
-                        "chapter_title": chapter['title'],
-                        "chapter_api_data": f"/v1/api/truyen-chu/{book_slug}/chuong/{chapter['order']}"  # Vẫn sử dụng order gốc cho API
-                    }
-                    chapters_data.append(chapter_data)
-                    print(f"    Kết quả: {chapter_data}")
-                    chapter_counter += 1
-                
-                print(f"Tạo được {len(chapters_data)} mục dữ liệu chương")
+                chapters_data = [{
+                    "filename": f"Chương {chapter['number']}",
+                    "chapter_name": str(chapter['number']),  # Sử dụng số thứ tự nội dung thay vì order
+                    "chapter_title": chapter['title'],
+                    "chapter_api_data": f"/v1/api/truyen-chu/{book_slug}/chuong/{chapter['order']}"  # Vẫn sử dụng order gốc cho API
+                } for chapter in chapter_index["chapters"]]
                 
                 content_data = {
                     "chapters": [{
                         "server_name": "EPUB Reader",
                         "server_data": chapters_data
                     }],
-                    "content": f"Ebook EPUB với {len(epub_chapters)} chương. Sử dụng API endpoint để đọc từng chương.",
-                    "totalChapters": len(epub_chapters),
-                    "hasContent": len(epub_chapters) > 0,
+                    "content": f"Ebook EPUB với {total_toc_entries} chương. Sử dụng API endpoint để đọc từng chương.",
+                    "totalChapters": total_toc_entries,
+                    "hasContent": total_toc_entries > 0,
                     "isEpub": True,
                     "epubInfo": {
                         "tocEndpoint": f"/v1/api/truyen-chu/{book_slug}/muc-luc",
-                        "chapterEndpoint": f"/v1/api/truyen-chu/{book_slug}/chuong/{{chapter_number}}"
+                        "chapterEndpoint": f"/v1/api/truyen-chu/{book_slug}/chuong/{{chapter_number}}",
+                        "rangeEndpoint": f"/v1/api/truyen-chu/{book_slug}/chuong?from={{from}}&to={{to}}"
                     }
                 }
-                
-                print(f"Cấu trúc content_data cuối cùng:")
-                print(f"  - totalChapters: {content_data['totalChapters']}")
-                print(f"  - độ dài chapters[0]['server_data']: {len(content_data['chapters'][0]['server_data'])}")
-                print(f"=== Kết thúc xử lý EPUB ===\n")
             except Exception as e:
                 print(f"Lỗi đọc EPUB TOC: {e}")
-                # Quay lại dữ liệu cũ nếu có lỗi
+                # Quay lại dữ liệu cũ nếu có lỗi; lỗi có thể chỉ là tạm thời nên không cache response này
+                uncacheable()
                 content_data = {
                     "chapters": formatted_item.get("chapters", []),
                     "content": formatted_item.get("content", ""),
@@ -633,6 +839,7 @@ def get_text_story_content(slug_or_id):
                 }
         else:
             # File EPUB không tồn tại
+            uncacheable()
             content_data = {
                 "chapters": formatted_item.get("chapters", []),
                 "content": "File EPUB không tồn tại trên server",
@@ -655,7 +862,7 @@ def get_text_story_content(slug_or_id):
         "status": "success",
         "message": "",
         "data": {
-            "item": formatted_item,
+            "item": project_item(formatted_item, requested_fields()),
             "content": content_data,
             "APP_DOMAIN_FRONTEND": "http://localhost:3000",
             "APP_DOMAIN_CDN_IMAGE": config.OTRUYEN_CDN_IMAGE_DOMAIN
@@ -663,6 +870,8 @@ def get_text_story_content(slug_or_id):
     })
 
 @app.route('/v1/api/truyen-chu/<string:slug_or_id>/chuong/<int:chapter_number>')
+@conditional(item_validators(TEXT_STORY_KEY_PREFIXES, with_epub=True), max_age=config.HTTP_CACHE_MAX_AGE_EPUB,
+             body_cache=RESPONSE_CACHE)
 def get_epub_chapter_content(slug_or_id, chapter_number):
     """
     Đọc nội dung chương cụ thể từ file EPUB.
@@ -674,19 +883,10 @@ def get_epub_chapter_content(slug_or_id, chapter_number):
     Returns:
         JSON với nội dung chương
     """
-    # Tìm thông tin truyện từ Firebase
-    item_data = FB_DB.child(slug_or_id).get()
-
-    if not item_data or not isinstance(item_data, dict):
-        # Thử tìm bằng prefix key
-        possible_keys = [f"ebook_{slug_or_id}", f"text_story_{slug_or_id}"]
-        for p_key in possible_keys:
-            item_data = FB_DB.child(p_key).get()
-            if item_data and isinstance(item_data, dict):
-                slug_or_id = p_key
-                break
-    
-    if not item_data or not isinstance(item_data, dict):
+    # Tìm thông tin truyện (trong catalog snapshot, hoặc từ Firebase nếu snapshot chưa sẵn sàng)
+    slug_or_id, item_data = KEY_RESOLVER.resolve(slug_or_id, TEXT_STORY_KEY_PREFIXES)
+
+    if item_data is None:
         return jsonify({"status": "error", "message": "Truyện không tìm thấy"}), 404
 
     # Kiểm tra đây có phải ebook không
@@ -705,25 +905,13 @@ def get_epub_chapter_content(slug_or_id, chapter_number):
         return jsonify({"status": "error", "message": "File EPUB không tồn tại trên server"}), 404
 
     try:
-        # Lấy TOC để tìm chapter theo số thứ tự
-        all_chapters = get_epub_table_of_contents(str(epub_file_path))
+        # Lấy chỉ mục chương (đã lọc các chương nội dung) để tìm chapter theo số thứ tự
+        chapter_index = chapter_index_for(epub_file_path)
         
-        if not all_chapters:
+        if not chapter_index["tocLength"]:
             return jsonify({"status": "error", "message": "Không thể đọc mục lục EPUB"}), 500
         
-        # Lọc ra các chapters thực sự là nội dung chính (giống logic ở endpoint khác)
-        content_chapters = []
-        for chapter in all_chapters:
-            title_lower = chapter['title'].lower()
-            href_lower = chapter['href'].lower()
-            
-            # Bỏ qua các chapters không phải nội dung chính
-            if any(skip_word in title_lower for skip_word in ['mục lục', 'toc', 'chào mừng', 'welcome', 'giới thiệu', 'introduction']):
-                continue
-            if any(skip_word in href_lower for skip_word in ['toc.html', 'welcome.html', 'intro.html']):
-                continue
-            
-            content_chapters.append(chapter)
+        content_chapters = chapter_index["chapters"]
         
         if chapter_number < 1 or chapter_number > len(content_chapters):
             return jsonify({
@@ -736,7 +924,7 @@ def get_epub_chapter_content(slug_or_id, chapter_number):
         chapter_href = target_chapter['href']
         
         # Đọc nội dung chương
-        chapter_content = read_epub_chapter_content(str(epub_file_path), chapter_href)
+        chapter_content = call_blocking("epub", read_epub_chapter_content, str(epub_file_path), chapter_href)
         
         if not chapter_content:
             return jsonify({"status": "error", "message": "Không thể đọc nội dung chương"}), 500
@@ -766,7 +954,130 @@ def get_epub_chapter_content(slug_or_id, chapter_number):
     except Exception as e:
         return jsonify({"status": "error", "message": f"Lỗi đọc EPUB: {str(e)}"}), 500
 
+def int_query_arg(name, default):
+    """Tham số query số nguyên: default nếu không có, None nếu có nhưng không phải số nguyên."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+@app.route('/v1/api/truyen-chu/<string:slug_or_id>/chuong')
+@conditional(item_validators(TEXT_STORY_KEY_PREFIXES, with_epub=True), max_age=config.HTTP_CACHE_MAX_AGE_EPUB,
+             body_cache=RESPONSE_CACHE)
+def stream_epub_chapter_range(slug_or_id):
+    """
+    Tải nhiều chương liên tiếp trong một request (dùng khi tải truyện để đọc offline).
+    File EPUB và chỉ mục chương chỉ được mở một lần; mỗi chương được gửi ngay khi đọc xong,
+    dưới dạng một dòng JSON (NDJSON).
+
+    Query params:
+        from: Số chương đầu tiên (mặc định 1)
+        to: Số chương cuối cùng (mặc định chương cuối)
+        html: 0 để bỏ html_content (mặc định 1)
+
+    Các dòng trả về, theo thứ tự:
+        {"type": "story", "story": {...}, "from": n, "to": m}
+        {"type": "chapter", "chapter": {"number", "title", "content", "html_content", "href"}}
+        {"type": "error", "number": n, "message": str}  (chương không đọc được, các chương sau vẫn được gửi)
+        {"type": "end", "count": số chương đã gửi}
+    """
+    # Tìm thông tin truyện (trong catalog snapshot, hoặc từ Firebase nếu snapshot chưa sẵn sàng)
+    slug_or_id, item_data = KEY_RESOLVER.resolve(slug_or_id, TEXT_STORY_KEY_PREFIXES)
+
+    if item_data is None:
+        return jsonify({"status": "error", "message": "Truyện không tìm thấy"}), 404
+
+    # Kiểm tra đây có phải ebook không
+    if item_data.get("itemType") != "ebook":
+        return jsonify({"status": "error", "message": "Đây không phải là ebook EPUB"}), 400
+
+    # Lấy đường dẫn file EPUB
+    epub_filename = item_data.get("localEpubFilename")
+    if not epub_filename:
+        return jsonify({"status": "error", "message": "Không tìm thấy file EPUB"}), 404
+
+    book_slug = item_data.get("slug", slug_or_id.replace("ebook_", ""))
+    epub_file_path = MEDIA_ROOT_DIR / config.EBOOKS_URL_SUBPATH / book_slug / epub_filename
+
+    if not epub_file_path.exists():
+        return jsonify({"status": "error", "message": "File EPUB không tồn tại trên server"}), 404
+
+    try:
+        chapter_index = chapter_index_for(epub_file_path)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Lỗi đọc EPUB: {str(e)}"}), 500
+
+    if not chapter_index["tocLength"]:
+        return jsonify({"status": "error", "message": "Không thể đọc mục lục EPUB"}), 500
+
+    content_chapters = chapter_index["chapters"]
+    first = int_query_arg('from', 1)
+    last = int_query_arg('to', len(content_chapters))
+    include_html = request.args.get('html', '1') not in ('0', 'false')
+
+    if first is None or last is None:
+        return jsonify({"status": "error", "message": "Tham số from và to phải là số nguyên"}), 400
+    if first < 1 or last > len(content_chapters) or first > last:
+        return jsonify({
+            "status": "error",
+            "message": f"Khoảng chương không hợp lệ. Ebook này có {len(content_chapters)} chương nội dung"
+        }), 400
+
+    story = {
+        "title": item_data.get("name", ""),
+        "slug": book_slug,
+        "totalChapters": len(content_chapters)
+    }
+
+    def ndjson_line(payload):
+        # Cùng bộ mã hóa JSON với các response khác của app (orjson nếu có)
+        return app.json.dumps(payload) + "\n"
+
+    def generate():
+        yield ndjson_line({"type": "story", "story": story, "from": first, "to": last})
+        sent = 0
+        for chapter_number in range(first, last + 1):
+            target_chapter = content_chapters[chapter_number - 1]
+            try:
+                chapter_content = read_book_chapter(entry, target_chapter['href'], include_html=include_html)
+            except Exception as e:
+                print(f"Lỗi đọc chương EPUB {target_chapter['href']} từ {epub_file_path}: {e}")
+                chapter_content = None
+
+            if not chapter_content:
+                yield ndjson_line({"type": "error", "number": chapter_number, "message": "Không thể đọc nội dung chương"})
+                continue
+
+            chapter = {
+                "number": chapter_number,
+                "title": chapter_content['title'] or target_chapter['title'],
+                "content": chapter_content['content'],
+                "href": target_chapter['href']
+            }
+            if include_html:
+                chapter["html_content"] = chapter_content['html_content']
+            yield ndjson_line({"type": "chapter", "chapter": chapter})
+            sent += 1
+        yield ndjson_line({"type": "end", "count": sent})
+
+    try:
+        # Mở sách vào EPUB_CACHE (lời gọi chặn), rồi giữ sách mở cho đến khi gửi xong response,
+        # kể cả khi nó bị đẩy khỏi EPUB_CACHE giữa chừng
+        call_blocking("epub", EPUB_CACHE.get, epub_file_path)
+        entry = EPUB_CACHE.acquire(epub_file_path)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Lỗi đọc EPUB: {str(e)}"}), 500
+    # generate() không dùng request/g: ở chế độ ASGI nó chạy trong pool thread EPUB
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.call_on_close(entry.release)
+    return response
+
 @app.route('/v1/api/truyen-chu/<string:slug_or_id>/muc-luc')
+@conditional(item_validators(TEXT_STORY_KEY_PREFIXES, with_epub=True), max_age=config.HTTP_CACHE_MAX_AGE_EPUB,
+             body_cache=RESPONSE_CACHE)
 def get_epub_table_of_contents_api(slug_or_id):
     """
     Lấy mục lục (Table of Contents) của ebook EPUB.
@@ -777,19 +1088,10 @@ def get_epub_table_of_contents_api(slug_or_id):
     Returns:
         JSON với danh sách chương
     """
-    # Tìm thông tin truyện từ Firebase
-    item_data = FB_DB.child(slug_or_id).get()
-
-    if not item_data or not isinstance(item_data, dict):
-        # Thử tìm bằng prefix key
-        possible_keys = [f"ebook_{slug_or_id}", f"text_story_{slug_or_id}"]
-        for p_key in possible_keys:
-            item_data = FB_DB.child(p_key).get()
-            if item_data and isinstance(item_data, dict):
-                slug_or_id = p_key
-                break
-    
-    if not item_data or not isinstance(item_data, dict):
+    # Tìm thông tin truyện (trong catalog snapshot, hoặc từ Firebase nếu snapshot chưa sẵn sàng)
+    slug_or_id, item_data = KEY_RESOLVER.resolve(slug_or_id, TEXT_STORY_KEY_PREFIXES)
+
+    if item_data is None:
         return jsonify({"status": "error", "message": "Truyện không tìm thấy"}), 404
 
     # Kiểm tra đây có phải ebook không
@@ -808,33 +1110,18 @@ def get_epub_table_of_contents_api(slug_or_id):
         return jsonify({"status": "error", "message": "File EPUB không tồn tại trên server"}), 404
 
     try:
-        # Lấy TOC từ file EPUB
-        all_chapters = get_epub_table_of_contents(str(epub_file_path))
+        # Lấy chỉ mục chương (sidecar) thay vì lọc lại TOC từ file EPUB
+        chapter_index = chapter_index_for(epub_file_path)
         
-        if not all_chapters:
+        if not chapter_index["tocLength"]:
             return jsonify({"status": "error", "message": "Không thể đọc mục lục EPUB"}), 500
         
-        # Lọc ra các chapters thực sự là nội dung chính
-        content_chapters = []
-        chapter_counter = 1
-        
-        for chapter in all_chapters:
-            title_lower = chapter['title'].lower()
-            href_lower = chapter['href'].lower()
-            
-            # Bỏ qua các chapters không phải nội dung chính
-            if any(skip_word in title_lower for skip_word in ['mục lục', 'toc', 'chào mừng', 'welcome', 'giới thiệu', 'introduction']):
-                continue
-            if any(skip_word in href_lower for skip_word in ['toc.html', 'welcome.html', 'intro.html']):
-                continue
-            
-            content_chapters.append({
-                "number": chapter_counter,
-                "title": chapter['title'],
-                "href": chapter['href'],
-                "original_order": chapter['order']  # Giữ lại order gốc để debug
-            })
-            chapter_counter += 1
+        content_chapters = [{
+            "number": chapter['number'],
+            "title": chapter['title'],
+            "href": chapter['href'],
+            "original_order": chapter['order']  # Giữ lại order gốc để debug
+        } for chapter in chapter_index["chapters"]]
         
         return jsonify({
             "status": "success",
@@ -854,7 +1141,20 @@ def get_epub_table_of_contents_api(slug_or_id):
 @app.route('/health')
 def health_check():
     """Endpoint kiểm tra tình trạng hệ thống"""
-    return jsonify({"status": "healthy", "message": "OTruyen API Server (Firebase Edition) đang hoạt động"})
+    return jsonify({
+        "status": "healthy",
+        "message": "OTruyen API Server (Firebase Edition) đang hoạt động",
+        "itemCards": len(CARD_INDEX),
+        "homeFeed": HOME_FEED.stats(),
+        "repository": call_blocking("storage", REPOSITORY.stats),
+        "keyResolver": KEY_RESOLVER.stats(),
+        "epubCache": EPUB_CACHE.stats(),
+        "chapterTextCache": CHAPTER_TEXT_CACHE.stats(),
+        "epubWorkers": EPUB_WORKERS.stats(),
+        "compression": COMPRESSOR.stats(),
+        "responseCache": RESPONSE_CACHE.stats(),
+        "orjson": isinstance(app.json, FastJSONProvider) and app.json.use_orjson
+    })
 
 @app.errorhandler(404)
 def not_found(error):
@@ -894,77 +1194,6 @@ def serve_ebook_media(item_slug, filename):
         app.logger.error(f"Lỗi phục vụ ebook media: {e}")
         return jsonify({"status": "error", "message": "Không thể phục vụ file media ebook"}), 500
 
-def html_to_clean_text(html_content):
-    """
-    Chuyển đổi HTML thành text thuần túy với format đẹp.
-
-    Args:
-        html_content (str): Nội dung HTML
-
-    Returns:
-        str: Text thuần túy đã được format
-    """
-    from bs4 import BeautifulSoup
-    import re
-
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    # Loại bỏ các thẻ không cần thiết
-    for unwanted in soup(["script", "style", "nav", "header", "footer", "aside"]):
-        unwanted.decompose()
-
-    # Loại bỏ các link navigation
-    for link in soup.find_all("a"):
-        if link.get('href', '').startswith('#') or 'nav' in link.get('class', []):
-            link.decompose()
-
-    # Xử lý các thẻ heading - thêm line breaks và format
-    for heading in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-        heading.insert_before('\n\n')
-        heading.insert_after('\n')
-
-    # Xử lý paragraphs
-    for p in soup.find_all('p'):
-        p.insert_after('\n\n')
-
-    # Xử lý divs (chỉ nếu chứa text trực tiếp)
-    for div in soup.find_all('div'):
-        if div.get_text(strip=True) and not div.find(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            div.insert_after('\n')
-
-    # Xử lý line breaks
-    for br in soup.find_all('br'):
-        br.replace_with('\n')
-
-    # Xử lý lists
-    for ul in soup.find_all(['ul', 'ol']):
-        ul.insert_before('\n')
-        ul.insert_after('\n')
-
-    for li in soup.find_all('li'):
-        li.insert_before('• ')
-        li.insert_after('\n')
-
-    # Xử lý blockquotes
-    for blockquote in soup.find_all('blockquote'):
-        blockquote.insert_before('\n"')
-        blockquote.insert_after('"\n')
-
-    # Lấy text
-    text = soup.get_text()
-
-    # Dọn dẹp text
-    # Loại bỏ multiple spaces
-    text = re.sub(r'[ \t]+', ' ', text)
-    # Loại bỏ spaces ở đầu/cuối dòng
-    text = re.sub(r'^ +| +$', '', text, flags=re.MULTILINE)
-    # Giới hạn line breaks liên tiếp
-    text = re.sub(r'\n{4,}', '\n\n\n', text)
-    # Loại bỏ line breaks ở đầu và cuối
-    text = text.strip()
-
-    return text
-
 def read_epub_chapter_content(epub_file_path, chapter_href):
     """
     Đọc nội dung chương từ file EPUB bằng href.
@@ -977,160 +1206,44 @@ def read_epub_chapter_content(epub_file_path, chapter_href):
         dict: {'content': str, 'title': str} hoặc None nếu lỗi
     """
     try:
-        book = epub.read_epub(epub_file_path)
-        
-        # Tìm item dựa trên href
-        target_item = None
-        for item in book.get_items():
-            if hasattr(item, 'get_name') and item.get_name() == chapter_href:
-                target_item = item
-                break
-            # Thử cả file_name attribute
-            if hasattr(item, 'file_name') and item.file_name == chapter_href:
-                target_item = item
-                break
-        
-        if not target_item:
-            # Nếu không tìm thấy exact match, thử tìm partial match
-            for item in book.get_items():
-                item_name = getattr(item, 'file_name', '') or getattr(item, 'get_name', lambda: '')()
-                if chapter_href in item_name or item_name in chapter_href:
-                    target_item = item
-                    break
-        
-        if not target_item:
-            return None
-            
-        # Lấy nội dung và parse HTML
-        content_bytes = target_item.get_content()
-        content_html = content_bytes.decode('utf-8', errors='ignore')
-        
-        # Dùng BeautifulSoup để parse và lấy text
-        soup = BeautifulSoup(content_html, 'html.parser')
-        
-        # Lấy title từ tag h1, h2, hoặc title
-        title = ""
-        for tag in ['h1', 'h2', 'h3', 'title']:
-            title_elem = soup.find(tag)
-            if title_elem:
-                title = title_elem.get_text(strip=True)
-                break
-        
-        # Sử dụng hàm helper để chuyển đổi HTML thành text thuần túy
-        content_text = html_to_clean_text(content_html)
-        
-        return {
-            'title': title,
-            'content': content_text,
-            'html_content': content_html  # Trả về cả HTML cho tùy chọn render
-        }
-        
+        with EPUB_CACHE.borrow(epub_file_path) as entry:
+            return read_book_chapter(entry, chapter_href)
     except Exception as e:
         print(f"Lỗi đọc chương EPUB {chapter_href} từ {epub_file_path}: {e}")
         return None
 
-def get_epub_table_of_contents(epub_file_path):
+def read_book_chapter(entry, chapter_href, include_html=True):
     """
-    Lấy mục lục (TOC) từ file EPUB.
-    
+    Đọc một chương từ EPUB đã mở (CachedEpub giữ bằng EPUB_CACHE.borrow/acquire).
+    Dùng trực tiếp khi cần đọc nhiều chương của cùng một cuốn sách.
+
     Returns:
-        list: Danh sách chapters với format {'title': str, 'href': str, 'order': int}
-    """
-    try:
-        print(f"\n=== Đang đọc TOC từ: {epub_file_path} ===")
-        book = epub.read_epub(epub_file_path)
-        chapters = []
-        
-        # Gỡ lỗi thông tin EPUB
-        print(f"Thông tin metadata EPUB:")
-        print(f"  - Tiêu đề: {book.get_metadata('DC', 'title')}")
-        print(f"  - Loại cấu trúc TOC: {type(book.toc)}")
-        print(f"  - Độ dài TOC: {len(book.toc) if hasattr(book.toc, '__len__') else 'Không xác định'}")
-        
-        # Lấy TOC từ EPUB
-        for i, item in enumerate(book.toc):
-            print(f"  Mục TOC {i}: {type(item)} - {item}")
-            if hasattr(item, 'title') and hasattr(item, 'href'):
-                chapter_info = {
-                    'title': item.title,
-                    'href': item.href,
-                    'order': i + 1
-                }
-                chapters.append(chapter_info)
-                print(f"    Đã thêm chương: {chapter_info}")
-            else:
-                print(f"    Bỏ qua mục (không có title/href): {item}")
-        
-        print(f"Đã tìm thấy {len(chapters)} chương từ TOC")
-        
-        # Nếu không có TOC, thử lấy từ spine (thứ tự đọc)
-        if not chapters:
-            print("Không tìm thấy TOC, thử từ spine...")
-            print(f"Độ dài spine: {len(book.spine)}")
-            
-            for i, item_id in enumerate(book.spine):
-                print(f"  Mục spine {i}: {item_id}")
-                item = book.get_item_with_id(item_id[0])  # các mục spine là tuples
-                if item and hasattr(item, 'get_name'):
-                    item_name = item.get_name()
-                    # Tạo tiêu đề từ filename
-                    title = os.path.splitext(os.path.basename(item_name))[0].replace('_', ' ').title()
-                    chapter_info = {
-                        'title': title,
-                        'href': item_name,
-                        'order': i + 1
-                    }
-                    chapters.append(chapter_info)
-                    print(f"    Đã thêm chương spine: {chapter_info}")
-                else:
-                    print(f"    Bỏ qua mục spine: {item}")
-        
-        print(f"=== Tổng số chương tìm thấy: {len(chapters)} ===\n")
-        return chapters
-    except Exception as e:
-        print(f"Lỗi lấy TOC từ {epub_file_path}: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
-
-def test_html_to_text_conversion():
-    """Hàm test để kiểm tra logic chuyển đổi HTML thành text"""
-    test_html = """
-    <html>
-    <body>
-        <h1>Chương 1: Khởi đầu</h1>
-        <p>Đây là đoạn văn đầu tiên của chương. Nó chứa nhiều thông tin quan trọng.</p>
-        <p>Đây là đoạn văn thứ hai. <br>Có line break ở giữa.</p>
-
-        <h2>Phần 1.1</h2>
-        <div>Nội dung trong div không có thẻ p.</div>
-
-        <ul>
-            <li>Mục thứ nhất</li>
-            <li>Mục thứ hai</li>
-        </ul>
-
-        <blockquote>Đây là một trích dẫn quan trọng.</blockquote>
-
-        <script>alert('test');</script>
-        <style>.test { color: red; }</style>
-    </body>
-    </html>
+        dict: {'content': str, 'title': str, 'html_content': str} hoặc None nếu không tìm thấy chương
     """
+    # Chỉ giải nén đúng member của chương, không phân tích lại cả cuốn sách
+    content_html = entry.book.read_chapter_html(chapter_href)
 
-    result = html_to_clean_text(test_html)
-    print("=== KIỂM TRA CHUYỂN ĐỔI HTML THÀNH TEXT ===")
-    print("HTML đầu vào:")
-    print(test_html)
-    print("\nText đầu ra:")
-    print(repr(result))
-    print("\nOutput được format:")
-    print(result)
-    print("=== KẾT THÚC KIỂM TRA ===")
+    if content_html is None:
+        return None
+
+    # Text đã làm sạch được cache theo phiên bản file EPUB + href
+    cleaned = CHAPTER_TEXT_CACHE.get(entry.fingerprint, chapter_href)
+    if cleaned is None:
+        # Chỉ lấy title và text từ phần <body>, phần <head> chỉ chứa metadata/CSS.
+        # Title và text được lấy cùng một lượt phân tích, trong pool tiến trình EPUB.
+        cleaned = EPUB_WORKERS.convert_chapter(content_html)
+        CHAPTER_TEXT_CACHE.put(entry.fingerprint, chapter_href, cleaned)
+
+    chapter = {
+        'title': cleaned['title'],
+        'content': cleaned['content']
+    }
+    if include_html:
+        chapter['html_content'] = content_html  # Trả về cả HTML cho tùy chọn render
+    return chapter
 
 if __name__ == '__main__':
-    # Kiểm tra chuyển đổi HTML thành text
-    # test_html_to_text_conversion()
+    # Kiểm tra chuyển đổi HTML thành text: chạy `python html_text.py`
 
     # Đảm bảo thư mục media cho ebooks tồn tại (tùy chọn, script nên tạo nếu cần)
     ebook_media_path = MEDIA_ROOT_DIR / config.EBOOKS_URL_SUBPATH
@@ -1141,6 +1254,7 @@ if __name__ == '__main__':
         # print(f"Thông tin: Đã tạo thư mục '{ebook_media_path}'.")
 
     print("Đang khởi động OTruyen API Server (Firebase Edition)...")
+    print(f"Kho dữ liệu: {REPOSITORY.describe()}")
     print(f"Firebase Root Node: {config.FIREBASE_DB_ROOT_NODE}")
     print(f"API Docs (mô phỏng): http://localhost:5000/") # Root hiển thị thông tin cơ bản
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Phân trang theo con trỏ (keyset) cho các danh sách sắp xếp theo updatedAt, mới nhất trước.
+
+Con trỏ là chuỗi base64url (không padding) của JSON [updatedAt, key] của item cuối cùng
+trong trang trước; trang tiếp theo gồm các item đứng sau vị trí đó theo thứ tự
+(updatedAt, key) giảm dần. Vì vậy chi phí đọc một trang không phụ thuộc vào độ sâu của trang.
+"""
+
+import base64
+import json
+
+
+class InvalidCursor(ValueError):
+    """Con trỏ phân trang không hợp lệ."""
+
+
+def sort_position(updated_at, key):
+    """Vị trí (updatedAt, key) dùng để so sánh, cùng quy ước với catalog.item_updated_at."""
+    return ("" if updated_at is None else str(updated_at)), key
+
+
+def encode_cursor(updated_at, key):
+    payload = json.dumps([updated_at, key], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Trả về (updatedAt, key); raise InvalidCursor nếu cursor không đúng định dạng."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        updated_at, key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor(f"Cursor không hợp lệ: {cursor}")
+    if not isinstance(key, str) or not isinstance(updated_at, (str, int, float, type(None))):
+        raise InvalidCursor(f"Cursor không hợp lệ: {cursor}")
+    return updated_at, key
+
+
+def fetch_page_desc(ref, order_child, feed_filter, count, cursor=None, batch_size=100, max_batches=3):
+    """
+    Đọc một trang trực tiếp từ Firebase RTDB bằng order_by_child(order_child),
+    end_at(giá trị của con trỏ) và limit_to_last, lọc bằng feed_filter(data) trên từng lô
+    (None = mọi item). Mỗi lô chỉ bắt đầu từ vị trí con trỏ, không tải lại các trang trước.
+
+    RTDB chỉ sắp xếp được theo một child nên điều kiện của feed không lọc được cùng lúc với
+    order_child. Với feed thưa, các lô chủ yếu là item không liên quan: nếu feed_filter là
+    catalog.FieldEquals (child, value) thì chỉ quét tối đa max_batches lô, sau đó chuyển sang
+    order_by_child(child).equal_to(value) (child có trong .indexOn) để chỉ tải các item của feed.
+
+    Trả về (list (key, data) theo thứ tự giảm dần, còn trang sau hay không).
+    """
+    boundary = cursor
+    limit = max(batch_size, count + 1)
+    results = []
+    batches = 0
+
+    while len(results) <= count:
+        if batches >= max_batches and hasattr(feed_filter, "child"):
+            return fetch_feed_page_desc(ref, order_child, feed_filter, count, cursor)
+        batches += 1
+        query = ref.order_by_child(order_child)
+        if boundary is not None:
+            # end_at không nhận None; "" bao gồm cả các item thiếu order_child (null đứng đầu trong RTDB)
+            query = query.end_at("" if boundary[0] is None else boundary[0])
+        batch = query.limit_to_last(limit).get() or {}
+
+        entries = sorted(
+            ((sort_position(data.get(order_child), key), key, data)
+             for key, data in batch.items() if isinstance(data, dict)),
+            reverse=True
+        )
+        if boundary is not None:
+            boundary_position = sort_position(*boundary)
+            entries = [entry for entry in entries if entry[0] < boundary_position]
+
+        for _, key, data in entries:
+            if feed_filter is None or feed_filter(data):
+                results.append((key, data))
+                if len(results) > count:
+                    break
+
+        if len(batch) < limit:
+            break  # Đã đọc tới đầu danh sách
+        if not entries:
+            # Cả lô trùng updatedAt với con trỏ: mở rộng lô thay vì lặp lại cùng một truy vấn
+            limit *= 2
+            continue
+        _, last_key, last_data = entries[-1]
+        boundary = (last_data.get(order_child), last_key)
+
+    return results[:count], len(results) > count
+
+
+def fetch_feed_page_desc(ref, order_child, feed_filter, count, cursor=None):
+    """
+    Một trang của feed child == value: RTDB chỉ trả về các item của feed
+    (order_by_child(child).equal_to(value)), sắp xếp theo (order_child, key) ở client.
+    """
+    matched = ref.order_by_child(feed_filter.child).equal_to(feed_filter.value).get() or {}
+    entries = sorted(
+        ((sort_position(data.get(order_child), key), key, data)
+         for key, data in matched.items() if isinstance(data, dict)),
+        reverse=True
+    )
+    if cursor is not None:
+        boundary_position = sort_position(*cursor)
+        entries = [entry for entry in entries if entry[0] < boundary_position]
+    page = [(key, data) for _, key, data in entries[:count + 1]]
+    return page[:count], len(page) > count
@@ -0,0 +1,123 @@
+"""
+Xử lý trước toàn bộ EPUB trong thư mục media (sau khi deploy hoặc import hàng loạt).
+
+Với mỗi file media/ebooks/<slug>/*.epub, chuyển đổi mọi chương nội dung một lần và ghi:
+  - chỉ mục chương (sidecar <file>.epub.index.json, xem epub_index.py): TOC, các chương
+    nội dung, tiêu đề, độ dài text và số từ của từng chương;
+  - text đã làm sạch của từng chương vào kho trên đĩa của chapter_text_cache
+    (<file>.epub.textcache/), đúng chỗ API server tìm đến trước khi tự chuyển đổi.
+Sau đó API phục vụ mục lục và chương mà không phải chuyển đổi HTML nào
+(cần CHAPTER_TEXT_CACHE_ON_DISK = True trong config.py).
+
+Các sách được xử lý song song trên nhiều tiến trình. Sách có chỉ mục khớp fingerprint hiện tại
+của file (mtime, kích thước) và đủ text của mọi chương thì được bỏ qua, nên chạy lại chỉ xử lý
+các sách mới hoặc đã thay đổi.
+
+Cách dùng:
+    python preprocess_epubs.py [--media-dir media/ebooks] [--jobs N] [--force]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from chapter_text_cache import ChapterTextCache
+from epub_cache import file_fingerprint
+from epub_index import build_chapter_index, load_chapter_index, save_chapter_index
+from epub_reader import EpubZipReader
+
+
+def find_epubs(media_dir):
+    """Các file EPUB dạng <media_dir>/<slug>/*.epub, theo thứ tự tên."""
+    return sorted(path for path in Path(media_dir).glob("*/*.epub") if path.is_file())
+
+
+def is_preprocessed(epub_file_path, text_cache):
+    """
+    Sách đã có chỉ mục (kèm thống kê text) khớp file hiện tại và text của mọi chương chưa.
+    Chương có href không trỏ tới file nào trong zip (member None) không có text để lưu, nên không xét.
+    """
+    fingerprint = file_fingerprint(epub_file_path)
+    index = load_chapter_index(epub_file_path, fingerprint)
+    if index is None or not index.get("textStats"):
+        return False
+    return all(
+        text_cache.is_on_disk(fingerprint, chapter["href"])
+        for chapter in index["chapters"] if chapter.get("member") is not None
+    )
+
+
+def preprocess_book(epub_file_path, force=False):
+    """
+    Xử lý một sách (chạy trong tiến trình con). Trả về dict kết quả:
+    {"path", "status": "done" | "skipped", "chapters", "words", "seconds"}.
+    """
+    started = time.perf_counter()
+    # Chỉ dùng tầng đĩa: tiến trình con không phục vụ request nào
+    text_cache = ChapterTextCache(max_memory_bytes=0, on_disk=True)
+    if not force and is_preprocessed(epub_file_path, text_cache):
+        return {"path": str(epub_file_path), "status": "skipped", "chapters": 0, "words": 0, "seconds": 0.0}
+
+    fingerprint = file_fingerprint(epub_file_path)
+    reader = EpubZipReader(epub_file_path)
+    try:
+        index = build_chapter_index(
+            reader, fingerprint, text_stats=True,
+            on_text=lambda href, cleaned: text_cache.put(fingerprint, href, cleaned)
+        )
+    finally:
+        reader.close()
+    save_chapter_index(epub_file_path, index)
+    return {
+        "path": str(epub_file_path),
+        "status": "done",
+        "chapters": len(index["chapters"]),
+        "words": sum(chapter["wordCount"] for chapter in index["chapters"]),
+        "seconds": time.perf_counter() - started
+    }
+
+
+def main():
+    import config
+
+    default_media_dir = Path(__file__).resolve().parent / "media" / config.EBOOKS_URL_SUBPATH
+    parser = argparse.ArgumentParser(description="Chuyển đổi trước mọi chương của các EPUB trong thư mục media.")
+    parser.add_argument("--media-dir", default=str(default_media_dir),
+                        help=f"Thư mục chứa các thư mục sách (mặc định: {default_media_dir})")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Số tiến trình song song (mặc định: số CPU)")
+    parser.add_argument("--force", action="store_true", help="Xử lý lại cả các sách không thay đổi")
+    args = parser.parse_args()
+
+    epubs = find_epubs(args.media_dir)
+    if not epubs:
+        print(f"Không tìm thấy file EPUB nào trong {args.media_dir}")
+        return 0
+
+    print(f"Đang xử lý {len(epubs)} EPUB với {args.jobs} tiến trình...")
+    started = time.perf_counter()
+    done = skipped = failed = 0
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        futures = {executor.submit(preprocess_book, path, args.force): path for path in epubs}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  LỖI {path}: {e}")
+                continue
+            if result["status"] == "skipped":
+                skipped += 1
+            else:
+                done += 1
+                print(f"  {path}: {result['chapters']} chương, {result['words']} từ ({result['seconds']:.1f}s)")
+
+    print(f"Xong trong {time.perf_counter() - started:.1f}s: {done} đã xử lý, {skipped} không đổi, {failed} lỗi")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
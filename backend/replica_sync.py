@@ -0,0 +1,122 @@
+"""
+Tiến trình đồng bộ bản sao SQLite của library_items từ Firebase Realtime Database.
+
+Lắng nghe stream listen() của RTDB và áp dụng từng sự kiện put/patch vào file SQLite
+(storage.SqliteItemRepository). Sự kiện đầu tiên của mỗi lần kết nối (put tại '/', gồm cả
+khi SDK tự kết nối lại) được so sánh với nội dung đang lưu và chỉ ghi các item khác biệt,
+nên khởi động lại tiến trình không làm mất bản sao: server vẫn đọc được dữ liệu cũ trong lúc
+Firebase không truy cập được, rồi bắt kịp ngay khi kết nối lại.
+
+API server đọc bản sao khi đặt STORAGE_BACKEND = "sqlite" trong config.py; các worker của server
+nhận thay đổi qua bảng nhật ký changes của file (xem SQLITE_POLL_INTERVAL).
+
+    python replica_sync.py [--db đường_dẫn.sqlite3] [--once]
+"""
+
+import argparse
+import threading
+import time
+from pathlib import Path
+
+from catalog import event_changes, is_root_put, items_from_root
+from storage import FirebaseItemRepository, SqliteItemRepository, StorageError, sqlite_path
+
+
+class ReplicaSync:
+    """Áp dụng các sự kiện listen() của source (Firebase) vào replica (SqliteItemRepository)."""
+
+    def __init__(self, source, replica, retention=24 * 3600, prune_interval=3600):
+        self.source = source
+        self.replica = replica
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._listener = None
+        self._stopped = threading.Event()
+        # Một sự kiện áp dụng lỗi thì đồng bộ lại toàn bộ ở vòng lặp chính
+        self._needs_full_sync = threading.Event()
+        self.events = 0
+        self.failures = 0
+
+    def handle_event(self, event):
+        try:
+            if is_root_put(event.event_type, event.path):
+                items = items_from_root(event.data)
+                changed = self.replica.sync_all(items)
+                print(f"Đã đồng bộ toàn bộ {len(items)} items ({changed} thay đổi).")
+            else:
+                changes = event_changes(event.event_type, event.path, event.data, self.replica.get)
+                if changes:
+                    self.replica.apply_changes(changes)
+            self.events += 1
+        except Exception as e:
+            self.failures += 1
+            self._needs_full_sync.set()
+            print(f"Lỗi áp dụng sự kiện ({event.event_type} {event.path}): {e}")
+
+    def sync_once(self):
+        """Đồng bộ toàn bộ một lần bằng một lần đọc Firebase. Trả về số item đã thay đổi."""
+        return self.replica.sync_all(self.source.all_items())
+
+    def run(self):
+        """Lắng nghe cho đến khi stop() (hoặc Ctrl+C); định kỳ dọn nhật ký thay đổi."""
+        self._listener = self.source.listen(self.handle_event)
+        next_prune = time.monotonic()
+        try:
+            while not self._stopped.wait(1):
+                if self._needs_full_sync.is_set():
+                    self._needs_full_sync.clear()
+                    try:
+                        print(f"Đồng bộ lại toàn bộ: {self.sync_once()} thay đổi.")
+                    except Exception as e:
+                        self._needs_full_sync.set()
+                        print(f"Lỗi đồng bộ lại toàn bộ: {e}")
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + self.prune_interval
+                    pruned = self.replica.prune_changes(self.retention)
+                    if pruned:
+                        print(f"Đã dọn {pruned} dòng nhật ký thay đổi.")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._listener.close()
+            self._listener = None
+
+    def stop(self):
+        self._stopped.set()
+
+
+def main():
+    import config
+
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Đồng bộ library_items từ Firebase vào file SQLite cho STORAGE_BACKEND = \"sqlite\".")
+    parser.add_argument("--db", default=None, help="Đường dẫn file SQLite (mặc định: config.SQLITE_DB_PATH)")
+    parser.add_argument("--once", action="store_true", help="Đồng bộ toàn bộ một lần rồi thoát")
+    args = parser.parse_args()
+
+    try:
+        source = FirebaseItemRepository.connect(
+            config.FIREBASE_SERVICE_ACCOUNT_KEY_PATH,
+            config.FIREBASE_REALTIME_DATABASE_URL,
+            config.FIREBASE_DB_ROOT_NODE,
+            base_dir=base_dir
+        )
+        target = Path(args.db) if args.db else sqlite_path(config, base_dir)
+        replica = SqliteItemRepository(target, create=True)
+    except StorageError as e:
+        print(f"Lỗi: {e}")
+        return 1
+
+    sync = ReplicaSync(source, replica,
+                       retention=config.REPLICA_CHANGES_RETENTION,
+                       prune_interval=config.REPLICA_PRUNE_INTERVAL)
+    if args.once:
+        print(f"Đã đồng bộ {target}: {sync.sync_once()} thay đổi.")
+        return 0
+    print(f"Đang đồng bộ {config.FIREBASE_DB_ROOT_NODE} vào {target} (Ctrl+C để dừng)")
+    sync.run()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
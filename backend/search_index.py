@@ -0,0 +1,148 @@
+"""
+Chỉ mục tìm kiếm trong bộ nhớ cho /v1/api/tim-kiem.
+Bỏ dấu tiếng Việt (để "truyen" khớp "truyện"), dùng posting trigram cho từ khóa
+từ 3 ký tự trở lên và posting bigram cho từ khóa 2 ký tự; từ khóa là chuỗi con bất kỳ
+của tên/origin_name ở mọi độ dài (từ khóa 1 ký tự thì duyệt mọi item).
+Được CatalogSnapshot cập nhật tăng dần giống các chỉ mục khác trong catalog.py.
+"""
+
+import heapq
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fold_text(text):
+    """
+    Chuẩn hóa văn bản để tìm kiếm: chữ thường, bỏ dấu, đ -> d, gộp khoảng trắng.
+    Ví dụ: "Truyện  Kiếm Hiệp" -> "truyen kiem hiep"
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFD', str(text).lower())
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    text = text.replace('đ', 'd')
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _searchable_fields(data):
+    """Trả về (name, origin_names) đã bỏ dấu của một item."""
+    if not isinstance(data, dict):
+        return None
+    origin_name_list = data.get("origin_name", [])
+    origin_names = " ".join(str(o) for o in origin_name_list if o) if isinstance(origin_name_list, list) else ""
+    return fold_text(data.get("name", "")), fold_text(origin_names)
+
+
+class SearchIndex:
+    """
+    Chỉ mục n-gram trên name và origin_name của các item.
+
+    Kết quả được xếp hạng: trùng tên > tên bắt đầu bằng từ khóa > một từ trong tên
+    bắt đầu bằng từ khóa > tên chứa từ khóa > chỉ khớp origin_name; cùng hạng thì theo tên.
+    """
+
+    def __init__(self):
+        self._docs = {}
+        self._trigram_postings = {}
+        self._bigram_postings = {}
+
+    def rebuild(self, items):
+        self._docs = {}
+        self._trigram_postings = {}
+        self._bigram_postings = {}
+        for key, data in items.items():
+            fields = _searchable_fields(data)
+            if fields:
+                self._add(key, fields)
+
+    def update(self, key, old, new):
+        fields = _searchable_fields(new)
+        if self._docs.get(key) == fields:
+            return
+        self._remove(key)
+        if fields:
+            self._add(key, fields)
+
+    def _terms(self, fields):
+        trigrams, bigrams = set(), set()
+        for field in fields:
+            trigrams |= _trigrams(field)
+            bigrams |= _bigrams(field)
+        return trigrams, bigrams
+
+    def _add(self, key, fields):
+        self._docs[key] = fields
+        trigrams, bigrams = self._terms(fields)
+        for gram in trigrams:
+            self._trigram_postings.setdefault(gram, set()).add(key)
+        for gram in bigrams:
+            self._bigram_postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key):
+        fields = self._docs.pop(key, None)
+        if not fields:
+            return
+        trigrams, bigrams = self._terms(fields)
+        for postings, terms in ((self._trigram_postings, trigrams), (self._bigram_postings, bigrams)):
+            for term in terms:
+                keys = postings.get(term)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del postings[term]
+
+    def _candidates(self, query):
+        if len(query) == 1:
+            # Posting của một ký tự gần như là mọi item: duyệt thẳng
+            return self._docs.keys()
+        if len(query) == 2:
+            return self._bigram_postings.get(query, set())
+
+        postings = []
+        for gram in _trigrams(query):
+            keys = self._trigram_postings.get(gram)
+            if not keys:
+                return set()
+            postings.append(keys)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def search(self, keyword, limit):
+        """
+        Tìm các item khớp keyword.
+        Trả về (tổng số kết quả, danh sách tối đa limit key đã xếp hạng).
+        """
+        query = fold_text(keyword)
+        if not query:
+            return 0, []
+
+        spaced_query = f" {query}"
+        docs = self._docs
+        matches = []
+        for key in self._candidates(query):
+            name, origin_names = docs[key]
+            # Hạng (nhỏ hơn là tốt hơn) của kết quả
+            if name.startswith(query):
+                rank = 0 if name == query else 1
+            elif spaced_query in f" {name}":
+                rank = 2
+            elif query in name:
+                rank = 3
+            elif query in origin_names:
+                rank = 4
+            else:
+                continue
+            matches.append((rank, name, key))
+
+        top = heapq.nsmallest(limit, matches) if limit > 0 else []
+        return len(matches), [key for _, _, key in top]
@@ -0,0 +1,715 @@
+"""
+Kho dữ liệu library_items cho API server.
+
+ItemRepository là giao diện chung mà các route dùng thay vì gọi thẳng db.reference:
+đọc theo key, đọc các item mới nhất theo một child, phân trang giảm dần theo updatedAt,
+lọc theo thể loại, tìm kiếm theo tên, và lắng nghe thay đổi (cho catalog snapshot).
+
+Hai cài đặt, chọn bằng config.STORAGE_BACKEND:
+  - "firebase": FirebaseItemRepository, đọc Firebase Realtime Database (như trước đây)
+  - "sqlite":   SqliteItemRepository, đọc file SQLite cục bộ có chỉ mục trên updatedAt,
+                createdAt, itemType, status, thể loại và bảng FTS cho tên; không cần mạng
+                hay service account key
+
+Nạp file SQLite từ bản export JSON của RTDB (hoặc đọc thẳng từ Firebase):
+    python storage.py import library_items.json [--db đường_dẫn.sqlite3]
+    python storage.py import --from-firebase [--db đường_dẫn.sqlite3]
+hoặc giữ file luôn đồng bộ với Firebase bằng tiến trình replica_sync.py.
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from pathlib import Path
+
+from catalog import item_categories, item_updated_at
+from pagination import fetch_page_desc, sort_position
+
+# Sự kiện thay đổi cùng dạng với sự kiện listen() của RTDB: put/patch tại path
+StorageEvent = namedtuple("StorageEvent", ["event_type", "path", "data"])
+
+
+class StorageError(Exception):
+    """Không thể mở hoặc khởi tạo kho dữ liệu."""
+
+
+def item_name(data):
+    name = data.get("name", "")
+    return name if isinstance(name, str) else str(name)
+
+
+def item_search_text(data):
+    """Tên và origin_name viết thường, cách nhau bởi ký tự không thể có trong từ khóa."""
+    origin_names = data.get("origin_name", [])
+    origin_text = " ".join(str(name) for name in origin_names) if isinstance(origin_names, list) else ""
+    return f"{item_name(data).lower()}\x00{origin_text.lower()}"
+
+
+def matches_keyword(data, keyword):
+    """Từ khóa (đã viết thường) là chuỗi con của tên hoặc origin_name."""
+    name_text, origin_text = item_search_text(data).split("\x00", 1)
+    return keyword in name_text or keyword in origin_text
+
+
+class ItemRepository(ABC):
+    """
+    Giao diện chung của kho library_items. Các dict item trả về có thể được dùng chung,
+    không được sửa.
+    """
+
+    backend = None
+
+    @abstractmethod
+    def get(self, key):
+        """Item theo key, hoặc None."""
+
+    @abstractmethod
+    def all_items(self):
+        """Toàn bộ items dưới dạng dict {key: data}."""
+
+    @abstractmethod
+    def latest(self, order_child, count):
+        """count item có order_child lớn nhất, giảm dần (giống order_by_child().limit_to_last() của RTDB)."""
+
+    @abstractmethod
+    def page_desc(self, order_child, feed_filter, count, cursor=None, batch_size=100):
+        """
+        Một trang các item thỏa feed_filter(data), giảm dần theo (order_child, key), bắt đầu sau
+        con trỏ cursor = (giá trị, key). Trả về (list (key, data), còn trang sau hay không).
+        feed_filter thường là catalog.FieldEquals (child, value), để kho lọc bằng chỉ mục;
+        None nghĩa là mọi item.
+        """
+
+    @abstractmethod
+    def by_category(self, slug, start, count):
+        """(tổng số, list (key, data)) các item thuộc thể loại slug, updatedAt giảm dần."""
+
+    @abstractmethod
+    def search(self, keyword, start, count):
+        """(tổng số, list (key, data)) các item có keyword (viết thường) trong tên/origin_name, xếp theo tên."""
+
+    @abstractmethod
+    def listen(self, callback):
+        """
+        Gọi callback(event) với sự kiện put tại '/' chứa toàn bộ dữ liệu, sau đó với từng thay đổi.
+        Trả về đối tượng có close() để dừng lắng nghe.
+        """
+
+    def describe(self):
+        return self.backend
+
+    def stats(self):
+        return {"backend": self.backend}
+
+    def close(self):
+        pass
+
+
+class FirebaseItemRepository(ItemRepository):
+    """Kho library_items trên Firebase Realtime Database."""
+
+    backend = "firebase"
+
+    def __init__(self, ref, max_scan_batches=3):
+        self._ref = ref
+        self.max_scan_batches = max_scan_batches
+
+    @classmethod
+    def connect(cls, key_path, database_url, root_node, base_dir=None, **options):
+        """Khởi tạo Firebase Admin SDK và trả về kho cho node root_node (options chuyển cho __init__)."""
+        import firebase_admin
+        from firebase_admin import credentials, db
+
+        # Đường dẫn tương đối được hiểu là tương đối với thư mục backend
+        key_path = Path(key_path)
+        if not key_path.is_absolute() and base_dir is not None:
+            key_path = Path(base_dir) / key_path
+        if not key_path.exists():
+            raise StorageError(
+                f"Không tìm thấy Firebase service account key tại đường dẫn đã phân giải: {key_path}. "
+                "Kiểm tra FIREBASE_SERVICE_ACCOUNT_KEY_PATH trong config.py, "
+                "hoặc dùng STORAGE_BACKEND = \"sqlite\" để chạy không cần Firebase."
+            )
+        try:
+            try:
+                firebase_admin.get_app()  # Đã khởi tạo (ví dụ: CLI gọi connect hai lần)
+            except ValueError:
+                firebase_admin.initialize_app(credentials.Certificate(str(key_path)), {
+                    'databaseURL': database_url
+                })
+            return cls(db.reference(root_node), **options)
+        except Exception as e:
+            raise StorageError(f"Không thể khởi tạo Firebase Admin SDK: {e}") from e
+
+    def get(self, key):
+        return self._ref.child(key).get()
+
+    def all_items(self):
+        results = self._ref.order_by_key().get()
+        if isinstance(results, list):
+            results = {str(i): value for i, value in enumerate(results) if value is not None}
+        return results if isinstance(results, dict) else {}
+
+    def latest(self, order_child, count):
+        results = self._ref.order_by_child(order_child).limit_to_last(count).get()
+        if not isinstance(results, dict):
+            return []
+        # Kết quả của limit_to_last theo thứ tự tăng dần, nên đảo ngược để giảm dần (mới nhất trước)
+        return [(key, value) for key, value in reversed(list(results.items())) if isinstance(value, dict)]
+
+    def page_desc(self, order_child, feed_filter, count, cursor=None, batch_size=100):
+        return fetch_page_desc(self._ref, order_child, feed_filter, count, cursor,
+                               batch_size=batch_size, max_batches=self.max_scan_batches)
+
+    def by_category(self, slug, start, count):
+        # RTDB không truy vấn được phần tử trong mảng category: tải tất cả rồi lọc
+        entries = [(key, value) for key, value in self.all_items().items()
+                   if isinstance(value, dict) and slug in item_categories(value)]
+        # Cùng thứ tự với catalog.CategoryIndex: (updatedAt, key) giảm dần
+        entries.sort(key=lambda entry: (item_updated_at(entry[1]), entry[0]), reverse=True)
+        return len(entries), entries[start:start + count] if start >= 0 else []
+
+    def search(self, keyword, start, count):
+        entries = [(key, value) for key, value in self.all_items().items()
+                   if isinstance(value, dict) and matches_keyword(value, keyword)]
+        entries.sort(key=lambda entry: entry[1].get("name", ""))
+        return len(entries), entries[start:start + count] if start >= 0 else []
+
+    def listen(self, callback):
+        return self._ref.listen(callback)
+
+
+class _StaticListener:
+    def close(self):
+        pass
+
+
+class _ReadTransaction:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN")
+        return self._conn
+
+    def __exit__(self, *exc_info):
+        self._conn.rollback()
+
+
+class _ChangePoller:
+    """
+    Thread nền theo dõi bảng changes của SqliteItemRepository và gửi mỗi item bị thay đổi
+    thành sự kiện put tại '/<key>' (data None nghĩa là item đã bị xóa). Nếu nhật ký đã bị
+    cắt bớt qua vị trí đang đọc, hoặc file được nạp lại từ đầu (replica_id khác), thì gửi
+    lại toàn bộ dữ liệu bằng một sự kiện put tại '/'.
+    """
+
+    def __init__(self, repository, callback, replica_id, last_seq, interval):
+        self._repository = repository
+        self._callback = callback
+        self._replica_id = replica_id
+        self._last_seq = last_seq
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sqlite-change-poller", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Lỗi đọc thay đổi từ SQLite: {e}")
+        self._repository.close()
+
+    def _poll(self):
+        repository = self._repository
+        with repository._read_transaction() as conn:
+            state = repository._sync_state(conn)
+            if state.get("replica_id") != self._replica_id or int(state.get("pruned_through", 0)) > self._last_seq:
+                self._replica_id = state.get("replica_id")
+                self._last_seq = repository._last_seq(conn)
+                events = [StorageEvent('put', '/', repository._all_items(conn))]
+            else:
+                rows = conn.execute(
+                    "SELECT seq, key FROM changes WHERE seq > ? ORDER BY seq LIMIT 1000", (self._last_seq,)
+                ).fetchall()
+                if not rows:
+                    return
+                self._last_seq = rows[-1][0]
+                keys = list(dict.fromkeys(key for _, key in rows))
+                events = [StorageEvent('put', f'/{key}', repository._get(conn, key)) for key in keys]
+        for event in events:
+            if self._stopped.is_set():
+                return
+            self._callback(event)
+
+
+class SqliteItemRepository(ItemRepository):
+    """
+    Kho library_items trong một file SQLite.
+
+    Mỗi item là một dòng của bảng items (JSON gốc trong cột data) kèm các cột được trích ra
+    để đánh chỉ mục: item_type, status, updated_at (chuỗi, "" nếu thiếu, cùng quy ước với
+    catalog), created_at (giá trị gốc), name và search_text. Bảng item_categories giữ
+    quan hệ thể loại - item, bảng FTS5 items_fts (tokenizer trigram) đánh chỉ mục search_text
+    nếu bản SQLite hỗ trợ. Mỗi thread dùng một kết nối riêng.
+
+    Mọi thay đổi được ghi thêm vào bảng changes (nhật ký có thứ tự) để các tiến trình khác
+    đang đọc cùng file (nhiều worker của API server) nhận được qua listen().
+    """
+
+    backend = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS items (
+            key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            item_type TEXT,
+            status TEXT,
+            updated_at TEXT NOT NULL DEFAULT '',
+            created_at,
+            name TEXT NOT NULL DEFAULT '',
+            search_text TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_items_updated_at ON items (updated_at, key);
+        CREATE INDEX IF NOT EXISTS idx_items_created_at ON items (created_at, key);
+        CREATE INDEX IF NOT EXISTS idx_items_type_updated_at ON items (item_type, updated_at, key);
+        CREATE INDEX IF NOT EXISTS idx_items_status_updated_at ON items (status, updated_at, key);
+        CREATE INDEX IF NOT EXISTS idx_items_name ON items (name, key);
+        CREATE TABLE IF NOT EXISTS item_categories (
+            slug TEXT NOT NULL,
+            key TEXT NOT NULL REFERENCES items (key) ON DELETE CASCADE,
+            updated_at TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (slug, key)
+        );
+        DROP INDEX IF EXISTS idx_item_categories_slug_updated_at;
+        CREATE INDEX IF NOT EXISTS idx_item_categories_slug_order
+            ON item_categories (slug, updated_at, key);
+        CREATE INDEX IF NOT EXISTS idx_item_categories_key ON item_categories (key);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL,
+            changed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_changes_changed_at ON changes (changed_at);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value
+        );
+    """
+
+    # Bảng FTS riêng (không dùng external content): SQLite cắt chuỗi tại ký tự \x00 trong search_text,
+    # nên nội dung FTS được tạo ở Python (_fts_text) và cập nhật cùng lúc với bảng items trong _write
+    FTS_SCHEMA = "CREATE VIRTUAL TABLE items_fts USING fts5(search_text, tokenize='trigram')"
+
+    # Tokenizer trigram chỉ tìm được từ khóa có ít nhất 3 ký tự
+    FTS_MIN_KEYWORD_LENGTH = 3
+
+    # Các child có cột riêng, dùng được cho latest() và page_desc()
+    ORDER_COLUMNS = {"updatedAt": "updated_at", "createdAt": "created_at"}
+    # Các child có chỉ mục (cột, updated_at, key): điều kiện feed trên chúng được lọc bằng SQL
+    FILTER_COLUMNS = {"itemType": "item_type", "status": "status"}
+
+    def __init__(self, path, create=False, poll_interval=None):
+        self.path = Path(path)
+        if not create and not self.path.exists():
+            raise StorageError(
+                f"Không tìm thấy file SQLite: {self.path}. "
+                f"Tạo file bằng: python storage.py import <export.json> --db {self.path} "
+                "hoặc python replica_sync.py"
+            )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('replica_id', ?)",
+                         (uuid.uuid4().hex,))
+        self.fts = self._ensure_fts()
+
+    def _ensure_fts(self):
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone():
+            return True
+        try:
+            with self._write_lock, conn:
+                conn.execute(self.FTS_SCHEMA)
+                conn.executemany(
+                    "INSERT INTO items_fts (rowid, search_text) VALUES (?, ?)",
+                    ((rowid, self._fts_text(text)) for rowid, text in
+                     conn.execute("SELECT rowid, search_text FROM items").fetchall())
+                )
+            return True
+        except sqlite3.OperationalError as e:
+            # Tiến trình khác vừa tạo bảng cùng lúc thì vẫn dùng được
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone():
+                return True
+            print(f"SQLite không hỗ trợ FTS5 trigram ({e}), tìm kiếm sẽ quét bảng items")
+            return False
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _read_transaction(self):
+        """Context manager: các truy vấn bên trong đọc cùng một phiên bản của file (WAL snapshot)."""
+        return _ReadTransaction(self._connection())
+
+    def describe(self):
+        return f"sqlite ({self.path})"
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _load(data):
+        return json.loads(data)
+
+    def _entries(self, rows):
+        return [(key, self._load(data)) for key, data in rows]
+
+    # --- Ghi ---
+    @staticmethod
+    def _dump(data):
+        # sort_keys để cùng một item luôn có cùng chuỗi JSON (so sánh được khi đồng bộ lại)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+    @classmethod
+    def _row(cls, key, data):
+        created_at = data.get("createdAt")
+        if not isinstance(created_at, (str, int, float)) or isinstance(created_at, bool):
+            created_at = None
+        return (
+            key, cls._dump(data),
+            data.get("itemType") if isinstance(data.get("itemType"), str) else None,
+            data.get("status") if isinstance(data.get("status"), str) else None,
+            item_updated_at(data), created_at, item_name(data), item_search_text(data)
+        )
+
+    @staticmethod
+    def _fts_text(search_text):
+        return search_text.replace("\x00", "\n")
+
+    def _write(self, conn, key, data, changed_at=None):
+        conn.execute("DELETE FROM item_categories WHERE key = ?", (key,))
+        if self.fts:
+            conn.execute("DELETE FROM items_fts WHERE rowid = (SELECT rowid FROM items WHERE key = ?)", (key,))
+        if not isinstance(data, dict) or not data:
+            conn.execute("DELETE FROM items WHERE key = ?", (key,))
+        else:
+            # UPSERT giữ nguyên rowid của item (INSERT OR REPLACE cấp rowid mới), rowid này cũng là rowid trong items_fts
+            row = self._row(key, data)
+            conn.execute(
+                "INSERT INTO items (key, data, item_type, status, updated_at, created_at, name, search_text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET data = excluded.data, item_type = excluded.item_type, "
+                "status = excluded.status, updated_at = excluded.updated_at, created_at = excluded.created_at, "
+                "name = excluded.name, search_text = excluded.search_text",
+                row
+            )
+            if self.fts:
+                conn.execute(
+                    "INSERT INTO items_fts (rowid, search_text) "
+                    "SELECT rowid, ? FROM items WHERE key = ?", (self._fts_text(row[-1]), key)
+                )
+            updated_at = item_updated_at(data)
+            conn.executemany(
+                "INSERT OR IGNORE INTO item_categories (slug, key, updated_at) VALUES (?, ?, ?)",
+                [(slug, key, updated_at) for slug in item_categories(data)]
+            )
+        if changed_at is not None:
+            conn.execute("INSERT INTO changes (key, changed_at) VALUES (?, ?)", (key, changed_at))
+
+    @staticmethod
+    def _set_state(conn, **values):
+        conn.executemany("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", values.items())
+
+    def put(self, key, data):
+        """Ghi (hoặc xóa, nếu data là None) một item."""
+        self.apply_changes({key: data})
+
+    def apply_changes(self, changes):
+        """Ghi các thay đổi {key: data hoặc None} trong một transaction và ghi chúng vào nhật ký."""
+        now = time.time()
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                for key, data in changes.items():
+                    self._write(conn, key, data, changed_at=now)
+                self._set_state(conn, last_event_at=now)
+
+    def sync_all(self, items):
+        """
+        Đồng bộ toàn bộ nội dung với dict {key: data}: chỉ ghi các item khác với bản đang lưu
+        và xóa các item không còn tồn tại (dùng khi bắt đầu lại sau khi mất kết nối hoặc khởi động lại).
+        Trả về số item đã thay đổi.
+        """
+        now = time.time()
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                stored = dict(conn.execute("SELECT key, data FROM items"))
+                changed = 0
+                for key, data in items.items():
+                    if not isinstance(data, dict) or not data:
+                        continue
+                    if stored.pop(key, None) != self._dump(data):
+                        self._write(conn, key, data, changed_at=now)
+                        changed += 1
+                for key in stored:
+                    self._write(conn, key, None, changed_at=now)
+                    changed += 1
+                self._set_state(conn, last_event_at=now, last_full_sync_at=now)
+        return changed
+
+    def replace_all(self, items):
+        """
+        Thay toàn bộ nội dung bằng dict {key: data} trong một transaction.
+        Nhật ký thay đổi bắt đầu lại từ đầu, nên các tiến trình đang theo dõi sẽ tải lại toàn bộ.
+        """
+        now = time.time()
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM item_categories")
+                conn.execute("DELETE FROM items")
+                conn.execute("DELETE FROM changes")
+                if self.fts:
+                    conn.execute("DELETE FROM items_fts")
+                for key, data in items.items():
+                    self._write(conn, key, data)
+                self._set_state(conn, replica_id=uuid.uuid4().hex, pruned_through=0,
+                                last_event_at=now, last_full_sync_at=now)
+
+    def prune_changes(self, max_age):
+        """Xóa các dòng nhật ký cũ hơn max_age giây. Trả về số dòng đã xóa."""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                through = conn.execute(
+                    "SELECT MAX(seq) FROM changes WHERE changed_at < ?", (time.time() - max_age,)
+                ).fetchone()[0]
+                if through is None:
+                    return 0
+                deleted = conn.execute("DELETE FROM changes WHERE seq <= ?", (through,)).rowcount
+                self._set_state(conn, pruned_through=through)
+        return deleted
+
+    # --- Đọc ---
+    @staticmethod
+    def _sync_state(conn):
+        return dict(conn.execute("SELECT name, value FROM sync_state"))
+
+    @staticmethod
+    def _last_seq(conn):
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def _get(self, conn, key):
+        row = conn.execute("SELECT data FROM items WHERE key = ?", (key,)).fetchone()
+        return self._load(row[0]) if row else None
+
+    def _all_items(self, conn):
+        rows = conn.execute("SELECT key, data FROM items ORDER BY key")
+        return {key: self._load(data) for key, data in rows}
+
+    def get(self, key):
+        return self._get(self._connection(), key)
+
+    def all_items(self):
+        return self._all_items(self._connection())
+
+    def _order_column(self, order_child):
+        column = self.ORDER_COLUMNS.get(order_child)
+        if column is None:
+            raise ValueError(f"Không hỗ trợ sắp xếp theo {order_child}")
+        return column
+
+    def latest(self, order_child, count):
+        column = self._order_column(order_child)
+        rows = self._connection().execute(
+            f"SELECT key, data FROM items ORDER BY {column} DESC, key DESC LIMIT ?", (count,)
+        ).fetchall()
+        return self._entries(rows)
+
+    def page_desc(self, order_child, feed_filter, count, cursor=None, batch_size=100):
+        if order_child != "updatedAt":
+            raise ValueError(f"Không hỗ trợ phân trang theo {order_child}")
+        conditions, params = [], []
+        column = self.FILTER_COLUMNS.get(getattr(feed_filter, "child", None))
+        if column is not None:
+            # Dùng chỉ mục (column, updated_at, key): chỉ đọc đúng các item của feed
+            conditions.append(f"{column} = ?")
+            params.append(feed_filter.value)
+            feed_filter = None
+        if cursor is not None:
+            conditions.append("(updated_at, key) < (?, ?)")
+            params.extend(sort_position(*cursor))
+        sql = "SELECT key, data FROM items"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY updated_at DESC, key DESC"
+
+        if feed_filter is None:
+            entries = self._entries(self._connection().execute(f"{sql} LIMIT ?", params + [count + 1]).fetchall())
+            return entries[:count], len(entries) > count
+
+        # Điều kiện không có chỉ mục: đọc dần theo updated_at, dừng ngay khi đủ count + 1 item thỏa điều kiện
+        results = []
+        rows = self._connection().execute(sql, params)
+        while len(results) <= count:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                break
+            for key, data in batch:
+                data = self._load(data)
+                if feed_filter(data):
+                    results.append((key, data))
+                    if len(results) > count:
+                        break
+        rows.close()
+        return results[:count], len(results) > count
+
+    def by_category(self, slug, start, count):
+        conn = self._connection()
+        total = conn.execute("SELECT COUNT(*) FROM item_categories WHERE slug = ?", (slug,)).fetchone()[0]
+        if start < 0:
+            return total, []
+        rows = conn.execute(
+            "SELECT items.key, items.data FROM item_categories "
+            "JOIN items ON items.key = item_categories.key "
+            "WHERE item_categories.slug = ? "
+            "ORDER BY item_categories.updated_at DESC, item_categories.key DESC "
+            "LIMIT ? OFFSET ?",
+            (slug, count, start)
+        ).fetchall()
+        return total, self._entries(rows)
+
+    def search(self, keyword, start, count):
+        # instr() giữ đúng ngữ nghĩa chuỗi con; bảng FTS (nếu có) chỉ thu hẹp tập ứng viên
+        where, params = "instr(search_text, ?) > 0", (keyword,)
+        if self.fts and len(keyword) >= self.FTS_MIN_KEYWORD_LENGTH:
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            where = "rowid IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?) AND " + where
+            params = (phrase, keyword)
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM items WHERE {where}", params).fetchone()[0]
+        if start < 0:
+            return total, []
+        rows = conn.execute(
+            f"SELECT key, data FROM items WHERE {where} ORDER BY name, key LIMIT ? OFFSET ?",
+            params + (count, start)
+        ).fetchall()
+        return total, self._entries(rows)
+
+    def listen(self, callback):
+        # Đọc toàn bộ dữ liệu và vị trí nhật ký trong cùng một snapshot để không bỏ sót thay đổi
+        with self._read_transaction() as conn:
+            replica_id = self._sync_state(conn).get("replica_id")
+            last_seq = self._last_seq(conn)
+            items = self._all_items(conn)
+        callback(StorageEvent('put', '/', items))
+        if not self.poll_interval:
+            return _StaticListener()
+        return _ChangePoller(self, callback, replica_id, last_seq, self.poll_interval)
+
+    def stats(self):
+        conn = self._connection()
+        state = self._sync_state(conn)
+        return {
+            "backend": self.backend,
+            "path": str(self.path),
+            "items": conn.execute("SELECT COUNT(*) FROM items").fetchone()[0],
+            "fts": self.fts,
+            "lastSeq": self._last_seq(conn),
+            "lastEventAt": state.get("last_event_at"),
+            "lastFullSyncAt": state.get("last_full_sync_at")
+        }
+
+
+def sqlite_path(settings, base_dir):
+    path = Path(settings.SQLITE_DB_PATH)
+    return path if path.is_absolute() else Path(base_dir) / path
+
+
+def create_repository(settings, base_dir):
+    """Tạo kho dữ liệu theo settings.STORAGE_BACKEND (module config). Raise StorageError nếu không mở được."""
+    backend = getattr(settings, "STORAGE_BACKEND", "firebase")
+    if backend == "firebase":
+        return FirebaseItemRepository.connect(
+            settings.FIREBASE_SERVICE_ACCOUNT_KEY_PATH,
+            settings.FIREBASE_REALTIME_DATABASE_URL,
+            settings.FIREBASE_DB_ROOT_NODE,
+            base_dir=base_dir,
+            max_scan_batches=getattr(settings, "LIST_CURSOR_MAX_BATCHES", 3)
+        )
+    if backend == "sqlite":
+        return SqliteItemRepository(sqlite_path(settings, base_dir),
+                                    poll_interval=getattr(settings, "SQLITE_POLL_INTERVAL", None))
+    raise StorageError(f"STORAGE_BACKEND không hợp lệ: {backend!r} (chỉ hỗ trợ \"firebase\" hoặc \"sqlite\")")
+
+
+def _load_export(path, root_node):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    # Chấp nhận cả export của node library_items lẫn export của toàn bộ database
+    if isinstance(data, dict) and isinstance(data.get(root_node), dict):
+        data = data[root_node]
+    if not isinstance(data, dict):
+        raise StorageError(f"File {path} không chứa dict các item")
+    return data
+
+
+def main():
+    import config
+
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Nạp library_items vào file SQLite cho STORAGE_BACKEND = \"sqlite\".")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Nạp toàn bộ items (thay thế nội dung cũ)")
+    import_parser.add_argument("source", nargs="?", help="File JSON export từ Firebase RTDB")
+    import_parser.add_argument("--from-firebase", action="store_true", help="Đọc trực tiếp từ Firebase theo config.py")
+    import_parser.add_argument("--db", default=None, help="Đường dẫn file SQLite (mặc định: config.SQLITE_DB_PATH)")
+    args = parser.parse_args()
+
+    if bool(args.source) == args.from_firebase:
+        parser.error("Cần đúng một nguồn: đường dẫn file JSON hoặc --from-firebase")
+    try:
+        if args.from_firebase:
+            items = FirebaseItemRepository.connect(
+                config.FIREBASE_SERVICE_ACCOUNT_KEY_PATH,
+                config.FIREBASE_REALTIME_DATABASE_URL,
+                config.FIREBASE_DB_ROOT_NODE,
+                base_dir=base_dir
+            ).all_items()
+        else:
+            items = _load_export(args.source, config.FIREBASE_DB_ROOT_NODE)
+        target = Path(args.db) if args.db else sqlite_path(config, base_dir)
+        repository = SqliteItemRepository(target, create=True)
+        repository.replace_all(items)
+    except (StorageError, OSError, ValueError) as e:
+        print(f"Lỗi: {e}")
+        return 1
+    print(f"Đã nạp {len(items)} items vào {target}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
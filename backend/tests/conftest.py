@@ -0,0 +1,294 @@
+import itertools
+import random
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+# Các module của backend được import trực tiếp (chạy server từ thư mục backend)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog import FieldEquals  # noqa: E402
+
+CATEGORIES = [
+    {"id": "c1", "slug": "kiem-hiep", "name": "Kiếm Hiệp"},
+    {"id": "c2", "slug": "tien-hiep", "name": "Tiên Hiệp"},
+    {"id": "c3", "slug": "ngon-tinh", "name": "Ngôn Tình"},
+    {"id": "c4", "slug": "trinh-tham", "name": "Trinh Thám"},
+]
+WORDS = ["Kiếm", "Hiệp", "Truyện", "Đạo", "Tiên", "Long", "Anh", "Hùng", "Ma", "Thần", "Mộng", "Giang"]
+# Ít giá trị updatedAt để có nhiều item trùng thời điểm (kiểm tra thứ tự theo key)
+UPDATED_AT = [f"2024-05-{day:02d}T10:00:00Z" for day in range(1, 13)]
+# Các feed của /v1/api/danh-sach/<type>, như FEEDS trong otruyen_api_server.py
+FEEDS = {
+    "truyen-moi": FieldEquals("itemType", "comic"),
+    "ebook-moi": FieldEquals("itemType", "ebook"),
+    "hoan-thanh": FieldEquals("status", "completed"),
+    "dang-phat-hanh": FieldEquals("status", "ongoing"),
+    "sap-ra-mat": FieldEquals("status", "coming_soon"),
+}
+# Các seed của chuỗi sự kiện ngẫu nhiên trong các test "cập nhật dần == dựng lại"
+EVENT_SEEDS = [1, 2, 3]
+
+
+def make_item(rng, key):
+    """Một item library_items ngẫu nhiên (nhưng xác định theo rng)."""
+    item = {
+        "_id": key,
+        "slug": key.split("_", 1)[1],
+        "name": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))),
+        "origin_name": [rng.choice(WORDS)] if rng.random() < 0.7 else [],
+        "itemType": "ebook" if key.startswith("ebook_") else "comic",
+        "status": rng.choice(["completed", "ongoing", "coming_soon"]),
+        "category": rng.sample(CATEGORIES, rng.randint(0, 2)),
+        "createdAt": rng.randint(1, 10_000),
+        "thumb_url": f"{key}.jpg",
+    }
+    if rng.random() < 0.9:
+        item["updatedAt"] = rng.choice(UPDATED_AT)
+    return item
+
+
+def make_items(seed=7, count=120):
+    rng = random.Random(seed)
+    return {
+        key: make_item(rng, key)
+        for key in (f"{'ebook' if i % 3 == 0 else 'comic'}_{i:03d}" for i in range(count))
+    }
+
+
+@pytest.fixture
+def items():
+    return make_items()
+
+
+def random_events(rng, keys, count):
+    """Các sự kiện put/patch ngẫu nhiên giống sự kiện listen() của RTDB."""
+    events = []
+    for _ in range(count):
+        key = rng.choice(keys)
+        kind = rng.randrange(6)
+        if kind == 0:
+            events.append(("put", f"/{key}", make_item(rng, key)))
+        elif kind == 1:
+            events.append(("put", f"/{key}", None))
+        elif kind == 2:
+            events.append(("patch", f"/{key}", {"updatedAt": rng.choice(UPDATED_AT), "status": "completed"}))
+        elif kind == 3:
+            # RTDB không gửi mảng rỗng: xóa thể loại là put null
+            categories = rng.sample(CATEGORIES, rng.randint(0, 3)) or None
+            events.append(("put", f"/{key}/category", categories))
+        elif kind == 4:
+            events.append(("put", f"/{key}/name", " ".join(rng.sample(WORDS, 2))))
+        else:
+            other = rng.choice(keys)
+            events.append(("patch", "/", {key: make_item(rng, key), other: None}))
+    return events
+
+
+def apply_to_model(model, event_type, path, data):
+    """Áp dụng sự kiện lên dict {key: item} theo đúng ngữ nghĩa RTDB (chỉ các dạng random_events sinh ra)."""
+    segments = [segment for segment in path.split("/") if segment]
+    if not segments:
+        for key, value in data.items():
+            if value is None:
+                model.pop(key, None)
+            else:
+                model[key] = value
+        return
+    key = segments[0]
+    if len(segments) == 1:
+        if event_type == "patch":
+            if key in model:
+                model[key] = {**model[key], **data}
+            else:
+                model[key] = dict(data)
+        elif data is None:
+            model.pop(key, None)
+        else:
+            model[key] = data
+        return
+    child = segments[1]
+    item = dict(model.get(key, {}))
+    if data is None:
+        item.pop(child, None)
+    else:
+        item[child] = data
+    if item:
+        model[key] = item
+    else:
+        model.pop(key, None)
+
+
+def replay_random_events(catalog, items, seed, count=400):
+    """
+    Nạp items vào catalog (put tại '/') rồi áp dụng count sự kiện ngẫu nhiên lên cả catalog
+    và một dict mô hình. Trả về (mô hình {key: item}, mọi key đã được dùng).
+    """
+    rng = random.Random(seed)
+    catalog.apply_event("put", "/", items)
+    model = dict(items)
+    keys = sorted(items) + [f"comic_new_{i}" for i in range(10)]
+    for event_type, path, data in random_events(rng, keys, count):
+        catalog.apply_event(event_type, path, data)
+        apply_to_model(model, event_type, path, data)
+    return model, keys
+
+
+def chapter_xhtml(title, body):
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Sách thử</title>'
+        '<style>p { color: red; }</style></head>'
+        f'<body><h2>{title}</h2>{body}</body></html>'
+    )
+
+
+def write_epub(path, chapter_count=5, toc="nav", nested=False, missing=False):
+    """
+    Ghi một EPUB tối giản bằng zipfile (không cần ebooklib).
+    toc: "nav" (EPUB3), "ncx" (EPUB2) hoặc None (mục lục lấy từ spine).
+    nested: gộp chương 2-3 vào một section "Phần 1"; missing: thêm mục TOC trỏ tới file không tồn tại.
+    Trả về list (title, file_name) của các chương.
+    """
+    chapters = [(f"Chương {i}", f"text/chap_{i}.xhtml") for i in range(1, chapter_count + 1)]
+    entries = [(title, href, None) for title, href in chapters]
+    if nested:
+        entries[1:3] = [("Phần 1", chapters[1][1], entries[1:3])]
+    if missing:
+        entries.append(("Chương thiếu", "text/missing.xhtml", None))
+
+    manifest = [
+        f'<item id="chap{i}" href="{href}" media-type="application/xhtml+xml"/>'
+        for i, (_, href) in enumerate(chapters, 1)
+    ]
+    if toc == "nav":
+        manifest.append('<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>')
+    elif toc == "ncx":
+        manifest.append('<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>')
+    spine = "".join(f'<itemref idref="chap{i}"/>' for i in range(1, chapter_count + 1))
+    spine_attrs = ' toc="ncx"' if toc == "ncx" else ""
+    opf = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        f'<package xmlns="http://www.idpf.org/2007/opf" version="{"3.0" if toc == "nav" else "2.0"}" unique-identifier="id">'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        '<dc:identifier id="id">sach-thu</dc:identifier><dc:title>Sách thử</dc:title><dc:language>vi</dc:language>'
+        f'</metadata><manifest>{"".join(manifest)}</manifest>'
+        f'<spine{spine_attrs}>{spine}</spine></package>'
+    )
+
+    def nav_items(items):
+        parts = []
+        for title, href, children in items:
+            if children:
+                parts.append(f'<li><span>{title}</span><ol>{nav_items(children)}</ol></li>')
+            else:
+                parts.append(f'<li><a href="{href}">{title}</a></li>')
+        return "".join(parts)
+
+    def nav_points(items, counter):
+        parts = []
+        for title, href, children in items:
+            number = next(counter)
+            parts.append(
+                f'<navPoint id="p{number}" playOrder="{number}"><navLabel><text>{title}</text></navLabel>'
+                f'<content src="{href}"/>{nav_points(children, counter) if children else ""}</navPoint>'
+            )
+        return "".join(parts)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        archive.writestr("META-INF/container.xml", (
+            '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            '</rootfiles></container>'
+        ))
+        archive.writestr("OEBPS/content.opf", opf)
+        if toc == "nav":
+            archive.writestr("OEBPS/nav.xhtml", (
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+                f'<head><title>Mục lục</title></head><body><nav epub:type="toc"><ol>{nav_items(entries)}</ol></nav>'
+                '</body></html>'
+            ))
+        elif toc == "ncx":
+            archive.writestr("OEBPS/toc.ncx", (
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1"><head/>'
+                f'<docTitle><text>Sách thử</text></docTitle><navMap>{nav_points(entries, itertools.count(1))}</navMap></ncx>'
+            ))
+        for i, (title, href) in enumerate(chapters, 1):
+            body = "".join(f"<p>Đoạn {j} của chương {i} &amp; <b>đậm</b>.</p>" for j in range(1, 4))
+            archive.writestr(f"OEBPS/{href}", chapter_xhtml(title, body), compress_type=zipfile.ZIP_DEFLATED)
+    return chapters
+
+
+# Số chương nội dung của EPUB "sach-thu" trong dữ liệu của server (5 chương + 1 mục TOC trỏ tới file thiếu)
+SERVER_BOOK_CHAPTERS = 6
+
+
+def server_items():
+    """
+    Dữ liệu library_items của server trong test: các item ngẫu nhiên, một truyện tranh có chương
+    và hai ebook có/không có file EPUB.
+    """
+    items = make_items(count=60)
+    items["ebook_sach-thu"] = {
+        "_id": "ebook_sach-thu", "slug": "sach-thu", "name": "Sách Thử", "itemType": "ebook",
+        "status": "completed", "category": [CATEGORIES[0]], "createdAt": 20_000,
+        "updatedAt": "2024-06-01T10:00:00Z", "localEpubFilename": "book.epub",
+        "localCoverFilename": "cover.jpg", "author": ["Tác Giả"], "views": 42,
+    }
+    items["comic_co-chuong"] = {
+        "_id": "comic_co-chuong", "slug": "co-chuong", "name": "Có Chương", "itemType": "comic",
+        "status": "ongoing", "category": [CATEGORIES[1]], "createdAt": 19_999,
+        "updatedAt": "2024-05-30T10:00:00Z", "thumb_url": "co-chuong.jpg",
+        "chapters": [
+            {"server_name": "Server 1", "server_data": [{"chapter_name": "1"}, {"chapter_name": "2"}]},
+            {"server_name": "Server 2", "server_data": [{"chapter_name": "3"}]},
+        ],
+    }
+    items["ebook_khong-file"] = {
+        "_id": "ebook_khong-file", "slug": "khong-file", "name": "Không File", "itemType": "ebook",
+        "status": "ongoing", "createdAt": 20_001, "localEpubFilename": "missing.epub",
+    }
+    return items
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """
+    Module otruyen_api_server thật, đọc dữ liệu từ file SQLite tạm (không cần Firebase)
+    và EPUB từ thư mục media tạm.
+    """
+    import config
+    from storage import SqliteItemRepository
+
+    root = tmp_path_factory.mktemp("server")
+    db_path = root / "library_items.sqlite3"
+    repository = SqliteItemRepository(db_path, create=True)
+    repository.replace_all(server_items())
+    repository.close()
+    media = root / "media"
+    write_epub(media / config.EBOOKS_URL_SUBPATH / "sach-thu" / "book.epub",
+               chapter_count=SERVER_BOOK_CHAPTERS - 1, missing=True)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(config, "STORAGE_BACKEND", "sqlite")
+        patch.setattr(config, "SQLITE_DB_PATH", str(db_path))
+        patch.setattr(config, "SQLITE_POLL_INTERVAL", None)
+        patch.setattr(config, "EPUB_WORKER_PROCESSES", 0)
+        import otruyen_api_server
+    otruyen_api_server.MEDIA_ROOT_DIR = media
+    yield otruyen_api_server
+    otruyen_api_server.HOME_FEED.stop()
+    otruyen_api_server.CATALOG.stop()
+    otruyen_api_server.EPUB_WORKERS.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
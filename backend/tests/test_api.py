@@ -0,0 +1,312 @@
+import json
+
+import pytest
+
+from catalog import CARD_FIELDS, CatalogSnapshot, KeyResolver
+from conftest import FEEDS, SERVER_BOOK_CHAPTERS, server_items
+from pagination import sort_position
+
+RANGE_URL = "/v1/api/truyen-chu/sach-thu/chuong"
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_chapter_range_streams_one_line_per_chapter(client):
+    response = client.get(f"{RANGE_URL}?from=2&to=4")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = ndjson(response)
+    assert lines[0] == {
+        "type": "story", "from": 2, "to": 4,
+        "story": {"title": "Sách Thử", "slug": "sach-thu", "totalChapters": SERVER_BOOK_CHAPTERS},
+    }
+    chapters = [line["chapter"] for line in lines[1:-1]]
+    assert [chapter["number"] for chapter in chapters] == [2, 3, 4]
+    assert chapters[0]["title"] == "Chương 2"
+    assert chapters[0]["href"] == "text/chap_2.xhtml"
+    assert chapters[0]["content"] == "Chương 2\nĐoạn 1 của chương 2 & đậm.\n\nĐoạn 2 của chương 2 & đậm.\n\nĐoạn 3 của chương 2 & đậm."
+    assert "<h2>Chương 2</h2>" in chapters[0]["html_content"]
+    assert lines[-1] == {"type": "end", "count": 3}
+
+
+def test_chapter_range_matches_single_chapter_route(client):
+    lines = ndjson(client.get(f"{RANGE_URL}?from=1&to=1"))
+    single = client.get("/v1/api/truyen-chu/sach-thu/chuong/1").get_json()["data"]["chapter"]
+    assert lines[1]["chapter"]["content"] == single["content"]
+    assert lines[1]["chapter"]["title"] == single["title"]
+
+
+def test_chapter_range_without_html_defaults_to_whole_book(client):
+    lines = ndjson(client.get(f"{RANGE_URL}?html=0"))
+    assert lines[0]["from"] == 1 and lines[0]["to"] == SERVER_BOOK_CHAPTERS
+    assert all("html_content" not in line.get("chapter", {}) for line in lines)
+    # Chương cuối trỏ tới file không có trong EPUB: một dòng lỗi, các chương khác vẫn được gửi
+    assert lines[-2] == {"type": "error", "number": SERVER_BOOK_CHAPTERS, "message": "Không thể đọc nội dung chương"}
+    assert lines[-1] == {"type": "end", "count": SERVER_BOOK_CHAPTERS - 1}
+
+
+def test_chapter_range_rejects_bad_bounds(client):
+    for query in ("from=abc", "to=1.5", "from=0", f"to={SERVER_BOOK_CHAPTERS + 1}", "from=3&to=2"):
+        response = client.get(f"{RANGE_URL}?{query}")
+        assert response.status_code == 400, query
+        assert response.get_json()["status"] == "error"
+
+
+def test_chapter_range_not_found(client):
+    assert client.get("/v1/api/truyen-chu/khong-co/chuong").status_code == 404
+    assert client.get("/v1/api/truyen-chu/khong-file/chuong").status_code == 404
+
+
+def test_detail_routes_resolve_slugs_and_keys(client):
+    for path in ("sach-thu", "ebook_sach-thu"):
+        response = client.get(f"/v1/api/truyen-tranh/{path}")
+        assert response.status_code == 200, path
+        assert response.get_json()["data"]["item"]["slug"] == "sach-thu"
+    assert client.get("/v1/api/truyen-chu/sach-thu/muc-luc").status_code == 200
+    assert client.get("/v1/api/truyen-tranh/khong-co").status_code == 404
+
+
+@pytest.fixture
+def cold_server(server, monkeypatch):
+    """Server khi catalog snapshot chưa sẵn sàng: các route đọc trực tiếp từ kho dữ liệu."""
+    catalog = CatalogSnapshot()
+    monkeypatch.setattr(server, "CATALOG", catalog)
+    monkeypatch.setattr(server, "KEY_RESOLVER", KeyResolver(catalog, server.REPOSITORY.get))
+    return server
+
+
+def list_keys(client, type_slug, **params):
+    """Các _id của một trang /danh-sach cùng nextCursor."""
+    response = client.get(f"/v1/api/danh-sach/{type_slug}", query_string=params)
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+    return [item["_id"] for item in data["items"]], data["params"]["pagination"]["nextCursor"]
+
+
+def walk_list(client, type_slug, **params):
+    keys, cursor = list_keys(client, type_slug, cursor="", **params)
+    while cursor:
+        page, cursor = list_keys(client, type_slug, cursor=cursor, **params)
+        keys.extend(page)
+    return keys
+
+
+def walk_pages(client, type_slug):
+    keys, page = [], 1
+    while True:
+        page_keys, _ = list_keys(client, type_slug, page=page)
+        if not page_keys:
+            return keys
+        keys.extend(page_keys)
+        page += 1
+
+
+def feed_order(type_slug):
+    """Các key của feed theo (updatedAt, key) giảm dần, tính thẳng từ dữ liệu của server."""
+    entries = [(sort_position(data.get("updatedAt"), key), key)
+               for key, data in server_items().items() if FEEDS[type_slug](data)]
+    return [key for _, key in sorted(entries, reverse=True)]
+
+
+@pytest.mark.parametrize("type_slug", FEEDS)
+def test_list_cursor_walk_matches_page_numbers(client, type_slug):
+    keys = walk_list(client, type_slug)
+    assert keys == walk_pages(client, type_slug) == feed_order(type_slug)
+
+
+@pytest.mark.parametrize("type_slug", FEEDS)
+def test_list_cursor_walk_from_storage(cold_server, type_slug):
+    # Khi snapshot chưa sẵn sàng, cursor được đẩy xuống kho dữ liệu nhưng thứ tự giữ nguyên
+    keys = walk_list(cold_server.app.test_client(), type_slug)
+    assert keys == feed_order(type_slug)
+
+
+def test_list_rejects_invalid_cursor(client):
+    response = client.get("/v1/api/danh-sach/truyen-moi?cursor=khong-hop-le")
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
+
+
+def test_unknown_list_is_empty(client):
+    assert list_keys(client, "khong-co") == ([], None)
+
+
+def test_list_follows_catalog_changes(client, server):
+    total = client.get("/v1/api/danh-sach/truyen-moi").get_json()["data"]["params"]["pagination"]["totalItems"]
+    server.CATALOG.apply_event("put", "/comic_moi-nhat", {
+        "_id": "comic_moi-nhat", "slug": "moi-nhat", "name": "Mới Nhất", "itemType": "comic",
+        "status": "ongoing", "updatedAt": "2099-01-01T00:00:00Z",
+    })
+    try:
+        data = client.get("/v1/api/danh-sach/truyen-moi").get_json()["data"]
+        assert data["items"][0]["_id"] == "comic_moi-nhat"
+        assert data["params"]["pagination"]["totalItems"] == total + 1
+        assert list_keys(client, "dang-phat-hanh")[0][0] == "comic_moi-nhat"
+    finally:
+        server.CATALOG.apply_event("put", "/comic_moi-nhat", None)
+    assert list_keys(client, "truyen-moi")[0][0] != "comic_moi-nhat"
+
+
+@pytest.mark.parametrize("url", [
+    "/v1/api/danh-sach/truyen-moi",
+    "/v1/api/the-loai",
+    "/v1/api/the-loai/kiem-hiep",
+    "/v1/api/tim-kiem?keyword=kiem",
+    "/v1/api/truyen-tranh/sach-thu",
+    "/v1/api/truyen-chu/sach-thu",
+    "/v1/api/truyen-chu/sach-thu/muc-luc",
+    "/v1/api/truyen-chu/sach-thu/chuong/1",
+])
+def test_routes_answer_304_for_current_etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.last_modified is not None
+
+    revalidated = client.get(url, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert revalidated.headers["ETag"] == etag
+    assert client.get(url, headers={"If-Modified-Since": response.headers["Last-Modified"]}).status_code == 304
+
+
+def test_item_etag_changes_only_when_the_item_changes(client, server):
+    detail, other = "/v1/api/truyen-chu/sach-thu/chuong/1", "/v1/api/truyen-tranh/comic_001"
+    etags = {url: client.get(url).headers["ETag"] for url in (detail, other)}
+    list_etag = client.get("/v1/api/danh-sach/ebook-moi").headers["ETag"]
+
+    server.CATALOG.apply_event("patch", "/ebook_sach-thu", {"views": 43})
+    try:
+        assert client.get(detail, headers={"If-None-Match": etags[detail]}).status_code == 200
+        assert client.get(other, headers={"If-None-Match": etags[other]}).status_code == 304
+        assert client.get("/v1/api/danh-sach/ebook-moi", headers={"If-None-Match": list_etag}).status_code == 200
+    finally:
+        server.CATALOG.apply_event("patch", "/ebook_sach-thu", {"views": 42})
+
+
+def test_not_found_and_bad_requests_have_no_etag(client):
+    for url in ("/v1/api/truyen-tranh/khong-co", "/v1/api/truyen-chu/sach-thu/chuong/99",
+                "/v1/api/danh-sach/truyen-moi?cursor=khong-hop-le"):
+        response = client.get(url)
+        assert response.status_code in (400, 404), url
+        assert "ETag" not in response.headers, url
+
+
+def test_cold_catalog_skips_validators(cold_server):
+    response = cold_server.app.test_client().get("/v1/api/danh-sach/truyen-moi")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+
+def test_lists_return_cards_by_default(client):
+    for url in ("/v1/api/danh-sach/truyen-moi", "/v1/api/the-loai/tien-hiep", "/v1/api/tim-kiem?keyword=co"):
+        items = client.get(url).get_json()["data"]["items"]
+        assert items, url
+        assert all(set(item) <= set(CARD_FIELDS) for item in items), url
+    card = next(item for item in client.get("/v1/api/the-loai/tien-hiep").get_json()["data"]["items"]
+                if item["_id"] == "comic_co-chuong")
+    assert "chapters" not in card
+    assert card["totalChapters"] == 3
+    assert card["chaptersLatest"] == [{"chapter_name": "3"}]
+
+
+def test_cards_carry_author_and_views(client):
+    # Màn hình chi tiết của app (story_detail_page.dart) hiển thị tác giả và lượt xem từ thẻ
+    card = next(item for item in client.get("/v1/api/danh-sach/ebook-moi").get_json()["data"]["items"]
+                if item["_id"] == "ebook_sach-thu")
+    assert card["author"] == ["Tác Giả"]
+    assert card["views"] == 42
+
+
+def test_fields_parameter_selects_fields(client):
+    items = client.get("/v1/api/danh-sach/truyen-moi?fields=name,slug").get_json()["data"]["items"]
+    assert all(set(item) == {"name", "slug"} for item in items)
+
+    full = client.get("/v1/api/danh-sach/truyen-moi?fields=*").get_json()["data"]["items"]
+    assert any("createdAt" in item for item in full)
+    assert next(item for item in full if item["_id"] == "comic_co-chuong")["chapters"]
+
+    item = client.get("/v1/api/truyen-tranh/co-chuong?fields=name,totalChapters").get_json()["data"]["item"]
+    assert item == {"name": "Có Chương", "totalChapters": 3}
+    assert "chapters" in client.get("/v1/api/truyen-tranh/co-chuong").get_json()["data"]["item"]
+
+
+def test_parse_fields(server):
+    assert server.parse_fields(None, ("a",)) == ("a",)
+    assert server.parse_fields(" name , slug,,") == ("name", "slug")
+    for raw in ("", "*", "all", "full", " , "):
+        assert server.parse_fields(raw, ("a",)) is None
+
+
+def test_precomputed_cards_match_formatting(server):
+    with server.app.test_request_context():
+        for key, data in server.CATALOG.items():
+            assert server.CARD_INDEX.get(key).to_dict() == server.format_item_card((key, data)), key
+
+
+def test_text_story_without_epub_is_not_cached(client, server):
+    response = client.get("/v1/api/truyen-chu/khong-file")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+    hits = server.RESPONSE_CACHE.stats()["hits"]
+    first = client.get("/v1/api/truyen-chu/sach-thu")
+    assert "ETag" in first.headers
+    assert client.get("/v1/api/truyen-chu/sach-thu").data == first.data
+    assert server.RESPONSE_CACHE.stats()["hits"] > hits
+
+
+def test_home_serves_newest_created_items(client, server):
+    server.HOME_FEED.refresh()
+    data = client.get("/v1/api/home").get_json()["data"]
+    newest = sorted(server_items().items(), key=lambda entry: (entry[1]["createdAt"], entry[0]), reverse=True)
+    assert [item["_id"] for item in data["items"]] == [key for key, _ in newest][:len(data["items"])]
+    assert data["params"]["pagination"]["totalItems"] == min(len(newest), server.HOME_FEED.window)
+    assert all(set(item) <= set(CARD_FIELDS) for item in data["items"])
+    assert client.get("/v1/api/home?page=999").get_json()["data"]["items"] == []
+
+
+BATCH_URL = "/v1/api/truyen-tranh/batch"
+
+
+def batch_ids(response):
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+    return [item["_id"] for item in data["items"]], data["notFound"]
+
+
+def test_batch_keeps_request_order(client):
+    response = client.get(f"{BATCH_URL}?ids=sach-thu,khong-co,comic_002,co-chuong,sach-thu")
+    assert batch_ids(response) == (["ebook_sach-thu", "comic_002", "comic_co-chuong"], ["khong-co"])
+
+    response = client.post(BATCH_URL, json={"ids": ["co-chuong", 1, "ebook_sach-thu"], "fields": ["_id", "name"]})
+    assert batch_ids(response) == (["comic_co-chuong", "ebook_sach-thu"], ["1"])
+    assert response.get_json()["data"]["items"][0] == {"_id": "comic_co-chuong", "name": "Có Chương"}
+
+
+def test_batch_dedupes_ids_resolving_to_the_same_item(client):
+    response = client.get(f"{BATCH_URL}?ids=001,comic_001,sach-thu,khong-co,ebook_sach-thu,khong-co")
+    assert batch_ids(response) == (["comic_001", "ebook_sach-thu"], ["khong-co"])
+    response = client.post(BATCH_URL, json={"ids": ["co-chuong", "comic_co-chuong"]})
+    assert batch_ids(response) == (["comic_co-chuong"], [])
+
+
+def test_batch_items_match_detail_route(client):
+    items = client.get(f"{BATCH_URL}?ids=co-chuong&fields=*").get_json()["data"]["items"]
+    assert items == [client.get("/v1/api/truyen-tranh/co-chuong").get_json()["data"]["item"]]
+
+
+def test_batch_from_storage(cold_server):
+    response = cold_server.app.test_client().get(f"{BATCH_URL}?ids=co-chuong,khong-co,sach-thu")
+    assert batch_ids(response) == (["comic_co-chuong", "ebook_sach-thu"], ["khong-co"])
+
+
+def test_batch_rejects_bad_requests(client, server, monkeypatch):
+    for response in (client.get(BATCH_URL), client.get(f"{BATCH_URL}?ids=,, "),
+                     client.post(BATCH_URL, json={"ids": "sach-thu"}), client.post(BATCH_URL, data="x")):
+        assert response.status_code == 400
+    monkeypatch.setattr(server.config, "BATCH_MAX_IDS", 2)
+    assert client.get(f"{BATCH_URL}?ids=a,b,c").status_code == 400
+    assert client.get(f"{BATCH_URL}?ids=a,b,a").status_code == 200
@@ -0,0 +1,236 @@
+import asyncio
+import gzip
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+from blocking_calls import BlockingExecutor, call_blocking
+from catalog import CatalogSnapshot, KeyResolver
+from conftest import SERVER_BOOK_CHAPTERS
+
+
+class AsgiResponse:
+    def __init__(self, messages):
+        start = messages[0]
+        assert start["type"] == "http.response.start"
+        self.status = start["status"]
+        self.headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in start["headers"]}
+        self.chunks = [message["body"] for message in messages[1:]]
+        assert messages[-1].get("more_body", False) is False
+        self.body = b"".join(self.chunks)
+
+    def json(self):
+        return json.loads(self.body)
+
+
+async def call_asgi(app, url, method="GET", headers=(), body=b""):
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+        "method": method, "path": path, "raw_path": path.encode("ascii"), "root_path": "",
+        "query_string": query.encode("ascii"),
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+    }
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+    messages = []
+
+    async def receive():
+        return requests.pop(0) if requests else {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return AsgiResponse(messages)
+
+
+def request(app, url, **kwargs):
+    return asyncio.run(call_asgi(app, url, **kwargs))
+
+
+@pytest.fixture
+def pools():
+    pools = {"storage": ThreadPoolExecutor(max_workers=4), "epub": ThreadPoolExecutor(max_workers=2)}
+    yield pools
+    for pool in pools.values():
+        pool.shutdown()
+
+
+@pytest.fixture
+def asgi(server, pools):
+    from asgi_app import AsgiApp
+
+    return AsgiApp(server.app, pools)
+
+
+def go_cold(server, monkeypatch, fetch=None):
+    """Catalog chưa sẵn sàng: các route đọc kho dữ liệu qua call_blocking, như khi server vừa khởi động."""
+    catalog = CatalogSnapshot()
+    monkeypatch.setattr(server, "CATALOG", catalog)
+    monkeypatch.setattr(server, "KEY_RESOLVER", KeyResolver(
+        catalog, partial(call_blocking, "storage", fetch or server.REPOSITORY.get),
+        executor=BlockingExecutor("storage")
+    ))
+
+
+PARITY_URLS = [
+    "/",
+    "/v1/api/danh-sach/truyen-moi",
+    "/v1/api/danh-sach/hoan-thanh?cursor=",
+    "/v1/api/the-loai",
+    "/v1/api/the-loai/kiem-hiep?page=2",
+    "/v1/api/tim-kiem?keyword=kiem",
+    "/v1/api/truyen-tranh/co-chuong",
+    "/v1/api/truyen-tranh/batch?ids=co-chuong,khong-co,sach-thu",
+    "/v1/api/truyen-chu/sach-thu",
+    "/v1/api/truyen-chu/sach-thu/muc-luc",
+    "/v1/api/truyen-chu/sach-thu/chuong/2",
+    "/v1/api/truyen-chu/sach-thu/chuong/99",
+    "/v1/api/truyen-tranh/khong-co",
+    "/khong-co-route",
+]
+
+
+def assert_same_response(asgi, client, url, **kwargs):
+    expected = client.open(url, **kwargs)
+    response = request(asgi, url, **kwargs)
+    assert response.status == expected.status_code, url
+    assert response.body == expected.get_data(), url
+    assert response.headers.get("etag") == expected.headers.get("ETag"), url
+    return response
+
+
+@pytest.mark.parametrize("url", PARITY_URLS)
+def test_routes_match_wsgi(asgi, client, url):
+    assert_same_response(asgi, client, url)
+
+
+@pytest.mark.parametrize("url", PARITY_URLS)
+def test_routes_match_wsgi_from_storage(asgi, server, monkeypatch, url):
+    go_cold(server, monkeypatch)
+    assert_same_response(asgi, server.app.test_client(), url)
+
+
+def test_post_and_conditional_requests(asgi, client):
+    body = json.dumps({"ids": ["co-chuong", "comic_001"], "fields": "name"}).encode("utf-8")
+    headers = [("Content-Type", "application/json")]
+    response = request(asgi, "/v1/api/truyen-tranh/batch", method="POST", headers=headers, body=body)
+    assert response.status == 200
+    assert [item["name"] for item in response.json()["data"]["items"]] == [
+        "Có Chương", client.get("/v1/api/truyen-tranh/comic_001").get_json()["data"]["item"]["name"]
+    ]
+
+    etag = request(asgi, "/v1/api/truyen-chu/sach-thu/chuong/1").headers["etag"]
+    response = request(asgi, "/v1/api/truyen-chu/sach-thu/chuong/1", headers=[("If-None-Match", etag)])
+    assert (response.status, response.body, response.headers["etag"]) == (304, b"", etag)
+    head = request(asgi, "/v1/api/truyen-tranh/co-chuong", method="HEAD")
+    assert (head.status, head.body) == (200, b"")
+
+
+@pytest.mark.parametrize("cold", [False, True])
+def test_chapter_range_is_streamed(asgi, server, monkeypatch, cold):
+    if cold:
+        go_cold(server, monkeypatch)
+    url = "/v1/api/truyen-chu/sach-thu/chuong?html=0"
+    expected = server.app.test_client().get(url).get_data()
+    response = request(asgi, url)
+    assert response.status == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.body == expected
+    # Mỗi dòng (story, các chương, end) là một phần riêng của body
+    assert len([chunk for chunk in response.chunks if chunk]) == SERVER_BOOK_CHAPTERS + 2
+
+    compressed = request(asgi, url, headers=[("Accept-Encoding", "gzip")])
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(compressed.body) == expected
+
+
+def test_media_file_is_streamed(asgi, server):
+    epub_path = server.MEDIA_ROOT_DIR / server.config.EBOOKS_URL_SUBPATH / "sach-thu" / "book.epub"
+    response = request(asgi, f"/{server.config.EBOOKS_URL_SUBPATH}/sach-thu/book.epub")
+    assert response.status == 200
+    assert response.body == epub_path.read_bytes()
+
+
+def test_key_probes_run_concurrently(asgi, server, monkeypatch):
+    # Ba key ứng viên của slug phải được đọc cùng lúc, nếu không barrier hết hạn và lời gọi lỗi
+    barrier = threading.Barrier(3, timeout=5)
+
+    def get(key):
+        barrier.wait()
+        return server.REPOSITORY.get(key)
+
+    go_cold(server, monkeypatch, fetch=get)
+    response = request(asgi, "/v1/api/truyen-tranh/co-chuong")
+    assert response.status == 200
+    assert response.json()["data"]["item"]["_id"] == "comic_co-chuong"
+    assert server.KEY_RESOLVER.stats()["fetches"] == 3
+
+
+def test_slow_storage_holds_no_request_thread(asgi, server, pools, monkeypatch):
+    release = threading.Event()
+    lock = threading.Lock()
+    in_flight = []
+    max_in_flight = []
+
+    def get(key):
+        with lock:
+            in_flight.append(key)
+            max_in_flight.append(len(in_flight))
+        try:
+            release.wait(5)
+            return server.REPOSITORY.get(key)
+        finally:
+            with lock:
+                in_flight.remove(key)
+
+    go_cold(server, monkeypatch, fetch=get)
+    slugs = ["co-chuong", "001", "002", "khong-co", "sach-thu", "003"]
+
+    async def scenario():
+        slow = [asyncio.create_task(call_asgi(asgi, f"/v1/api/truyen-tranh/{slug}")) for slug in slugs]
+        try:
+            while len(in_flight) < 4:
+                await asyncio.sleep(0.01)
+            # Pool storage đã đầy (4 lời gọi đang chờ, các lời gọi khác xếp hàng) nhưng event loop vẫn rảnh
+            fast = await asyncio.wait_for(call_asgi(asgi, "/"), timeout=5)
+            assert fast.status == 200
+            assert not any(task.done() for task in slow)
+        finally:
+            release.set()
+        return await asyncio.gather(*slow)
+
+    responses = asyncio.run(scenario())
+    assert [response.status for response in responses] == [200, 200, 200, 404, 200, 200]
+    assert max(max_in_flight) == 4
+
+
+def test_lifespan_runs_shutdown(server, pools):
+    from asgi_app import AsgiApp
+
+    stopped = []
+    app = AsgiApp(server.app, pools, on_shutdown=lambda: stopped.append(True))
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert stopped == [True]
+
+
+def test_module_app_uses_configured_pools(server):
+    import asgi_app
+
+    assert asgi_app.app.flask_app is server.app
+    assert asgi_app.POOLS["storage"]._max_workers == server.config.ASGI_STORAGE_WORKERS
+    assert asgi_app.POOLS["epub"]._max_workers == server.config.ASGI_EPUB_WORKERS
@@ -0,0 +1,77 @@
+import pytest
+
+from blocking_calls import BlockingExecutor, PendingCalls, call_blocking, map_blocking, rendering
+
+
+def double(value):
+    return value * 2
+
+
+def fail(value):
+    raise ValueError(value)
+
+
+def results_for(calls):
+    return {call.key: call.run() for call in calls}
+
+
+def test_calls_run_directly_outside_rendering():
+    assert call_blocking("storage", double, 2) == 4
+    assert list(map_blocking("storage", double, [1, 2])) == [2, 4]
+    assert list(BlockingExecutor("storage").map(double, [3])) == [6]
+
+
+def test_rendering_reports_pending_calls_then_uses_their_results():
+    results = {}
+    with rendering(results):
+        with pytest.raises(PendingCalls) as pending:
+            try:
+                call_blocking("epub", double, 2)
+            except Exception:  # Handler bắt Exception không được nuốt PendingCalls
+                pytest.fail("PendingCalls bị bắt bởi except Exception")
+        [call] = pending.value.calls
+        assert (call.kind, call.func, call.args) == ("epub", double, (2,))
+
+        results.update(results_for(pending.value.calls))
+        assert call_blocking("epub", double, 2) == 4
+    # Ngoài rendering(), lời gọi lại chạy trực tiếp
+    with pytest.raises(ValueError):
+        call_blocking("epub", fail, 1)
+
+
+def test_map_blocking_reports_every_missing_call_at_once():
+    results = {}
+    with rendering(results):
+        with pytest.raises(PendingCalls) as pending:
+            map_blocking("storage", double, [1, 2, 3])
+        assert [call.args for call in pending.value.calls] == [(1,), (2,), (3,)]
+        results.update(results_for(pending.value.calls))
+        assert list(map_blocking("storage", double, [1, 2, 3])) == [2, 4, 6]
+
+        with pytest.raises(PendingCalls) as pending:
+            BlockingExecutor("storage").map(double, [3, 4])
+        assert [call.args for call in pending.value.calls] == [(4,)]
+
+
+def test_errors_are_raised_in_the_handler():
+    results = {}
+    with rendering(results):
+        with pytest.raises(PendingCalls) as pending:
+            call_blocking("storage", fail, "hỏng")
+        results.update(results_for(pending.value.calls))
+        with pytest.raises(ValueError, match="hỏng"):
+            call_blocking("storage", fail, "hỏng")
+
+
+def test_keyword_arguments_are_part_of_the_key():
+    def scaled(value, factor=1):
+        return value * factor
+
+    results = {}
+    with rendering(results):
+        with pytest.raises(PendingCalls) as pending:
+            call_blocking("storage", scaled, 2, factor=3)
+        results.update(results_for(pending.value.calls))
+        assert call_blocking("storage", scaled, 2, factor=3) == 6
+        with pytest.raises(PendingCalls):
+            call_blocking("storage", scaled, 2, factor=4)
@@ -0,0 +1,305 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from catalog import (
+    CARD_FIELDS, CardIndex, CatalogSnapshot, CategoryIndex, FeedIndex, KeyResolver, event_changes, items_from_root,
+)
+from conftest import CATEGORIES, EVENT_SEEDS, FEEDS, replay_random_events
+
+
+class RecordingIndex:
+    """Chỉ mục ghi lại các lần rebuild/update mà catalog gọi."""
+
+    def __init__(self):
+        self.items = None
+        self.updates = []
+
+    def rebuild(self, items):
+        self.items = dict(items)
+
+    def update(self, key, old, new):
+        self.updates.append((key, old, new))
+
+
+def test_root_put_loads_items_and_marks_ready(items):
+    catalog = CatalogSnapshot()
+    assert not catalog.ready
+    catalog.apply_event("put", "/", {**items, "broken": "không phải item"})
+    assert catalog.ready
+    assert catalog.as_dict() == items
+    assert len(catalog) == len(items)
+
+
+def test_root_put_accepts_rtdb_lists():
+    assert items_from_root([None, {"name": "A"}, "x"]) == {"1": {"name": "A"}}
+    assert items_from_root(None) == {}
+
+
+def test_put_patch_delete_events():
+    catalog = CatalogSnapshot()
+    catalog.apply_event("put", "/", {"a": {"name": "A", "status": "ongoing"}})
+    version = catalog.version
+
+    catalog.apply_event("patch", "/a", {"status": "completed", "updatedAt": "2024-01-01"})
+    assert catalog.get("a") == {"name": "A", "status": "completed", "updatedAt": "2024-01-01"}
+
+    catalog.apply_event("put", "/a/name", "A2")
+    assert catalog.get("a")["name"] == "A2"
+
+    catalog.apply_event("put", "/b", {"name": "B"})
+    catalog.apply_event("patch", "/", {"c": {"name": "C"}, "b": None})
+    assert catalog.get("b") is None
+    assert catalog.get("c") == {"name": "C"}
+
+    catalog.apply_event("put", "/a", None)
+    assert catalog.get("a") is None
+    assert sorted(catalog.as_dict()) == ["c"]
+    assert catalog.version > version
+
+
+def test_nested_list_paths():
+    # Firebase trả về list cho các node có key là số liên tiếp (chapters, server_data, ...)
+    current = {"a": {"chapters": [{"name": "1"}, {"name": "2"}]}}
+    changes = event_changes("put", "/a/chapters/1/name", "2b", current.get)
+    assert changes == {"a": {"chapters": [{"name": "1"}, {"name": "2b"}]}}
+    changes = event_changes("put", "/a/chapters/2", {"name": "3"}, current.get)
+    assert changes["a"]["chapters"][2] == {"name": "3"}
+    assert current["a"]["chapters"] == [{"name": "1"}, {"name": "2"}]
+
+
+def test_items_are_copied_on_write():
+    catalog = CatalogSnapshot()
+    catalog.apply_event("put", "/", {"a": {"name": "A"}})
+    before = catalog.get("a")
+    catalog.apply_event("patch", "/a", {"name": "B"})
+    assert before == {"name": "A"}
+    assert catalog.get("a") == {"name": "B"}
+
+
+def test_item_stamp_changes_only_for_changed_items(items):
+    catalog = CatalogSnapshot()
+    catalog.apply_event("put", "/", items)
+    first, second = sorted(items)[:2]
+    stamp_first, stamp_second = catalog.item_stamp(first), catalog.item_stamp(second)
+
+    catalog.apply_event("patch", f"/{first}", {"status": "completed"})
+    assert catalog.item_stamp(first) != stamp_first
+    assert catalog.item_stamp(second) == stamp_second
+
+
+def test_indexes_receive_rebuild_and_updates():
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(RecordingIndex())
+    catalog.apply_event("put", "/", {"a": {"name": "A"}})
+    assert index.items == {"a": {"name": "A"}}
+
+    catalog.apply_event("patch", "/a", {"name": "B"})
+    catalog.apply_event("put", "/a", None)
+    assert index.updates == [("a", {"name": "A"}, {"name": "B"}), ("a", {"name": "B"}, None)]
+
+    # Đăng ký sau khi snapshot đã sẵn sàng: được dựng ngay từ dữ liệu hiện có
+    late = catalog.register_index(RecordingIndex())
+    assert late.items == {}
+
+
+@pytest.mark.parametrize("seed", EVENT_SEEDS)
+def test_random_events_match_rtdb_model(items, seed):
+    catalog = CatalogSnapshot()
+    model, _ = replay_random_events(catalog, items, seed)
+    assert catalog.as_dict() == model
+
+
+@pytest.mark.parametrize("seed", EVENT_SEEDS)
+def test_category_index_updates_match_rebuild(items, seed):
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(CategoryIndex())
+    model, _ = replay_random_events(catalog, items, seed)
+
+    rebuilt = CategoryIndex()
+    rebuilt.rebuild(model)
+    for cat in CATEGORIES:
+        slug = cat["slug"]
+        assert index.count(slug) == rebuilt.count(slug)
+        assert index.page(slug, 0, 1000) == rebuilt.page(slug, 0, 1000)
+
+
+def test_category_pages_are_newest_first_with_key_desc_ties():
+    index = CategoryIndex()
+    cat = [CATEGORIES[0]]
+    index.rebuild({
+        "a": {"updatedAt": "2024-01-02", "category": cat},
+        "b": {"updatedAt": "2024-01-01", "category": cat},
+        "c": {"updatedAt": "2024-01-02", "category": cat},
+        "d": {"category": cat},
+    })
+    assert index.page("kiem-hiep", 0, 10) == ["c", "a", "b", "d"]
+    assert index.page("kiem-hiep", 1, 2) == ["a", "b"]
+    assert index.page("khong-co", 0, 10) == []
+
+
+def test_category_index_follows_recategorised_items():
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(CategoryIndex())
+    catalog.apply_event("put", "/", {"a": {"updatedAt": "1", "category": [CATEGORIES[0]]}})
+    catalog.apply_event("put", "/a/category", [CATEGORIES[1]])
+    assert index.count("kiem-hiep") == 0
+    assert index.page("tien-hiep", 0, 10) == ["a"]
+    catalog.apply_event("put", "/a", None)
+    assert index.count("tien-hiep") == 0
+
+
+def by_slug(table):
+    return sorted(table, key=lambda row: row["slug"])
+
+
+@pytest.mark.parametrize("seed", EVENT_SEEDS)
+def test_category_table_updates_match_rebuild(items, seed):
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(CategoryIndex())
+    model, _ = replay_random_events(catalog, items, seed)
+
+    rebuilt = CategoryIndex()
+    rebuilt.rebuild(model)
+    assert by_slug(index.table()) == by_slug(rebuilt.table())
+
+
+def test_category_table_counts_by_item_type():
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(CategoryIndex())
+    cat = CATEGORIES[0]
+    catalog.apply_event("put", "/", {
+        "comic_a": {"itemType": "comic", "category": [cat]},
+        "ebook_b": {"itemType": "ebook", "category": [cat, CATEGORIES[1]]},
+    })
+    version = index.version
+    assert by_slug(index.table()) == [
+        {"_id": "c1", "slug": "kiem-hiep", "name": "Kiếm Hiệp", "totalItems": 2,
+         "itemCounts": {"comic": 1, "ebook": 1}},
+        {"_id": "c2", "slug": "tien-hiep", "name": "Tiên Hiệp", "totalItems": 1,
+         "itemCounts": {"ebook": 1}},
+    ]
+
+    # Đổi trường không liên quan: bảng (và version) giữ nguyên
+    catalog.apply_event("put", "/comic_a/name", "A")
+    assert index.version == version
+
+    catalog.apply_event("put", "/ebook_b", None)
+    assert index.version > version
+    assert [row["slug"] for row in index.table()] == ["kiem-hiep"]
+    assert index.table()[0]["itemCounts"] == {"comic": 1}
+
+
+
+@pytest.mark.parametrize("seed", EVENT_SEEDS)
+def test_feed_index_updates_match_rebuild(items, seed):
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(FeedIndex(FEEDS))
+    model, _ = replay_random_events(catalog, items, seed)
+
+    rebuilt = FeedIndex(FEEDS)
+    rebuilt.rebuild(model)
+    for name in FEEDS:
+        assert index.count(name) == rebuilt.count(name)
+        assert index.page(name, 0, 1000) == rebuilt.page(name, 0, 1000)
+
+
+def test_feed_index_registered_after_ready_is_built(items):
+    catalog = CatalogSnapshot()
+    catalog.apply_event("put", "/", items)
+    feeds = catalog.register_index(FeedIndex(FEEDS))
+    expected = sum(1 for data in items.values() if data["itemType"] == "ebook")
+    assert feeds.count("ebook-moi") == expected
+
+
+def test_feed_membership_follows_status_changes():
+    catalog = CatalogSnapshot()
+    feeds = catalog.register_index(FeedIndex(FEEDS))
+    catalog.apply_event("put", "/", {"a": {"status": "ongoing", "updatedAt": "1"}, "b": {"status": "ongoing", "updatedAt": "2"}})
+    assert feeds.page("dang-phat-hanh", 0, 10) == ["b", "a"]
+    catalog.apply_event("patch", "/a", {"status": "completed", "updatedAt": "3"})
+    assert feeds.page("dang-phat-hanh", 0, 10) == ["b"]
+    assert feeds.page("hoan-thanh", 0, 10) == ["a"]
+    assert "khong-co" not in feeds
+
+
+def make_card(key, data):
+    if data.get("itemType") not in ("comic", "ebook"):
+        return None
+    return {"_id": key, "name": data.get("name"), "updatedAt": data.get("updatedAt"), "extra": 1}
+
+
+@pytest.mark.parametrize("seed", EVENT_SEEDS)
+def test_card_index_updates_match_rebuild(items, seed):
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(CardIndex(make_card))
+    model, keys = replay_random_events(catalog, items, seed)
+
+    rebuilt = CardIndex(make_card)
+    rebuilt.rebuild(model)
+    assert len(index) == len(rebuilt)
+    for key in keys:
+        card, expected = index.get(key), rebuilt.get(key)
+        assert (card and card.to_dict()) == (expected and expected.to_dict()), key
+
+
+def test_card_keeps_only_card_fields():
+    index = CardIndex(make_card)
+    index.rebuild({"a": {"itemType": "comic", "name": "A"}, "b": {"name": "không có itemType"}})
+    card = index.get("a")
+    assert card.to_dict() == {"_id": "a", "name": "A", "updatedAt": None}
+    assert card.to_dict(("name", "thumb_url")) == {"name": "A"}
+    assert card.covers(("name", "views")) and not card.covers(("name", "extra"))
+    assert set(card.to_dict()) <= set(CARD_FIELDS)
+    assert index.get("b") is None
+
+class TestKeyResolver:
+    def make(self, data, executor=None, negative_ttl=30):
+        catalog = CatalogSnapshot()
+        fetched = []
+
+        def fetch(key):
+            fetched.append(key)
+            return data.get(key)
+
+        resolver = catalog.register_index(KeyResolver(catalog, fetch, negative_ttl=negative_ttl, executor=executor))
+        return catalog, resolver, fetched
+
+    def test_reads_snapshot_when_ready(self):
+        catalog, resolver, fetched = self.make({})
+        catalog.apply_event("put", "/", {"ebook_sach": {"name": "Sách"}})
+        assert resolver.resolve("sach", ("comic_", "ebook_")) == ("ebook_sach", {"name": "Sách"})
+        assert resolver.resolve("ebook_sach") == ("ebook_sach", {"name": "Sách"})
+        assert resolver.resolve("khong-co", ("comic_",)) == (None, None)
+        assert fetched == []
+
+    def test_fetches_candidates_and_remembers_the_key(self):
+        _, resolver, fetched = self.make({"ebook_sach": {"name": "Sách"}})
+        assert resolver.resolve("sach", ("comic_", "ebook_"))[0] == "ebook_sach"
+        assert fetched == ["sach", "comic_sach", "ebook_sach"]
+
+        fetched.clear()
+        assert resolver.resolve("sach", ("comic_", "ebook_"))[0] == "ebook_sach"
+        assert fetched == ["ebook_sach"]
+
+    def test_missing_keys_are_cached(self):
+        _, resolver, fetched = self.make({})
+        assert resolver.resolve("khong-co", ("comic_",)) == (None, None)
+        fetched.clear()
+        assert resolver.resolve("khong-co", ("comic_",)) == (None, None)
+        assert fetched == []
+        assert resolver.stats()["negativeHits"] == 2
+
+    def test_missing_keys_expire(self):
+        data = {}
+        _, resolver, fetched = self.make(data, negative_ttl=0)
+        assert resolver.resolve("moi", ("comic_",)) == (None, None)
+        data["comic_moi"] = {"name": "Mới"}
+        assert resolver.resolve("moi", ("comic_",)) == ("comic_moi", {"name": "Mới"})
+        assert fetched == ["moi", "comic_moi", "moi", "comic_moi"]
+
+    def test_probes_concurrently_with_executor(self):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            _, resolver, fetched = self.make({"comic_truyen": {"name": "Truyện"}}, executor=executor)
+            assert resolver.resolve("truyen", ("comic_", "ebook_")) == ("comic_truyen", {"name": "Truyện"})
+        assert sorted(fetched) == ["comic_truyen", "ebook_truyen", "truyen"]
@@ -0,0 +1,80 @@
+import pytest
+
+from chapter_text_cache import ChapterTextCache, fingerprint_token
+from epub_cache import file_fingerprint
+
+CHAPTER = {"title": "Chương 1", "content": "Đoạn một.\n\nĐoạn hai."}
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / "book.epub"
+    path.write_bytes(b"epub")
+    return path
+
+
+def test_memory_and_disk_tiers(book):
+    fingerprint = file_fingerprint(book)
+    cache = ChapterTextCache()
+    assert cache.get(fingerprint, "chap_1.xhtml") is None
+    assert not cache.is_on_disk(fingerprint, "chap_1.xhtml")
+
+    cache.put(fingerprint, "chap_1.xhtml", CHAPTER)
+    assert cache.get(fingerprint, "chap_1.xhtml") == CHAPTER
+    assert cache.is_on_disk(fingerprint, "chap_1.xhtml")
+    version_dir = ChapterTextCache.book_cache_dir(book) / fingerprint_token(fingerprint)
+    assert len(list(version_dir.glob("*.json.gz"))) == 1
+
+    # Cache mới (ví dụ sau khi khởi động lại server) đọc từ đĩa rồi giữ trong bộ nhớ
+    restarted = ChapterTextCache()
+    assert restarted.get(fingerprint, "chap_1.xhtml") == CHAPTER
+    assert restarted.get(fingerprint, "chap_1.xhtml") == CHAPTER
+    assert restarted.get(fingerprint, "chap_2.xhtml") is None
+    stats = restarted.stats()
+    assert (stats["diskHits"], stats["memoryHits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_memory_only_cache_writes_nothing(book):
+    fingerprint = file_fingerprint(book)
+    cache = ChapterTextCache(on_disk=False)
+    cache.put(fingerprint, "chap_1.xhtml", CHAPTER)
+    assert cache.get(fingerprint, "chap_1.xhtml") == CHAPTER
+    assert not ChapterTextCache.book_cache_dir(book).exists()
+    assert not cache.is_on_disk(fingerprint, "chap_1.xhtml")
+
+
+def test_memory_tier_is_bounded_lru(book):
+    fingerprint = file_fingerprint(book)
+    value = {"title": "", "content": "x" * 100}
+    cache = ChapterTextCache(max_memory_bytes=250, on_disk=False)
+    for href in ("a", "b", "c"):
+        cache.put(fingerprint, href, value)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["memoryBytes"] <= 250
+    assert cache.get(fingerprint, "a") is None
+    assert cache.get(fingerprint, "c") == value
+
+    # Entry lớn hơn cả giới hạn không được giữ trong bộ nhớ
+    cache.put(fingerprint, "d", {"title": "", "content": "x" * 1000})
+    assert cache.get(fingerprint, "d") is None
+
+
+def test_old_versions_are_dropped_when_epub_changes(book):
+    cache = ChapterTextCache()
+    old = file_fingerprint(book)
+    cache.put(old, "chap_1.xhtml", CHAPTER)
+
+    new = (old[0], old[1] + 1, old[2] + 1)
+    cache.put(new, "chap_1.xhtml", {"title": "Mới", "content": ""})
+    versions = [p.name for p in ChapterTextCache.book_cache_dir(book).iterdir()]
+    assert versions == [fingerprint_token(new)]
+    assert ChapterTextCache().get(old, "chap_1.xhtml") is None
+    assert ChapterTextCache().get(new, "chap_1.xhtml") == {"title": "Mới", "content": ""}
+
+
+def test_corrupt_disk_entry_is_a_miss(book):
+    fingerprint = file_fingerprint(book)
+    ChapterTextCache().put(fingerprint, "chap_1.xhtml", CHAPTER)
+    for path in ChapterTextCache.book_cache_dir(book).rglob("*.json.gz"):
+        path.write_bytes(b"khong phai gzip")
+    assert ChapterTextCache().get(fingerprint, "chap_1.xhtml") is None
@@ -0,0 +1,102 @@
+import gzip
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify
+from werkzeug.datastructures import Accept
+
+import compression
+from compression import ResponseCompressor, choose_encoding
+from http_cache import conditional
+
+BIG = {"status": "success", "content": "Đoạn văn dài của chương. " * 200}
+
+
+@pytest.fixture
+def compressor():
+    return ResponseCompressor(min_size=1024)
+
+
+@pytest.fixture
+def client(compressor):
+    app = Flask(__name__)
+    compressor.init_app(app)
+
+    @app.route("/big")
+    def big():
+        return jsonify(BIG)
+
+    @app.route("/small")
+    def small():
+        return jsonify({"status": "success"})
+
+    @app.route("/etag")
+    @conditional(lambda: ((1,), None))
+    def with_etag():
+        return jsonify(BIG)
+
+    @app.route("/stream")
+    def stream():
+        return Response((f'{{"line": {i}}}\n' for i in range(50)), mimetype="application/x-ndjson")
+
+    @app.route("/image")
+    def image():
+        return Response(b"\0" * 4096, mimetype="image/jpeg")
+
+    return app.test_client()
+
+
+def test_large_json_is_gzipped(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.vary
+    assert gzip.decompress(response.data) == client.get("/big").data
+    assert len(response.data) < len(client.get("/big").data)
+
+
+def test_uncompressed_when_small_not_accepted_or_binary(client):
+    for url, headers in [("/small", {"Accept-Encoding": "gzip"}), ("/big", {}),
+                         ("/big", {"Accept-Encoding": "gzip;q=0"}), ("/image", {"Accept-Encoding": "gzip"})]:
+        response = client.get(url, headers=headers)
+        assert "Content-Encoding" not in response.headers, (url, headers)
+    assert "Accept-Encoding" in client.get("/big").vary
+
+
+def test_compressed_payload_is_reused_by_etag(client, compressor):
+    first = client.get("/etag", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/etag", headers={"Accept-Encoding": "gzip"})
+    assert second.data == first.data
+    stats = compressor.stats()
+    assert (stats["compressed"], stats["cacheHits"], stats["cachedPayloads"]) == (1, 1, 1)
+
+
+def test_weak_etag_of_compressed_variant_still_matches(client):
+    etag = client.get("/etag", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    assert etag.startswith("W/")
+    assert client.get("/etag", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_200_and_304_send_the_same_validator(client):
+    compressed = client.get("/etag", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    identity = client.get("/etag").headers["ETag"]
+    not_modified = client.get("/etag", headers={"Accept-Encoding": "gzip", "If-None-Match": compressed})
+    assert not_modified.status_code == 304
+    assert compressed == identity == not_modified.headers["ETag"]
+
+
+def test_stream_is_compressed_chunk_by_chunk(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    lines = zlib.decompress(response.data, 31).decode().splitlines()
+    assert lines == [f'{{"line": {i}}}' for i in range(50)]
+
+
+def test_choose_encoding_prefers_brotli_when_installed(monkeypatch):
+    accept = Accept([("gzip", 1), ("br", 1)])
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding(accept) == "gzip"
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding(accept) == "br"
+    assert choose_encoding(Accept([("br", 0.5), ("gzip", 1)])) == "gzip"
+    assert choose_encoding(Accept([("identity", 1)])) is None
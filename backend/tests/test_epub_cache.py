@@ -0,0 +1,132 @@
+import os
+import threading
+
+import pytest
+
+from epub_cache import ParsedEpubCache
+
+
+class FakeBook:
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.epub"
+        path.write_bytes(name.encode() * 10)
+        paths.append(path)
+    return paths
+
+
+def test_hits_and_reload_when_file_changes(paths):
+    cache = ParsedEpubCache(FakeBook, max_entries=2)
+    first = cache.get(paths[0])
+    assert cache.get(paths[0]) is first
+    assert cache.stats()["hits"] == 1
+
+    paths[0].write_bytes(b"thay doi")
+    os.utime(paths[0], ns=(1, 1))
+    second = cache.get(paths[0])
+    assert second is not first
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_entry_is_evicted(paths):
+    cache = ParsedEpubCache(FakeBook, max_entries=2)
+    a = cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(paths[0]) is a
+    cache.get(paths[1])
+    assert cache.stats()["misses"] == 4
+
+
+def test_memo_is_computed_once(paths):
+    cache = ParsedEpubCache(FakeBook)
+    calls = []
+    entry = cache.get(paths[0])
+    for _ in range(3):
+        assert cache.get(paths[0]).memo("toc", lambda: calls.append(1) or ["toc"]) == ["toc"]
+    assert entry.memo("toc", list) == ["toc"]
+    assert calls == [1]
+
+
+def test_concurrent_misses_load_the_file_once(paths):
+    loads = []
+    gate = threading.Event()
+
+    def loader(path):
+        loads.append(path)
+        gate.wait(1)
+        return FakeBook(path)
+
+    cache = ParsedEpubCache(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(paths[0]))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert all(entry is results[0] for entry in results)
+
+
+def test_replaced_book_is_closed(paths):
+    cache = ParsedEpubCache(FakeBook)
+    first = cache.get(paths[0])
+    paths[0].write_bytes(b"thay doi")
+    os.utime(paths[0], ns=(1, 1))
+    cache.get(paths[0])
+    assert first.book.closed
+
+
+def test_evicted_book_is_closed_after_last_release(paths):
+    cache = ParsedEpubCache(FakeBook, max_entries=1)
+    with cache.borrow(paths[0]) as entry:
+        reader = cache.acquire(paths[0])
+        cache.get(paths[1])
+        assert cache.stats()["evictions"] == 1
+        assert not entry.book.closed
+    assert not entry.book.closed
+    reader.release()
+    assert entry.book.closed
+
+
+def test_unused_book_is_closed_on_eviction_and_clear(paths):
+    cache = ParsedEpubCache(FakeBook, max_entries=2)
+    books = [cache.get(path).book for path in paths]
+    assert books[0].closed
+    assert not books[1].closed and not books[2].closed
+    cache.clear()
+    assert all(book.closed for book in books)
+    assert cache.stats()["entries"] == 0
+
+
+class SizedBook(FakeBook):
+    def memory_estimate(self):
+        return 40
+
+
+def test_byte_budget_uses_book_memory_estimate(paths):
+    cache = ParsedEpubCache(SizedBook, max_entries=10, max_bytes=100)
+    for path in paths:
+        cache.get(path)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["estimatedBytes"] == 80
+
+    # Sách không có memory_estimate() chỉ bị giới hạn theo số entry
+    cache = ParsedEpubCache(FakeBook, max_entries=10, max_bytes=1)
+    for path in paths:
+        cache.get(path)
+    assert cache.stats()["entries"] == 3
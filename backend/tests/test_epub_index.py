@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from conftest import write_epub
+from epub_cache import file_fingerprint
+from epub_index import (
+    ChapterIndexStore, build_and_save, index_path_for, is_content_chapter, load_chapter_index,
+)
+from epub_reader import EpubZipReader
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / "book.epub"
+    write_epub(path, nested=True, missing=True)
+    return path
+
+
+def no_reader(path):
+    raise AssertionError(f"không được mở lại {path}")
+
+
+def test_store_builds_and_saves_sidecar(book):
+    opened = []
+    store = ChapterIndexStore(open_reader=lambda path: opened.append(path) or EpubZipReader(path))
+    index = store.get(book)
+
+    assert opened == [str(book)]
+    assert not index["textStats"]
+    assert index["tocLength"] == 4
+    assert [(c["number"], c["title"], c["order"]) for c in index["chapters"]] == [
+        (1, "Chương 1", 1), (2, "Chương 4", 3), (3, "Chương 5", 4), (4, "Chương thiếu", 5)
+    ]
+    first = index["chapters"][0]
+    assert first["member"] == "OEBPS/text/chap_1.xhtml"
+    assert first["fileSize"] > 0 and first["compressSize"] > 0
+    assert "textLength" not in first and "wordCount" not in first
+    # Href không tìm thấy trong manifest vẫn được ghi lại, không có member
+    assert index["chapters"][-1]["member"] is None
+
+    assert load_chapter_index(book, file_fingerprint(book)) == index
+    assert store.get(book) is index
+
+
+def test_sidecar_is_reused_by_a_new_store(book):
+    index = ChapterIndexStore().get(book)
+    assert ChapterIndexStore(open_reader=no_reader).get(book) == index
+
+
+def test_index_is_rebuilt_when_epub_changes(book):
+    store = ChapterIndexStore()
+    assert len(store.get(book)["chapters"]) == 4
+
+    write_epub(book, chapter_count=2)
+    os.utime(book, ns=(1, 1))
+    index = store.get(book)
+    assert [c["title"] for c in index["chapters"]] == ["Chương 1", "Chương 2"]
+    assert json.loads(index_path_for(book).read_text(encoding="utf-8")) == index
+
+
+def test_cached_only_returns_indexes_in_memory(book):
+    store = ChapterIndexStore()
+    assert store.cached(book) is None
+    assert not index_path_for(book).exists()
+    index = store.get(book)
+    assert store.cached(book) is index
+
+    write_epub(book, chapter_count=2)
+    os.utime(book, ns=(1, 1))
+    assert store.cached(book) is None
+
+
+def test_corrupt_sidecar_is_rebuilt(book):
+    index_path_for(book).write_text("{không phải json", encoding="utf-8")
+    assert len(ChapterIndexStore().get(book)["chapters"]) == 4
+
+
+def test_custom_build_replaces_open_reader(book):
+    calls = []
+
+    def build(path, fingerprint):
+        calls.append((path, fingerprint))
+        return {"chapters": []}
+
+    store = ChapterIndexStore(open_reader=no_reader, build=build)
+    assert store.get(book) == {"chapters": []}
+    assert calls == [(book, file_fingerprint(book))]
+
+
+def test_build_and_save_with_text_stats(book):
+    index = build_and_save(book)
+    assert index["textStats"]
+    first = index["chapters"][0]
+    assert first["wordCount"] > 0 and first["textLength"] > 0
+    assert index["chapters"][-1]["textLength"] == 0
+    # Sidecar có text_stats cũng được store dùng lại
+    assert ChapterIndexStore(open_reader=no_reader).get(book) == index
+
+
+def test_front_matter_is_not_a_content_chapter():
+    assert not is_content_chapter({"title": "Mục lục", "href": "nav.xhtml"})
+    assert not is_content_chapter({"title": "Lời mở đầu", "href": "intro.html"})
+    assert is_content_chapter({"title": "Chương 1", "href": "chap_1.xhtml"})
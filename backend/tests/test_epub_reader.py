@@ -0,0 +1,102 @@
+import os
+import zipfile
+
+import pytest
+
+from conftest import write_epub
+from epub_reader import EpubFormatError, EpubZipReader, extract_body_html
+
+TOC_LAYOUTS = [
+    pytest.param({"toc": "nav"}, id="nav"),
+    pytest.param({"toc": "nav", "nested": True, "missing": True}, id="nav-nested"),
+    pytest.param({"toc": "ncx"}, id="ncx"),
+    pytest.param({"toc": "ncx", "nested": True, "missing": True}, id="ncx-nested"),
+    pytest.param({"toc": None}, id="spine"),
+]
+
+
+def ebooklib_toc(path):
+    """Mục lục theo cách cũ (trước EpubZipReader): book.toc của ebooklib, hoặc spine nếu trống."""
+    epub = pytest.importorskip("ebooklib.epub")
+    book = epub.read_epub(str(path))
+    chapters = [
+        {"title": item.title, "href": item.href, "order": i + 1}
+        for i, item in enumerate(book.toc)
+        if hasattr(item, "title") and hasattr(item, "href")
+    ]
+    if not chapters:
+        for i, item_id in enumerate(book.spine):
+            item = book.get_item_with_id(item_id[0])
+            if item and hasattr(item, "get_name"):
+                item_name = item.get_name()
+                title = os.path.splitext(os.path.basename(item_name))[0].replace("_", " ").title()
+                chapters.append({"title": title, "href": item_name, "order": i + 1})
+    return chapters
+
+
+@pytest.mark.parametrize("layout", TOC_LAYOUTS)
+def test_toc_matches_ebooklib(tmp_path, layout):
+    path = tmp_path / "book.epub"
+    write_epub(path, **layout)
+    reader = EpubZipReader(path)
+    assert reader.toc == ebooklib_toc(path)
+    reader.close()
+
+
+def test_nested_sections_keep_their_order_slot(tmp_path):
+    path = tmp_path / "book.epub"
+    write_epub(path, toc="ncx", nested=True)
+    toc = EpubZipReader(path).toc
+    assert [(chapter["title"], chapter["order"]) for chapter in toc] == [
+        ("Chương 1", 1), ("Chương 4", 3), ("Chương 5", 4)
+    ]
+
+
+def test_spine_fallback_titles(tmp_path):
+    path = tmp_path / "book.epub"
+    write_epub(path, chapter_count=2, toc=None)
+    assert EpubZipReader(path).toc == [
+        {"title": "Chap 1", "href": "text/chap_1.xhtml", "order": 1},
+        {"title": "Chap 2", "href": "text/chap_2.xhtml", "order": 2},
+    ]
+
+
+def test_read_chapter_html_and_resolve(tmp_path):
+    path = tmp_path / "book.epub"
+    write_epub(path, missing=True)
+    reader = EpubZipReader(path)
+
+    html = reader.read_chapter_html("text/chap_2.xhtml")
+    assert "<h2>Chương 2</h2>" in html
+    assert extract_body_html(html).startswith("<h2>Chương 2</h2>")
+    assert "<style>" not in extract_body_html(html)
+
+    assert reader.resolve_href("text/chap_2.xhtml#muc-1") == "text/chap_2.xhtml"
+    assert reader.member_info("text/chap_2.xhtml").filename == "OEBPS/text/chap_2.xhtml"
+    assert reader.read_chapter_html("text/missing.xhtml") is None
+    assert reader.member_info("text/missing.xhtml") is None
+    reader.close()
+
+
+def test_extract_body_without_body_tag():
+    assert extract_body_html("<p>A</p>") == "<p>A</p>"
+
+
+def test_invalid_epub(tmp_path):
+    path = tmp_path / "book.epub"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+    with pytest.raises(EpubFormatError):
+        EpubZipReader(path)
+
+
+def test_memory_estimate_does_not_grow_with_chapter_size(tmp_path):
+    small, large = tmp_path / "small.epub", tmp_path / "large.epub"
+    write_epub(small, chapter_count=3)
+    write_epub(large, chapter_count=3)
+    with zipfile.ZipFile(large, "a") as archive:
+        archive.writestr("OEBPS/images/big.bin", b"\0" * 5_000_000)
+    small_estimate = EpubZipReader(small).memory_estimate()
+    large_estimate = EpubZipReader(large).memory_estimate()
+    assert 0 < small_estimate < 20_000
+    assert large_estimate - small_estimate < 1_000
@@ -0,0 +1,175 @@
+import io
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+import epub_tasks
+from conftest import chapter_xhtml, write_epub
+from epub_cache import file_fingerprint
+from epub_workers import EpubTaskError, EpubWorkerPool
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="pool tiến trình EPUB chỉ chạy trên POSIX")
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(**options):
+        pool = EpubWorkerPool(**{"processes": 1, "task_timeout": 10, **options})
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+def run_in_thread(pool, fn, *args):
+    """Chạy pool.run trong thread riêng; trả về (thread, list chứa kết quả hoặc exception)."""
+    outcome = []
+
+    def target():
+        try:
+            outcome.append(pool.run(fn, *args))
+        except Exception as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+def test_tasks_run_in_a_reused_child_process(make_pool):
+    pool = make_pool()
+    pid = pool.run(os.getpid)
+    assert pid != os.getpid()
+    assert pool.run(os.getpid) == pid
+    assert pool.stats()["tasks"] == 2 and pool.stats()["running"] == 1
+
+
+def test_convert_chapter_matches_inline_conversion(make_pool):
+    html = chapter_xhtml("Chương 1", "Đoạn <b>một</b> &amp; hai.")
+    pool = make_pool(inline_max_chars=0)
+    assert pool.convert_chapter(html) == epub_tasks.convert_chapter(html)
+    assert pool.stats()["inlineTasks"] == 0
+
+    inline_pool = make_pool(inline_max_chars=len(html))
+    assert inline_pool.convert_chapter(html) == epub_tasks.convert_chapter(html)
+    assert inline_pool.stats() | {"inlineTasks": 1, "tasks": 0} == inline_pool.stats()
+
+
+def test_oversized_chapter_is_rejected(make_pool):
+    pool = make_pool(max_input_chars=10)
+    with pytest.raises(EpubTaskError):
+        pool.convert_chapter("x" * 11)
+    assert pool.stats()["rejected"] == 1
+
+
+def test_build_index_in_child_process(make_pool, tmp_path):
+    path = tmp_path / "book.epub"
+    write_epub(path, nested=True, missing=True)
+    fingerprint = file_fingerprint(path)
+    assert make_pool().build_index(path, fingerprint) == epub_tasks.build_index(str(path), fingerprint)
+
+
+def test_task_errors_propagate_and_keep_the_worker(make_pool):
+    pool = make_pool()
+    pid = pool.run(os.getpid)
+    with pytest.raises(ValueError):
+        pool.run(int, "không phải số")
+    assert pool.run(os.getpid) == pid
+    assert pool.stats()["failures"] == 0
+
+
+def test_stuck_task_times_out_and_its_worker_is_replaced(make_pool):
+    pool = make_pool(task_timeout=0.5)
+    pid = pool.run(os.getpid)
+    started = time.monotonic()
+    with pytest.raises(EpubTaskError):
+        pool.run(time.sleep, 30)
+    assert time.monotonic() - started < 5
+    assert pool.stats()["timeouts"] == 1
+    assert pool.run(os.getpid) not in (pid, None)
+
+
+def test_queue_wait_does_not_count_towards_the_timeout(make_pool):
+    pool = make_pool(task_timeout=1.5)
+    pool.run(os.getpid)
+    started = time.monotonic()
+    threads = [run_in_thread(pool, time.sleep, 0.8) for _ in range(2)]
+    for thread, _ in threads:
+        thread.join()
+    # Hai việc 0.8 giây lần lượt trên một tiến trình: việc thứ hai chờ lâu hơn timeout nhưng vẫn xong
+    assert time.monotonic() - started >= 1.6
+    assert [outcome for _, outcome in threads] == [[None], [None]]
+    assert pool.stats()["timeouts"] == 0
+
+
+def test_only_the_stuck_worker_is_killed(make_pool):
+    pool = make_pool(processes=2, task_timeout=1)
+    stuck, outcome = run_in_thread(pool, time.sleep, 30)
+    while pool.stats()["running"] < 1:
+        time.sleep(0.01)
+    healthy_pid = pool.run(os.getpid)
+    stuck.join()
+    assert isinstance(outcome[0], EpubTaskError)
+    assert pool.run(os.getpid) == healthy_pid
+    assert pool.stats() | {"running": 1, "idle": 1, "timeouts": 1} == pool.stats()
+
+
+def test_workers_are_recycled_after_max_tasks(make_pool):
+    pool = make_pool(max_tasks_per_worker=2)
+    first, second, third = (pool.run(os.getpid) for _ in range(3))
+    assert first == second != third
+    assert pool.stats()["recycles"] == 1
+
+
+def test_dead_idle_worker_is_retried_once(make_pool):
+    pool = make_pool()
+    pid = pool.run(os.getpid)
+    worker = pool._idle[0]
+    worker.process.kill()
+    worker.process.wait()
+    assert pool.run(os.getpid) not in (pid, None)
+    assert pool.stats()["failures"] == 1
+
+
+def test_disabled_pool_runs_inline(make_pool):
+    pool = make_pool(processes=0)
+    assert pool.run(os.getpid) == os.getpid()
+    assert pool.stats()["inlineTasks"] == 1 and pool.stats()["running"] == 0
+
+
+def test_shutdown_closes_idle_workers(make_pool):
+    pool = make_pool(processes=2)
+    pool.run(os.getpid)
+    pool.shutdown()
+    assert pool.stats()["running"] == 0 and pool.stats()["idle"] == 0
+
+
+class Unpicklable(Exception):
+    def __reduce__(self):
+        raise TypeError("không pickle được")
+
+
+def raise_unpicklable():
+    raise Unpicklable("lỗi")
+
+
+def test_serve_answers_each_request_until_eof():
+    requests = io.BytesIO(b"".join(pickle.dumps(request) for request in [
+        (os.getpid, ()), (int, ("x",)), (raise_unpicklable, ()), (int, ("7",)),
+    ]))
+    responses = io.BytesIO()
+    epub_tasks.serve(requests, responses)
+    responses.seek(0)
+    answers = [pickle.load(responses) for _ in range(4)]
+    assert answers[0] == ("ok", os.getpid())
+    assert answers[1][0] == "error" and isinstance(answers[1][1], ValueError)
+    assert answers[2][0] == "error" and isinstance(answers[2][1], RuntimeError)
+    assert answers[3] == ("ok", 7)
+    assert responses.read() == b""
@@ -0,0 +1,85 @@
+import time
+
+from catalog import CatalogSnapshot
+from home_feed import HomeFeed, latest_by_child, rtdb_sort_key
+
+
+def make_feed(entries, per_page=2):
+    def format_item(entry):
+        key, data = entry
+        return {"_id": key, "name": data["name"]} if data.get("name") else None
+
+    return HomeFeed(lambda window: entries[:window], format_item, window=5, per_page=per_page)
+
+
+def test_latest_by_child_is_newest_first():
+    items = {"a": {"createdAt": 1}, "b": {"createdAt": 3}, "c": {}, "d": {"createdAt": 2}}
+    assert [key for key, _ in latest_by_child(items.items(), "createdAt", 3)] == ["b", "d", "a"]
+
+
+def test_rtdb_sort_key_orders_types_like_rtdb():
+    values = ["b", 2, None, True, {"x": 1}, 1.5, False, "a"]
+    assert sorted(values, key=rtdb_sort_key) == [None, False, True, 1.5, 2, "a", "b", {"x": 1}]
+
+
+def test_snapshot_pages():
+    entries = [(f"k{i}", {"name": f"N{i}"}) for i in range(5)] + [("empty", {})]
+    feed = make_feed(entries)
+    assert feed.refresh()
+    snapshot = feed.snapshot
+    assert snapshot.total_items == 5
+    assert snapshot.total_pages == 3
+    assert [item["_id"] for item in snapshot.page(3)] == ["k4"]
+    assert snapshot.page(4) == []
+
+
+def test_generation_only_changes_with_content():
+    entries = [("a", {"name": "A"}), ("b", {"name": "B"})]
+    feed = make_feed(entries)
+    feed.refresh()
+    first = feed.snapshot
+    assert first.generation == 1
+
+    feed.refresh()
+    assert feed.snapshot is first
+    assert feed.stats()["unchanged"] == 1
+
+    entries[0] = ("a", {"name": "A2"})
+    feed.refresh()
+    assert feed.snapshot.generation == 2
+    assert feed.snapshot.items[0]["name"] == "A2"
+
+
+def test_failed_refresh_keeps_snapshot():
+    entries = [("a", {"name": "A"})]
+    feed = make_feed(entries)
+    feed.refresh()
+    snapshot = feed.snapshot
+
+    def broken(window):
+        raise RuntimeError("mất kết nối")
+
+    feed._load_entries = broken
+    assert not feed.refresh()
+    assert feed.snapshot is snapshot
+    assert feed.stats()["failures"] == 1
+
+
+def test_background_refresh_follows_catalog_changes():
+    catalog = CatalogSnapshot()
+    feed = catalog.register_index(HomeFeed(
+        lambda window: latest_by_child(catalog.items(), "createdAt", window),
+        lambda entry: {"_id": entry[0], "name": entry[1].get("name")},
+        window=2, refresh_interval=60, min_refresh_gap=0
+    ))
+    catalog.apply_event("put", "/", {"a": {"name": "A", "createdAt": 1}})
+    feed.start()
+    try:
+        assert [item["_id"] for item in feed.snapshot.items] == ["a"]
+        catalog.apply_event("put", "/b", {"name": "B", "createdAt": 2})
+        deadline = time.monotonic() + 5
+        while feed.snapshot.generation < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [item["_id"] for item in feed.snapshot.items] == ["b", "a"]
+    finally:
+        feed.stop()
@@ -0,0 +1,32 @@
+import pytest
+
+from conftest import chapter_xhtml
+from epub_reader import extract_body_html
+from html_text import (
+    GOLDEN_SAMPLE_HTML, GOLDEN_SAMPLE_TEXT, convert_chapter_html, extract_chapter_title_bs4,
+    html_to_clean_text_bs4,
+)
+
+SAMPLES = [
+    GOLDEN_SAMPLE_HTML,
+    extract_body_html(chapter_xhtml("Chương 2", "<p>Một &amp; hai</p><p>Ba<br/>bốn</p>")),
+    "<div><p>A</p></div><div>Div không có p</div><div>Tiếp</div>",
+    "<h3>Tiêu đề <i>nghiêng</i></h3><ul><li>Một</li><li>Hai <a href='#x'>bỏ</a></li></ul>",
+    "<blockquote>Trích <b>dẫn</b></blockquote><a class='nav' href='c2.html'>Sau</a><a href='c2.html'>Giữ</a>",
+    "<pre>  giữ   nguyên\n  khoảng trắng </pre><script>x = 1</script><style>p{}</style>",
+    "<p>Thẻ <span>không đóng<p>đoạn &nbsp; tiếp &#8220;trích&#8221; &unknown;</p>",
+    "<nav><p>Mục lục</p></nav><header>H</header><p>Nội dung</p><footer>F</footer><aside>A</aside>",
+    "Chỉ có text\n\n\n\n\nnhiều dòng",
+    "",
+]
+
+
+def test_golden_sample():
+    assert convert_chapter_html(GOLDEN_SAMPLE_HTML) == ("Chương 1: Khởi đầu", GOLDEN_SAMPLE_TEXT)
+
+
+@pytest.mark.parametrize("html_content", SAMPLES)
+def test_single_pass_matches_beautifulsoup(html_content):
+    title, text = convert_chapter_html(html_content)
+    assert title == extract_chapter_title_bs4(html_content)
+    assert text == html_to_clean_text_bs4(html_content)
@@ -0,0 +1,141 @@
+import pytest
+from flask import Flask, jsonify
+
+from http_cache import ResponseBodyCache, conditional, make_etag, uncacheable
+
+LAST_MODIFIED = 1_700_000_000
+
+
+@pytest.fixture
+def state():
+    return {"version": 1, "calls": 0, "broken": False}
+
+
+@pytest.fixture
+def body_cache():
+    return ResponseBodyCache(max_bytes=1024 * 1024)
+
+
+@pytest.fixture
+def client(state, body_cache):
+    app = Flask(__name__)
+
+    def validators():
+        return (state["version"],), LAST_MODIFIED
+
+    @app.route("/items")
+    @conditional(validators, max_age=60, body_cache=body_cache)
+    def items():
+        state["calls"] += 1
+        if state["broken"]:
+            uncacheable()
+            return jsonify({"status": "success", "error": "tạm thời lỗi"})
+        return jsonify({"status": "success", "version": state["version"]})
+
+    @app.route("/missing")
+    @conditional(validators, body_cache=body_cache)
+    def missing():
+        state["calls"] += 1
+        return jsonify({"status": "error"}), 404
+
+    @app.route("/uncached")
+    @conditional(lambda: None, body_cache=body_cache)
+    def uncached():
+        state["calls"] += 1
+        return jsonify({"status": "success"})
+
+    return app.test_client()
+
+
+def test_sets_validators_and_cache_control(client):
+    response = client.get("/items")
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    assert response.last_modified.timestamp() == LAST_MODIFIED
+    assert response.cache_control.max_age == 60
+    assert response.cache_control.public
+
+
+def test_if_none_match_returns_304_without_running_handler(client, state):
+    etag = client.get("/items").headers["ETag"]
+    response = client.get("/items", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    assert state["calls"] == 1
+
+
+def test_if_modified_since(client):
+    assert client.get("/items", headers={"If-Modified-Since": "Tue, 14 Nov 2023 22:13:20 GMT"}).status_code == 304
+    assert client.get("/items", headers={"If-Modified-Since": "Mon, 13 Nov 2023 00:00:00 GMT"}).status_code == 200
+
+
+def test_new_version_changes_etag(client, state):
+    etag = client.get("/items").headers["ETag"]
+    state["version"] = 2
+    response = client.get("/items", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json["version"] == 2
+
+
+def test_error_responses_are_not_validated(client, state):
+    response = client.get("/missing")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+    assert "Last-Modified" not in response.headers
+
+
+def test_validators_none_skips_caching(client, state):
+    response = client.get("/uncached")
+    assert "ETag" not in response.headers
+    client.get("/uncached")
+    assert state["calls"] == 2
+
+
+def test_etag_depends_on_every_part():
+    assert make_etag("/a", 1) == make_etag("/a", 1)
+    assert make_etag("/a", 1) != make_etag("/a", 2)
+    assert make_etag("/a", 1) != make_etag("/b", 1)
+
+
+def test_body_cache_reuses_encoded_body(client, state, body_cache):
+    first = client.get("/items")
+    second = client.get("/items")
+    assert state["calls"] == 1
+    assert second.data == first.data
+    assert second.mimetype == "application/json"
+    assert body_cache.stats()["hits"] == 1
+
+
+def test_uncacheable_response_is_not_stored_or_validated(client, state, body_cache):
+    state["broken"] = True
+    response = client.get("/items")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    assert body_cache.stats()["entries"] == 0
+
+    state["broken"] = False
+    response = client.get("/items")
+    assert "error" not in response.json
+    assert state["calls"] == 2
+
+
+def test_error_responses_are_not_stored(client, state, body_cache):
+    assert client.get("/missing").status_code == 404
+    assert client.get("/missing").status_code == 404
+    assert state["calls"] == 2
+    assert body_cache.stats()["entries"] == 0
+
+
+def test_body_cache_evicts_least_recently_used():
+    cache = ResponseBodyCache(max_bytes=10)
+    cache.put("a", b"1234", "application/json")
+    cache.put("b", b"1234", "application/json")
+    assert cache.get("a") is not None
+    cache.put("c", b"1234", "application/json")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    cache.put("huge", b"x" * 11, "application/json")
+    assert cache.get("huge") is None
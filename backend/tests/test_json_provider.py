@@ -0,0 +1,75 @@
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from json_provider import FastJSONProvider
+
+pytest.importorskip("orjson")
+
+ASCII_PAYLOAD = {"b": [1, 2.5, None, True, [], {}], "a": {"name": "x", "n": 3}}
+PAYLOAD = {"b": [1, 2.5, None, True], "a": {"tên": "Truyện Đạo", "số": 3}, "c": "x\ny"}
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    @app.route("/data")
+    def data():
+        return jsonify(PAYLOAD)
+
+    @app.route("/huge")
+    def huge():
+        return jsonify({"n": 2 ** 70})
+
+    return app
+
+
+def reference(app, obj):
+    """Kết quả của provider mặc định của Flask cho cùng dữ liệu."""
+    return json.loads(Flask(__name__).json.dumps(obj))
+
+
+def test_response_matches_default_provider(app):
+    response = app.test_client().get("/data")
+    assert response.mimetype == "application/json"
+    assert response.data.endswith(b"\n")
+    assert json.loads(response.data) == reference(app, PAYLOAD)
+    # Key được sắp xếp và ký tự tiếng Việt được ghi thẳng dạng UTF-8
+    assert response.data.index(b'"a"') < response.data.index(b'"b"')
+    assert "Truyện Đạo".encode() in response.data
+
+
+def test_unsupported_values_fall_back_to_standard_encoder(app):
+    response = app.test_client().get("/huge")
+    assert json.loads(response.data) == {"n": 2 ** 70}
+
+
+def test_dumps_with_options(app):
+    with app.app_context():
+        assert json.loads(app.json.dumps(PAYLOAD)) == reference(app, PAYLOAD)
+        assert app.json.dumps(ASCII_PAYLOAD, indent=2) == Flask(__name__).json.dumps(ASCII_PAYLOAD, indent=2)
+
+
+@pytest.mark.parametrize("mode", ["compact-false", "debug"])
+def test_pretty_output_uses_orjson(app, monkeypatch, mode):
+    import json_provider
+
+    calls = []
+    real_dumps = json_provider.orjson.dumps
+    monkeypatch.setattr(json_provider.orjson, "dumps", lambda *a, **kw: calls.append(kw) or real_dumps(*a, **kw))
+    if mode == "debug":
+        app.debug = True
+    else:
+        app.json.compact = False
+
+    with app.test_request_context():
+        data = app.json.response(ASCII_PAYLOAD).get_data()
+    assert calls and calls[0]["option"] & json_provider.orjson.OPT_INDENT_2
+    # Cùng bytes với provider mặc định của Flask ở chế độ thụt lề
+    default = Flask(__name__)
+    default.json.compact = False
+    with default.test_request_context():
+        assert data == default.json.response(ASCII_PAYLOAD).get_data()
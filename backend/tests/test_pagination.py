@@ -0,0 +1,156 @@
+import base64
+
+import pytest
+
+from catalog import FeedIndex, FieldEquals
+from conftest import FEEDS
+from home_feed import rtdb_sort_key
+from pagination import InvalidCursor, decode_cursor, encode_cursor, fetch_page_desc, sort_position
+
+
+class FakeQuery:
+    """Truy vấn order_by_child của RTDB trên một dict trong bộ nhớ (end_at, equal_to, limit_to_last)."""
+
+    def __init__(self, data, child, log):
+        self._child = child
+        self._entries = sorted(
+            data.items(), key=lambda entry: (rtdb_sort_key(entry[1].get(child)), entry[0])
+        )
+        self._log = log
+
+    def _value(self, entry):
+        return rtdb_sort_key(entry[1].get(self._child))
+
+    def end_at(self, value):
+        self._entries = [entry for entry in self._entries if self._value(entry) <= rtdb_sort_key(value)]
+        return self
+
+    def equal_to(self, value):
+        self._entries = [entry for entry in self._entries if self._value(entry) == rtdb_sort_key(value)]
+        return self
+
+    def limit_to_last(self, count):
+        self._entries = self._entries[-count:]
+        return self
+
+    def get(self):
+        self._log.append(self._child)
+        return dict(self._entries)
+
+
+class FakeRef:
+    def __init__(self, data):
+        self._data = data
+        self.queries = []
+
+    def order_by_child(self, child):
+        return FakeQuery(self._data, child, self.queries)
+
+
+def walk_cursor(fetch_page, page_size):
+    """Đọc hết một feed bằng con trỏ: fetch_page(cursor) -> (list (key, data), còn trang sau)."""
+    keys, cursor = [], None
+    while True:
+        page, has_more = fetch_page(cursor)
+        assert len(page) <= page_size
+        keys.extend(key for key, _ in page)
+        if not has_more:
+            return keys
+        last_key, last_data = page[-1]
+        # Con trỏ đi qua đúng định dạng của API (chuỗi base64)
+        cursor = decode_cursor(encode_cursor(last_data.get("updatedAt"), last_key))
+
+
+def expected_order(items, predicate=None):
+    entries = [(sort_position(data.get("updatedAt"), key), key) for key, data in items.items()
+               if predicate is None or predicate(data)]
+    return [key for _, key in sorted(entries, reverse=True)]
+
+
+@pytest.mark.parametrize("updated_at, key", [
+    ("2024-05-01T10:00:00Z", "comic_001"),
+    (None, "ebook_không-dấu"),
+    (1715000000, "a/b"),
+    ("", ""),
+])
+def test_cursor_round_trip(updated_at, key):
+    cursor = encode_cursor(updated_at, key)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (updated_at, key)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "không-phải-base64",
+    base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+    base64.urlsafe_b64encode(b'["2024", 5]').decode(),
+    base64.urlsafe_b64encode(b'["2024"]').decode(),
+    base64.urlsafe_b64encode(b'[{}, "key"]').decode(),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_sort_position_treats_missing_updated_at_as_empty():
+    assert sort_position(None, "k") == ("", "k")
+    assert sort_position("2024", "k") < sort_position("2025", "a")
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 24])
+def test_feed_cursor_walk_matches_offset_pages(items, page_size):
+    feeds = FeedIndex(FEEDS)
+    feeds.rebuild(items)
+    for name in FEEDS:
+        total = feeds.count(name)
+        by_offset = []
+        for start in range(0, total, page_size):
+            by_offset.extend(feeds.page(name, start, page_size))
+
+        def fetch_page(cursor):
+            if cursor is None:
+                keys = feeds.page(name, 0, page_size + 1)
+                has_more = len(keys) > page_size
+                keys = keys[:page_size]
+            else:
+                keys, has_more = feeds.page_after(name, *sort_position(*cursor), page_size)
+            return [(key, items[key]) for key in keys], has_more
+
+        assert walk_cursor(fetch_page, page_size) == by_offset == expected_order(items, FEEDS[name])
+
+
+@pytest.mark.parametrize("max_batches", [1, 3, 1000])
+@pytest.mark.parametrize("page_size", [1, 10])
+def test_rtdb_cursor_walk_matches_sorted_order(items, max_batches, page_size):
+    ref = FakeRef(items)
+    for name, feed in list(FEEDS.items()) + [("all", None)]:
+        keys = walk_cursor(
+            lambda cursor: fetch_page_desc(ref, "updatedAt", feed, page_size, cursor,
+                                           batch_size=5, max_batches=max_batches),
+            page_size
+        )
+        assert keys == expected_order(items, feed), name
+
+
+def test_rtdb_sparse_feed_switches_to_equal_to():
+    # Chỉ 2 item cũ nhất thuộc feed: sau max_batches lô không đủ item thì đọc bằng equal_to
+    items = {f"k{i:02d}": {"updatedAt": f"2024-02-{i + 10:02d}", "status": "ongoing"} for i in range(15)}
+    items["old1"] = {"updatedAt": "2024-01-01", "status": "coming_soon"}
+    items["old2"] = {"updatedAt": "2024-01-02", "status": "coming_soon"}
+    ref = FakeRef(items)
+    page, has_more = fetch_page_desc(ref, "updatedAt", FieldEquals("status", "coming_soon"), 5,
+                                     batch_size=5, max_batches=2)
+    assert [key for key, _ in page] == ["old2", "old1"]
+    assert not has_more
+    assert ref.queries == ["updatedAt", "updatedAt", "status"]
+
+
+def test_rtdb_page_with_ties_on_the_cursor():
+    # Nhiều item trùng updatedAt hơn một lô: lô phải được mở rộng thay vì lặp lại cùng truy vấn
+    items = {f"k{i:02d}": {"updatedAt": "2024-01-01"} for i in range(12)}
+    items["z"] = {"updatedAt": "2023-12-31"}
+    ref = FakeRef(items)
+    keys = walk_cursor(
+        lambda cursor: fetch_page_desc(ref, "updatedAt", None, 4, cursor, batch_size=3), 4
+    )
+    assert keys == expected_order(items)
@@ -0,0 +1,109 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+import epub_tasks
+import preprocess_epubs
+from chapter_text_cache import ChapterTextCache
+from conftest import write_epub
+from epub_cache import file_fingerprint
+from epub_index import load_chapter_index, save_chapter_index
+from epub_reader import EpubZipReader
+from preprocess_epubs import find_epubs, is_preprocessed, preprocess_book
+
+
+@pytest.fixture
+def media(tmp_path):
+    media = tmp_path / "ebooks"
+    write_epub(media / "sach-mot" / "book.epub", chapter_count=3)
+    write_epub(media / "sach-hai" / "book.epub", chapter_count=4, toc="ncx")
+    (media / "khong-phai-sach.epub").write_bytes(b"")
+    (media / "sach-mot" / "cover.jpg").write_bytes(b"")
+    return media
+
+
+def disk_cache():
+    return ChapterTextCache(max_memory_bytes=0, on_disk=True)
+
+
+def test_find_epubs(media):
+    assert find_epubs(media) == [media / "sach-hai" / "book.epub", media / "sach-mot" / "book.epub"]
+
+
+def test_preprocess_book_stores_index_and_every_chapter_text(media):
+    path = media / "sach-hai" / "book.epub"
+    result = preprocess_book(path)
+    assert result["status"] == "done"
+
+    fingerprint = file_fingerprint(path)
+    index = load_chapter_index(path, fingerprint)
+    assert index["textStats"]
+    assert result["chapters"] == len(index["chapters"]) == 4
+    assert result["words"] == sum(chapter["wordCount"] for chapter in index["chapters"]) > 0
+
+    # Text trên đĩa đúng bằng text API server tự chuyển đổi khi không có cache
+    reader = EpubZipReader(path)
+    try:
+        for chapter in index["chapters"]:
+            expected = epub_tasks.convert_chapter(reader.read_chapter_html(chapter["href"]))
+            assert disk_cache().get(fingerprint, chapter["href"]) == expected
+            assert chapter["textLength"] == len(expected["content"])
+    finally:
+        reader.close()
+    assert is_preprocessed(path, disk_cache())
+
+
+def test_unchanged_books_are_skipped(media):
+    path = media / "sach-mot" / "book.epub"
+    assert preprocess_book(path)["status"] == "done"
+    assert preprocess_book(path)["status"] == "skipped"
+    assert preprocess_book(path, force=True)["status"] == "done"
+
+    write_epub(path, chapter_count=5)
+    os.utime(path, ns=(1, 1))
+    assert not is_preprocessed(path, disk_cache())
+    result = preprocess_book(path)
+    assert (result["status"], result["chapters"]) == ("done", 5)
+
+
+def test_missing_text_or_stats_means_not_preprocessed(media):
+    path = media / "sach-mot" / "book.epub"
+    assert not is_preprocessed(path, disk_cache())
+    preprocess_book(path)
+    shutil.rmtree(ChapterTextCache.book_cache_dir(path))
+    assert not is_preprocessed(path, disk_cache())
+
+    preprocess_book(path, force=True)
+    # Chỉ mục dựng lúc chạy server (không có thống kê text) không đủ, dù text đã có trên đĩa
+    save_chapter_index(path, epub_tasks.build_index(str(path), file_fingerprint(path)))
+    assert not is_preprocessed(path, disk_cache())
+
+
+def test_chapters_missing_from_the_zip_do_not_block_skipping(tmp_path):
+    path = tmp_path / "sach-thieu" / "book.epub"
+    write_epub(path, chapter_count=3, missing=True)
+    assert preprocess_book(path)["status"] == "done"
+    index = load_chapter_index(path, file_fingerprint(path))
+    assert any(chapter["member"] is None for chapter in index["chapters"])
+    assert is_preprocessed(path, disk_cache())
+    assert preprocess_book(path)["status"] == "skipped"
+
+
+def test_main_processes_new_books_only(media, monkeypatch, capsys):
+    args = ["preprocess_epubs.py", "--media-dir", str(media), "--jobs", "2"]
+    monkeypatch.setattr(sys, "argv", args)
+    assert preprocess_epubs.main() == 0
+    assert "2 đã xử lý, 0 không đổi, 0 lỗi" in capsys.readouterr().out
+
+    (media / "sach-ba").mkdir()
+    (media / "sach-ba" / "book.epub").write_bytes(b"khong phai zip")
+    assert preprocess_epubs.main() == 1
+    output = capsys.readouterr().out
+    assert "0 đã xử lý, 2 không đổi, 1 lỗi" in output
+    assert "LỖI" in output
+
+    monkeypatch.setattr(sys, "argv", ["preprocess_epubs.py", "--media-dir", str(media / "sach-ba" / "trong")])
+    assert preprocess_epubs.main() == 0
+    assert "Không tìm thấy file EPUB" in capsys.readouterr().out
@@ -0,0 +1,118 @@
+import random
+import threading
+import time
+
+import pytest
+
+from conftest import EVENT_SEEDS, apply_to_model, random_events
+from replica_sync import ReplicaSync
+from storage import SqliteItemRepository, StorageEvent
+
+
+@pytest.fixture
+def source(tmp_path, items):
+    source = SqliteItemRepository(tmp_path / "source.sqlite3", create=True)
+    source.replace_all(items)
+    yield source
+    source.close()
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = SqliteItemRepository(tmp_path / "replica.sqlite3", create=True)
+    yield replica
+    replica.close()
+
+
+def test_root_put_writes_only_differences(source, replica, items):
+    sync = ReplicaSync(source, replica)
+    sync.handle_event(StorageEvent("put", "/", items))
+    assert replica.all_items() == items
+    last_seq = replica.stats()["lastSeq"]
+
+    # Kết nối lại: put '/' giống hệt nội dung đang lưu không ghi gì
+    sync.handle_event(StorageEvent("put", "/", items))
+    assert replica.stats()["lastSeq"] == last_seq
+
+    key = sorted(items)[0]
+    updated = {k: v for k, v in items.items() if k != key}
+    sync.handle_event(StorageEvent("put", "/", updated))
+    assert replica.all_items() == updated
+    assert replica.stats()["lastSeq"] == last_seq + 1
+    assert (sync.events, sync.failures) == (3, 0)
+
+
+@pytest.mark.parametrize("seed", EVENT_SEEDS)
+def test_incremental_events_match_model(source, replica, items, seed):
+    rng = random.Random(seed)
+    sync = ReplicaSync(source, replica)
+    sync.handle_event(StorageEvent("put", "/", items))
+    model = dict(items)
+    keys = sorted(items) + [f"comic_new_{i}" for i in range(10)]
+    for event_type, path, data in random_events(rng, keys, 300):
+        sync.handle_event(StorageEvent(event_type, path, data))
+        apply_to_model(model, event_type, path, data)
+    assert replica.all_items() == model
+    assert sync.failures == 0
+
+
+def test_failed_event_requests_full_sync(source, replica, items, monkeypatch):
+    sync = ReplicaSync(source, replica)
+    sync.handle_event(StorageEvent("put", "/", items))
+
+    def broken(changes):
+        raise OSError("đĩa đầy")
+
+    monkeypatch.setattr(replica, "apply_changes", broken)
+    key = sorted(items)[0]
+    sync.handle_event(StorageEvent("put", f"/{key}", None))
+    assert (sync.events, sync.failures) == (1, 1)
+    assert sync._needs_full_sync.is_set()
+    assert replica.get(key) == items[key]
+
+
+def test_sync_once_reads_source(source, replica, items):
+    sync = ReplicaSync(source, replica)
+    assert sync.sync_once() == len(items)
+    assert sync.sync_once() == 0
+    key = sorted(items)[0]
+    source.put(key, None)
+    assert sync.sync_once() == 1
+    assert replica.get(key) is None
+
+
+def test_run_recovers_from_failed_event(source, replica, items, monkeypatch):
+    sync = ReplicaSync(source, replica, retention=-1)
+    key = sorted(items)[0]
+    original_apply = replica.apply_changes
+    failed = threading.Event()
+
+    def fail_once(changes):
+        if not failed.is_set():
+            failed.set()
+            raise OSError("đĩa đầy")
+        original_apply(changes)
+
+    monkeypatch.setattr(replica, "apply_changes", fail_once)
+    thread = threading.Thread(target=sync.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while replica.all_items() != items and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Sự kiện lỗi: bản sao lệch khỏi source cho đến khi vòng lặp chính đồng bộ lại toàn bộ
+        source.put(key, None)
+        sync.handle_event(StorageEvent("put", f"/{key}", None))
+        assert replica.get(key) == items[key]
+        deadline = time.monotonic() + 5
+        while replica.get(key) is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert replica.get(key) is None
+        assert not sync._needs_full_sync.is_set()
+    finally:
+        sync.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert sync._listener is None
+    # retention âm: vòng lặp đầu tiên (sau khi đồng bộ lại) dọn toàn bộ nhật ký thay đổi
+    assert replica.stats()["lastSeq"] == 0
@@ -0,0 +1,63 @@
+import pytest
+
+from catalog import CatalogSnapshot
+from conftest import EVENT_SEEDS, WORDS, replay_random_events
+from search_index import SearchIndex, fold_text
+
+QUERIES = ["a", "g", "ng", "ie", "an", "kie", "hiep", "truyen dao", "Đạo", "xyz", " "]
+
+
+def test_fold_text():
+    assert fold_text("  Truyện  Kiếm Hiệp ") == "truyen kiem hiep"
+    assert fold_text("Đạo") == "dao"
+    assert fold_text(None) == ""
+
+
+@pytest.mark.parametrize("keyword", QUERIES)
+def test_matches_are_folded_substrings(items, keyword):
+    index = SearchIndex()
+    index.rebuild(items)
+    query = fold_text(keyword)
+    expected = {
+        key for key, data in items.items()
+        if query and (query in fold_text(data["name"]) or query in fold_text(" ".join(data["origin_name"])))
+    }
+    total, keys = index.search(keyword, 1000)
+    assert total == len(expected)
+    assert set(keys) == expected
+
+
+def test_ranking_and_limit():
+    index = SearchIndex()
+    index.rebuild({
+        "contains": {"name": "Anh Hùng Long"},
+        "exact": {"name": "Long"},
+        "origin": {"name": "Mộng", "origin_name": ["Long Thần"]},
+        "prefix": {"name": "Long Thần"},
+        "word": {"name": "Thần Long"},
+    })
+    assert index.search("long", 10) == (5, ["exact", "prefix", "contains", "word", "origin"])
+    assert index.search("long", 2) == (5, ["exact", "prefix"])
+    assert index.search("long", 0) == (5, [])
+
+
+def test_update_moves_postings():
+    index = SearchIndex()
+    index.rebuild({"a": {"name": WORDS[0]}})
+    index.update("a", {"name": WORDS[0]}, {"name": "Mộng Giang"})
+    assert index.search("kiem", 10) == (0, [])
+    assert index.search("giang", 10) == (1, ["a"])
+    index.update("a", {"name": "Mộng Giang"}, None)
+    assert index.search("g", 10) == (0, [])
+
+
+@pytest.mark.parametrize("seed", EVENT_SEEDS)
+def test_search_index_updates_match_rebuild(items, seed):
+    catalog = CatalogSnapshot()
+    index = catalog.register_index(SearchIndex())
+    model, _ = replay_random_events(catalog, items, seed)
+
+    rebuilt = SearchIndex()
+    rebuilt.rebuild(model)
+    for query in QUERIES:
+        assert index.search(query, 1000) == rebuilt.search(query, 1000), query
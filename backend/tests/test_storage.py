@@ -0,0 +1,194 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from catalog import CategoryIndex, FeedIndex, FieldEquals
+from conftest import CATEGORIES, FEEDS
+from home_feed import latest_by_child
+from pagination import sort_position
+from storage import ItemRepository, SqliteItemRepository, StorageError, _ChangePoller, create_repository, matches_keyword
+
+
+@pytest.fixture
+def repository(tmp_path, items):
+    repository = SqliteItemRepository(tmp_path / "library.sqlite3", create=True)
+    repository.replace_all(items)
+    yield repository
+    repository.close()
+
+
+def walk(repository, feed, page_size, batch_size=100):
+    keys, cursor = [], None
+    while True:
+        page, has_more = repository.page_desc("updatedAt", feed, page_size, cursor, batch_size=batch_size)
+        keys.extend(key for key, _ in page)
+        if not has_more:
+            return keys
+        last_key, last_data = page[-1]
+        cursor = (last_data.get("updatedAt"), last_key)
+
+
+def test_item_repository_is_abstract():
+    with pytest.raises(TypeError):
+        ItemRepository()
+
+
+def test_missing_file_without_create(tmp_path):
+    with pytest.raises(StorageError):
+        SqliteItemRepository(tmp_path / "khong-co.sqlite3")
+
+
+def test_round_trip(repository, items):
+    assert repository.all_items() == items
+    key = sorted(items)[0]
+    assert repository.get(key) == items[key]
+    assert repository.get("khong-co") is None
+
+
+@pytest.mark.parametrize("page_size", [1, 9, 50])
+def test_page_desc_matches_feed_index(repository, items, page_size):
+    feeds = FeedIndex(FEEDS)
+    feeds.rebuild(items)
+    for name, feed in FEEDS.items():
+        assert walk(repository, feed, page_size) == feeds.page(name, 0, len(items)), name
+
+
+def test_page_desc_without_filter_and_with_unindexed_filter(repository, items):
+    expected = sorted(items, key=lambda key: sort_position(items[key].get("updatedAt"), key), reverse=True)
+    assert walk(repository, None, 13) == expected
+
+    has_thumb_feed = FieldEquals("thumb_url", "comic_004.jpg")
+    assert walk(repository, has_thumb_feed, 2, batch_size=7) == ["comic_004"]
+
+    def short_name(data):
+        return len(data["name"]) < 8
+
+    assert walk(repository, short_name, 5, batch_size=3) == [key for key in expected if short_name(items[key])]
+
+
+def test_by_category_matches_category_index(repository, items):
+    index = CategoryIndex()
+    index.rebuild(items)
+    for cat in CATEGORIES:
+        slug = cat["slug"]
+        total, entries = repository.by_category(slug, 3, 10)
+        assert total == index.count(slug)
+        assert [key for key, _ in entries] == index.page(slug, 3, 10)
+    assert repository.by_category("khong-co", 0, 10) == (0, [])
+
+
+@pytest.mark.parametrize("keyword", ["kiếm", "ng", "a", "hùng giang", "đạo", "xyz"])
+def test_search_matches_substring_scan(repository, items, keyword):
+    expected = sorted(
+        (data["name"].lower(), key) for key, data in items.items() if matches_keyword(data, keyword)
+    )
+    total, entries = repository.search(keyword, 0, 1000)
+    assert total == len(expected)
+    assert [key for key, _ in entries] == [key for _, key in expected]
+
+
+def test_latest_matches_rtdb_order(repository, items):
+    assert repository.latest("createdAt", 10) == latest_by_child(items.items(), "createdAt", 10)
+
+
+def test_apply_changes_updates_every_index(repository, items):
+    key = sorted(items)[0]
+    changed = {**items[key], "name": "Tên Hoàn Toàn Mới", "status": "coming_soon",
+               "updatedAt": "2099-01-01", "category": [CATEGORIES[3]]}
+    removed = sorted(items)[1]
+    repository.apply_changes({key: changed, removed: None})
+
+    assert repository.get(key) == changed
+    assert repository.get(removed) is None
+    assert repository.search("hoàn toàn mới", 0, 10)[1] == [(key, changed)]
+    assert repository.by_category("trinh-tham", 0, 1)[1] == [(key, changed)]
+    assert walk(repository, FEEDS["sap-ra-mat"], 1)[0] == key
+    for cat in CATEGORIES:
+        assert removed not in [k for k, _ in repository.by_category(cat["slug"], 0, 1000)[1]]
+
+
+def test_sync_all_writes_only_differences(repository, items):
+    assert repository.sync_all(items) == 0
+    updated = dict(items)
+    first, second = sorted(items)[:2]
+    updated[first] = {**items[first], "status": "completed" if items[first]["status"] != "completed" else "ongoing"}
+    del updated[second]
+    assert repository.sync_all(updated) == 2
+    assert repository.all_items() == updated
+
+
+def test_listen_starts_with_full_put(repository, items):
+    events = []
+    listener = repository.listen(events.append)
+    listener.close()
+    assert len(events) == 1
+    assert (events[0].event_type, events[0].path) == ("put", "/")
+    assert events[0].data == items
+
+
+def wait_for(events, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return events
+
+
+def test_listen_polls_changes_from_another_connection(repository, items):
+    reader = SqliteItemRepository(repository.path, poll_interval=0.01)
+    events = []
+    listener = reader.listen(events.append)
+    try:
+        key, removed = sorted(items)[:2]
+        changed = {**items[key], "name": "Đổi Tên"}
+        repository.apply_changes({key: changed, removed: None})
+        wait_for(events, 3)
+        assert [(e.event_type, e.path, e.data) for e in events[1:]] == [
+            ("put", f"/{key}", changed), ("put", f"/{removed}", None)
+        ]
+    finally:
+        listener.close()
+
+
+@pytest.mark.parametrize("rewrite", ["replace_all", "prune_changes"])
+def test_poller_reloads_everything_after_replace_or_prune(repository, items, rewrite):
+    # Poller bắt đầu từ vị trí nhật ký trước khi ghi, như một listener chưa kịp đọc các thay đổi
+    with repository._read_transaction() as conn:
+        replica_id, last_seq = repository._sync_state(conn)["replica_id"], repository._last_seq(conn)
+    key = sorted(items)[0]
+    updated = {**items, key: {**items[key], "name": "Đổi Tên"}}
+    if rewrite == "replace_all":
+        repository.replace_all(updated)
+    else:
+        repository.put(key, updated[key])
+        repository.prune_changes(-1)
+
+    events = []
+    poller = _ChangePoller(SqliteItemRepository(repository.path), events.append, replica_id, last_seq, 0.01)
+    try:
+        wait_for(events, 1)
+        assert [(e.event_type, e.path) for e in events] == [("put", "/")]
+        assert events[0].data == updated
+    finally:
+        poller.close()
+
+
+def test_prune_changes_keeps_recent_entries(repository, items):
+    repository.put(sorted(items)[0], None)
+    assert repository.prune_changes(3600) == 0
+    assert repository.prune_changes(-1) == 1
+    assert repository.stats()["lastSeq"] == 0
+
+
+def test_create_repository(tmp_path, repository):
+    settings = SimpleNamespace(STORAGE_BACKEND="sqlite", SQLITE_DB_PATH=repository.path.name)
+    created = create_repository(settings, repository.path.parent)
+    try:
+        assert created.path == repository.path
+        assert created.describe() == repository.describe()
+    finally:
+        created.close()
+    with pytest.raises(StorageError):
+        create_repository(SimpleNamespace(STORAGE_BACKEND="khong-co"), tmp_path)
+    with pytest.raises(StorageError):
+        create_repository(SimpleNamespace(STORAGE_BACKEND="sqlite", SQLITE_DB_PATH="khong-co.sqlite3"), tmp_path)
@@ -194,6 +194,25 @@ class OTruyenApi {
     return _processResponse(response);
   }
 
+  /// Lấy thông tin chi tiết nhiều truyện trong một request (thư viện, lịch sử, yêu thích)
+  /// [slugs] - danh sách slug hoặc ID của truyện (tối đa 100)
+  /// [fields] - các trường cần lấy, ví dụ 'name,slug,thumb_url_full' (mặc định: đầy đủ)
+  /// Trả về Map gồm 'items' (theo đúng thứ tự [slugs]) và 'notFound' (các slug không tìm thấy)
+  static Future<Map<String, dynamic>> getComicDetailsBatch(List<String> slugs,
+      {String? fields}) async {
+    final response = await http
+        .post(
+          Uri.parse('$baseUrl/truyen-tranh/batch'),
+          headers: {'Content-Type': 'application/json'},
+          body: json.encode({'ids': slugs, if (fields != null) 'fields': fields}),
+        )
+        .timeout(defaultTimeout);
+
+    _logResponse('/truyen-tranh/batch', response);
+
+    return _processResponse(response);
+  }
+
   /// Lấy nội dung chi tiết truyện chữ với xử lý lỗi toàn diện
   /// [slug] - slug của truyện chữ
   /// Trả về Map chứa thông tin truyện và nội dung (chapters hoặc content)
@@ -246,8 +246,10 @@ class Story {
         views: json['views'] != null
             ? int.tryParse(json['views'].toString()) ?? 0
             : 0,
-        chapters:
-            json.containsKey('chapters') ? countChapters(json['chapters']) : 0,
+        // Danh sách chỉ trả về thẻ rút gọn: số chương nằm trong totalChapters
+        chapters: json.containsKey('chapters')
+            ? countChapters(json['chapters'])
+            : (json['totalChapters'] is int ? json['totalChapters'] : 0),
         updatedAt: (json['updatedAt'] ?? json['updated_at'] ?? '').toString(),
         slug: (json['slug'] ?? '').toString(),
         authors: parseAuthors(json['author'] ?? []),